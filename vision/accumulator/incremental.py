@@ -0,0 +1,152 @@
+"""
+TS space accumulation that carries over between video frames.
+
+A qr code is shown for 30 seconds and the drone hovers, so consecutive edge
+maps barely change. Only the votes of edge pixels that appeared or vanished
+since the previous frame are accumulated, the work per frame follows the
+change between frames instead of the number of edge pixels.
+"""
+import numpy as np
+
+from accumulator.py_to_cpp import get_session
+
+
+class IncrementalAccumulator(object):
+    """
+    Accumulator kept between frames, updated with edge map differences.
+
+    Parameters
+    ----------
+    width: int
+        Width of TS space.
+    height: int
+        Height of TS space.
+    u_offset, v_offset, v_scale, d:
+        TS space layout, see ts_converter.get_ts_verticies.
+    rebuild_every: int
+        Accumulate every edge pixel from scratch after this many
+        incremental frames, corrects any drift from the diffs.
+    max_change: float
+        Rebuild instead when more than this fraction of the previous edge
+        pixels changed, diffing then costs more than starting over.
+    backend: str
+        'gl', 'cpu' or 'auto', see py_to_cpp.select_backend.
+
+    Attributes
+    ----------
+    accumulated: np array[uint32]
+        (height, width) votes of the last frame, indexed [v, u].
+    changed: int
+        Number of edge pixels accumulated for the last frame.
+    rebuilt: bool
+        Whether the last frame was accumulated from scratch.
+    """
+    def __init__(self, width, height, u_offset, v_offset, v_scale, d,
+                 rebuild_every=100, max_change=.5, backend='auto'):
+        self.width = width
+        self.height = height
+
+        self.layout = (u_offset, v_offset, v_scale, d)
+
+        self.rebuild_every = rebuild_every
+        self.max_change = max_change
+        self.backend = backend
+
+        self.accumulated = np.zeros((height, width), np.uint32)
+
+        self.reset()
+
+    def reset(self):
+        """
+        Forget the previous frame, the next update is a full rebuild.
+        """
+        self.previous = None
+        self.since_rebuild = 0
+
+        self.changed = 0
+        self.rebuilt = False
+
+    def _votes(self, mask):
+        """
+        Votes of the edge pixels in a mask, owned by the accumulator session,
+        and the number of pixels. Votes are None without any pixels.
+        """
+        points = np.argwhere(mask)
+
+        if not len(points):
+            return None, 0
+
+        session = get_session(self.width, self.height, self.backend)
+
+        # Session made in the calling thread, gl contexts belong to a thread
+        return session.feed_points(points, *self.layout), len(points)
+
+    def rebuild(self, edges):
+        """
+        Accumulate a frame from scratch.
+
+        Parameters
+        ----------
+        edges: 2d np array
+            Binary edge map, 1 on edges.
+
+        Returns
+        -------
+        np array[uint32] accumulated, valid until the next update.
+        """
+        edges = edges == 1
+
+        votes, self.changed = self._votes(edges)
+
+        if votes is None:
+            self.accumulated.fill(0)
+        else:
+            self.accumulated[...] = votes
+
+        self.previous = edges
+        self.since_rebuild = 0
+        self.rebuilt = True
+
+        return self.accumulated
+
+    def update(self, edges):
+        """
+        Accumulate a frame, only diffing against the previous one.
+
+        Parameters
+        ----------
+        edges: 2d np array
+            Binary edge map, 1 on edges.
+
+        Returns
+        -------
+        np array[uint32] accumulated, valid until the next update.
+        """
+        if self.previous is None or self.previous.shape != edges.shape \
+                or self.since_rebuild >= self.rebuild_every:
+            return self.rebuild(edges)
+
+        edges = edges == 1
+
+        appeared = edges & ~self.previous
+        vanished = self.previous & ~edges
+
+        if np.count_nonzero(appeared) + np.count_nonzero(vanished) \
+                > self.max_change * max(np.count_nonzero(self.previous), 1):
+            return self.rebuild(edges)
+
+        added, n_added = self._votes(appeared)
+        if n_added:
+            np.add(self.accumulated, added, out=self.accumulated)
+
+        removed, n_removed = self._votes(vanished)
+        if n_removed:
+            np.subtract(self.accumulated, removed, out=self.accumulated)
+
+        self.previous = edges
+        self.since_rebuild += 1
+
+        self.changed = n_added + n_removed
+        self.rebuilt = False
+
+        return self.accumulated
@@ -0,0 +1,92 @@
+"""
+Find peaks in an accumulated TS space.
+"""
+import numpy as np
+from scipy.ndimage import maximum_filter
+
+
+def find_maxima(accumulated, n_maxima=500, neighbourhood=3, threshold=1):
+    """
+    Find the strongest local maxima in an accumulator.
+
+    A pixel is a local maximum if no pixel in the neighbourhood around it
+    has more votes, pixels on a plateau are all kept.
+
+    Parameters
+    ----------
+    accumulated: 2d np array
+        Votes per pixel, indexed [v, u].
+    n_maxima: int
+        Max number of maxima to return.
+    neighbourhood: int
+        Width of the square neighbourhood used for non maximum suppression.
+    threshold: int
+        Minimum number of votes of a maxima.
+
+    Returns
+    -------
+    u, v, votes: np arrays of maxima locations and vote counts, sorted by
+    votes with the strongest first.
+    """
+    peaks = accumulated == maximum_filter(accumulated, size=neighbourhood, mode='constant', cval=0)
+    peaks &= accumulated >= threshold
+
+    v, u = np.nonzero(peaks)
+    votes = accumulated[v, u]
+
+    if len(votes) > n_maxima:
+        strongest = np.argpartition(votes, len(votes) - n_maxima)[-n_maxima:]
+        u, v, votes = u[strongest], v[strongest], votes[strongest]
+
+    order = np.argsort(votes, kind='stable')[::-1]
+
+    return u[order], v[order], votes[order]
+
+
+# Line formula y = mx + b detected in S or T space
+LINE_DTYPE = np.dtype([('m', np.float64), ('b', np.float64), ('votes', np.uint32), ('space', 'U1')])
+
+
+def maxima_to_lines(u, v, votes, d, u_offset, v_offset):
+    """
+    Convert TS space maxima to slope intercept form.
+
+    S Space
+        ℓ : u = d/(1-m), v = b/(1-m)
+        m = -d/u + 1, b = dv/u
+
+    T Space
+        ℓ : u = -d/(1+m), v = -b/(1+m)
+        m = -d/u - 1, b = dv/u
+
+    Parameters
+    ----------
+    u, v, votes: np arrays
+        Maxima locations and vote counts, see find_maxima.
+    d: float
+        Spacing between axis along u.
+    u_offset: float
+        Location of u = 0 in the accumulator.
+    v_offset: float
+        Location of v = 0 in the accumulator.
+
+    Returns
+    -------
+    np array[LINE_DTYPE] with a line per maxima, in the same order.
+    """
+    u = np.asarray(u, np.float64) - u_offset
+    v = np.asarray(v, np.float64) - v_offset
+
+    lines = np.zeros(len(u), LINE_DTYPE)
+
+    # u == 0 is left as m = 0, b = 0
+    on_axis = u == 0
+    d_over_u = np.divide(d, u, out=np.zeros_like(u), where=~on_axis)
+
+    lines['m'] = np.where(u > 0, 1. - d_over_u, -1. - d_over_u)
+    lines['m'][on_axis] = 0
+    lines['b'] = d_over_u * v
+    lines['votes'] = votes
+    lines['space'] = np.where(u < 0, 'T', 'S')
+
+    return lines
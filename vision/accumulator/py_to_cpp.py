@@ -1,12 +1,32 @@
 """
 Python code to interact with dll.
+
+Two interchangeable accumulator backends share the same constructor and
+`accumulate()` contract:
+- `TS` -- bindings to the OpenGL accumulator in qr.so.
+- `CpuTS` -- vectorized numpy rasterizer for machines without a GPU.
+
+Use `select_backend` to pick one, it falls back to `CpuTS` when qr.so
+cannot be loaded.
+
+Both take edge points as a compact (n, 2) array with `set_points` and turn
+each into its TS space lines themselves, instead of 4 float32 verticies
+per point made by ts_converter.get_ts_verticies.
+
+For video use an `AccumulatorSession`, it keeps the accumulator and its
+output buffers alive between frames.
 """
+import time
+import warnings
+import threading
+
 import numpy as np
 import cv2
 
 from ctypes import cdll
 import ctypes
-lib = cdll.LoadLibrary('./accumulator/qr.so')
+
+LIB_PATH = './accumulator/qr.so'
 
 
 class Allocator:
@@ -47,6 +67,64 @@ class Allocator:
         return self._data
 
 
+def load_library(path=LIB_PATH):
+    """
+    Load the accumulator dll.
+
+    Parameters
+    ----------
+    path: str
+        Location of qr.so.
+
+    Returns
+    -------
+    ctypes library or None if it could not be loaded or is missing
+    functions, accumulators then fall back to CpuTS.
+    """
+    try:
+        library = cdll.LoadLibrary(path)
+    except OSError:
+        return None
+
+    try:
+        bind(library)
+    except AttributeError as error:
+        warnings.warn(f"{path} is out of date, rebuild it with accumulator/compile.sh. "
+                      f"Using the numpy accumulator. ({error})")
+        return None
+
+    return library
+
+
+def bind(library):
+    """
+    Set the argument and return types of the accumulator dll's functions.
+
+    Raises
+    ------
+    AttributeError if a function is missing, e.g. qr.so was built from an
+    older main.cpp.
+    """
+    # Pointers do not fit in ctypes' default int
+    space = ctypes.c_void_p
+    library.init_ts.argtypes = [ctypes.c_int, ctypes.c_int]
+    library.init_ts.restype = space
+    library.parameterized_init_ts.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_uint, ctypes.c_void_p]
+    library.parameterized_init_ts.restype = space
+    library.accumulate.argtypes = [space]
+    library.convert_output.argtypes = [space, Allocator.CFUNCTYPE]
+    library.setup_buffers.argtypes = [space]
+    library.set_verticies.argtypes = [space, ctypes.c_uint, ctypes.c_void_p]
+    library.set_points.argtypes = [space, ctypes.c_uint, ctypes.c_void_p,
+                                   ctypes.c_float, ctypes.c_float, ctypes.c_float, ctypes.c_float]
+    library.upload.argtypes = [space]
+    library.read_output.argtypes = [space, ctypes.c_void_p]
+    library.destroy_ts.argtypes = [space]
+
+
+lib = load_library()
+
+
 class TS(object):
     """
     TS Space, bindings to accumulator in c++.
@@ -70,7 +148,7 @@ class TS(object):
             self.obj = lib.parameterized_init_ts(width, height, v_count, verticies_location)
 
         else:
-            self.obj = lib.init_ts()
+            self.obj = lib.init_ts(width, height)
 
     def accumulate(self):
         """
@@ -85,6 +163,445 @@ class TS(object):
         return img.data
 
 
+class CpuTS(object):
+    """
+    TS Space, numpy accumulator for machines without opengl.
+
+    Emulates the GL_LINES rasterization of the opengl accumulator: every
+    pair of verticies is a segment, each segment votes once for every pixel
+    it steps through along its major axis, the last pixel is left for the
+    next segment(half open like opengl's diamond exit rule). Row 0 of the
+    output is the bottom of the window, same as the gl buffer.
+
+    Parameters
+    ----------
+    width: int
+        Width of image.
+    height: int
+        Height of image.
+    verticies: numpy array[np.float32]
+        List of verticies in opengl coordinates, each vertex is a 3 tuple.
+        Every 2 verticies is a line.
+    """
+    # Max number of pixels rasterized in one batch, bounds temporary memory.
+    PIXEL_BATCH = 1 << 22
+
+    def __init__(self, width, height, verticies=None):
+        self.width = width
+        self.height = height
+
+        if verticies is None:
+            verticies = np.empty(0, np.float32)
+
+        self.set_verticies(verticies)
+
+    def set_verticies(self, verticies, weights=None):
+        """
+        Set the lines to accumulate.
+
+        Parameters
+        ----------
+        verticies: numpy array[np.float32]
+            List of verticies in opengl coordinates, every 2 verticies is a line.
+        weights: np array
+            Votes of each line, 1 if None.
+        """
+        assert not (len(verticies) // 3) % 2, "Need even number of verticies!"
+        assert weights is None or len(weights) == len(verticies) // 6, "Need a weight per line!"
+
+        self.verticies = verticies
+        self.points = None
+        self.weights = weights
+
+    def set_points(self, points, u_offset, v_offset, v_scale, d, weights=None):
+        """
+        Set the lines to accumulate from edge points, see ts_segments.
+
+        Parameters
+        ----------
+        points: np array
+            (n, 2) row and column of each point, any numeric dtype.
+        u_offset, v_offset, v_scale, d:
+            TS space layout, see ts_converter.get_ts_verticies.
+        weights: np array
+            Votes of each point, 1 if None.
+        """
+        points = np.asarray(points).reshape(-1, 2)
+
+        assert weights is None or len(weights) == len(points), "Need a weight per point!"
+
+        self.points = (points, u_offset, v_offset, v_scale, d)
+        self.verticies = None
+        self.weights = None if weights is None else np.repeat(weights, 2)
+
+    def accumulate(self, out=None):
+        """
+        Accumulate line overlaps in TS space.
+
+        Parameters
+        ----------
+        out: np array[uint32]
+            Contiguous (height, width) array to write the counts to.
+
+        Returns
+        -------
+        np array[uint32] of shape (height, width) with the number of lines
+        drawn on each pixel.
+        """
+        if self.points is not None:
+            return rasterize_segments(*ts_segments(*self.points), self.width, self.height,
+                                      self.PIXEL_BATCH, out, self.weights)
+
+        segments = np.asarray(self.verticies, np.float64).reshape(-1, 2, 3)
+
+        # opengl -> pixel coordinates, inverse of ts_converter.pix_to_opengl
+        x = (segments[:, :, 0] + 1.) * (self.width / 2.) - .5
+        y = (segments[:, :, 1] + 1.) * (self.height / 2.) - .5
+
+        return rasterize_segments(x[:, 0], y[:, 0], x[:, 1], y[:, 1],
+                                  self.width, self.height, self.PIXEL_BATCH, out, self.weights)
+
+
+def ts_segments(points, u_offset, v_offset, v_scale, d):
+    """
+    TS space lines of points in pixel coordinates.
+
+    Point (x, y) is the lines (0, x) -> (-d, -y) and (0, x) -> (d, y),
+    relative to the TS space origin. Same lines, in the same order, as
+    ts_converter.get_ts_verticies.
+
+    Parameters
+    ----------
+    points: np array
+        (n, 2) row and column of each point.
+    u_offset, v_offset, v_scale, d:
+        TS space layout, see ts_converter.get_ts_verticies.
+
+    Returns
+    -------
+    x0, y0, x1, y1: np arrays of the 2n line start and end points, the T
+    then S line of each point.
+    """
+    x = points[:, 0] * float(v_scale)
+    y = points[:, 1] * float(v_scale)
+
+    x0 = np.full(2 * len(points), float(u_offset))
+    y0 = np.repeat(x + v_offset, 2)
+
+    x1 = x0 + np.tile([-d, d], len(points))
+    y1 = np.stack((v_offset - y, v_offset + y), axis=-1).reshape(-1)
+
+    return x0, y0, x1, y1
+
+
+def rasterize_segments(x0, y0, x1, y1, width, height, batch=CpuTS.PIXEL_BATCH, out=None, weights=None):
+    """
+    Count the number of segments that pass through each pixel.
+
+    Parameters
+    ----------
+    x0, y0, x1, y1: np array
+        Segment start and end points in pixel coordinates.
+    width: int
+        Width of output.
+    height: int
+        Height of output.
+    batch: int
+        Max number of pixels to rasterize at once.
+    out: np array[uint32]
+        Contiguous (height, width) array to write to, zeroed first.
+    weights: np array
+        Votes of each segment, 1 if None. Weighted counts are rounded.
+
+    Returns
+    -------
+    np array[uint32] of shape (height, width).
+    """
+    if out is None:
+        out = np.zeros((height, width), np.uint32)
+    else:
+        out.fill(0)
+
+    counts = out.reshape(-1)
+
+    dx = x1 - x0
+    dy = y1 - y0
+
+    # DDA, one pixel per step along the major axis
+    steps = np.rint(np.maximum(np.abs(dx), np.abs(dy))).astype(np.int64)
+
+    drawn = steps > 0
+    x0, y0, steps = x0[drawn], y0[drawn], steps[drawn]
+
+    if weights is not None:
+        weights = np.asarray(weights, np.float64)[drawn]
+        totals = np.zeros(width * height)
+
+    x_step = dx[drawn] / steps
+    y_step = dy[drawn] / steps
+
+    ends = np.cumsum(steps)
+
+    first = 0
+    while first < len(steps):
+        # Take as many whole segments as fit in batch, always at least one
+        offset = ends[first] - steps[first]
+        last = max(np.searchsorted(ends, offset + batch, side='right'), first + 1)
+
+        lengths = steps[first:last]
+        segment = np.repeat(np.arange(first, last), lengths)
+        k = np.arange(ends[last - 1] - offset) - np.repeat(ends[first:last] - lengths - offset, lengths)
+
+        px = np.floor(x0[segment] + k * x_step[segment] + .5).astype(np.int64)
+        py = np.floor(y0[segment] + k * y_step[segment] + .5).astype(np.int64)
+
+        inside = (px >= 0) & (px < width) & (py >= 0) & (py < height)
+
+        pixels = py[inside] * width + px[inside]
+
+        if weights is None:
+            counts += np.bincount(pixels, minlength=width * height).astype(np.uint32)
+        else:
+            totals += np.bincount(pixels, weights[segment][inside], minlength=width * height)
+
+        first = last
+
+    if weights is not None:
+        np.rint(totals, out=totals)
+        counts[:] = totals
+
+    return out
+
+
+BACKENDS = {'gl': TS, 'cpu': CpuTS}
+
+
+def select_backend(name='auto'):
+    """
+    Choose a TS space accumulator.
+
+    Parameters
+    ----------
+    name: str
+        'gl', 'cpu' or 'auto'. Auto uses opengl when qr.so is loadable.
+
+    Returns
+    -------
+    Accumulator class, TS or CpuTS.
+    """
+    if name == 'auto':
+        name = 'gl' if lib is not None else 'cpu'
+
+    if name == 'gl' and lib is None:
+        raise OSError(f"Could not load {LIB_PATH}, compile it with accumulator/compile.sh.")
+
+    return BACKENDS[name]
+
+
+class AccumulatorSession(object):
+    """
+    Long lived accumulator for video, made once per resolution.
+
+    The opengl context, gpu buffers and output arrays are kept between
+    frames. Without an output array feed alternates between two of its own,
+    so the previous frame's counts stay valid while the next is made.
+
+    Parameters
+    ----------
+    width: int
+        Width of TS space.
+    height: int
+        Height of TS space.
+    backend: str
+        'gl', 'cpu' or 'auto', see select_backend.
+    n_buffers: int
+        Number of output arrays to cycle through.
+
+    Attributes
+    ----------
+    timings: dict
+        Seconds spent on setup and, for the last frame, upload, accumulate
+        and readback.
+    """
+    def __init__(self, width, height, backend='auto', n_buffers=2):
+        self.width = width
+        self.height = height
+
+        self.gl = select_backend(backend) is TS
+
+        start = time.perf_counter()
+
+        if self.gl:
+            self.obj = lib.init_ts(width, height)
+            lib.setup_buffers(self.obj)
+        else:
+            self.space = CpuTS(width, height)
+
+        self.buffers = [np.zeros((height, width), np.uint32) for _ in range(n_buffers)]
+        self._next = 0
+
+        self.timings = {'setup': time.perf_counter() - start, 'upload': 0., 'accumulate': 0., 'readback': 0.}
+
+    def feed(self, verticies, out=None, weights=None):
+        """
+        Accumulate a frame.
+
+        Parameters
+        ----------
+        verticies: numpy array[np.float32]
+            List of verticies in opengl coordinates, every 2 verticies is a line.
+        out: np array[uint32]
+            Contiguous (height, width) array to write to, the session's own
+            buffers are used if None.
+        weights: np array
+            Votes of each line, 1 if None. The opengl accumulator counts
+            every line once and scales the counts by the mean weight, only
+            exact when the weights are all the same, it warns otherwise.
+
+        Returns
+        -------
+        np array[uint32] of shape (height, width), see TS.accumulate.
+        """
+        if self.gl:
+            verticies = np.ascontiguousarray(verticies, np.float32)
+
+            def load():
+                lib.set_verticies(self.obj, len(verticies) // 3, verticies.ctypes.data)
+        else:
+            def load():
+                self.space.set_verticies(verticies, weights)
+
+        return self._accumulate(load, out, weights)
+
+    def feed_points(self, points, u_offset, v_offset, v_scale, d, out=None, weights=None):
+        """
+        Accumulate a frame of edge points, each point is turned into its TS
+        space lines by the accumulator.
+
+        Parameters
+        ----------
+        points: np array
+            (n, 2) row and column of each point, e.g. int16 or float32.
+        u_offset, v_offset, v_scale, d:
+            TS space layout, see ts_converter.get_ts_verticies.
+        out, weights:
+            See feed, weights are per point.
+
+        Returns
+        -------
+        np array[uint32] of shape (height, width), see TS.accumulate.
+        """
+        if self.gl:
+            points = np.ascontiguousarray(points, np.float32).reshape(-1, 2)
+
+            def load():
+                lib.set_points(self.obj, len(points), points.ctypes.data, u_offset, v_offset, v_scale, d)
+        else:
+            def load():
+                self.space.set_points(points, u_offset, v_offset, v_scale, d, weights)
+
+        return self._accumulate(load, out, weights)
+
+    def _accumulate(self, load, out, weights):
+        """
+        Time loading the lines, accumulating and reading back.
+
+        Parameters
+        ----------
+        load: callable
+            Sets the lines of the frame.
+        out, weights:
+            See feed.
+
+        Returns
+        -------
+        out, or the session buffer written to.
+        """
+        if out is None:
+            out = self.buffers[self._next]
+            self._next = (self._next + 1) % len(self.buffers)
+
+        assert out.shape == (self.height, self.width) and out.dtype == np.uint32 \
+            and out.flags.c_contiguous, "Output must be a contiguous (height, width) uint32 array!"
+
+        start = time.perf_counter()
+
+        load()
+
+        if self.gl:
+            lib.upload(self.obj)
+            uploaded = time.perf_counter()
+
+            lib.accumulate(self.obj)
+            accumulated = time.perf_counter()
+
+            lib.read_output(self.obj, out.ctypes.data)
+
+            if weights is not None and len(weights):
+                weights = np.asarray(weights)
+
+                if np.ptp(weights) > 1e-6 * np.abs(weights).max():
+                    warnings.warn("The opengl accumulator can not weight lines separately, counts are scaled "
+                                  "by the mean weight and differ from numpy's. Use EdgeReducer(cells=1) for "
+                                  "uniform weights.")
+
+                out[:] = np.rint(out * np.mean(weights))
+        else:
+            uploaded = time.perf_counter()
+
+            self.space.accumulate(out)
+            accumulated = time.perf_counter()
+
+        self.timings.update(upload=uploaded - start, accumulate=accumulated - uploaded,
+                            readback=time.perf_counter() - accumulated)
+
+        return out
+
+    def close(self):
+        """
+        Free the opengl context.
+        """
+        if getattr(self, 'obj', None) is not None:
+            lib.destroy_ts(self.obj)
+            self.obj = None
+
+    def __del__(self):
+        self.close()
+
+
+# Sessions of this thread by (width, height, backend), gl contexts belong to
+# the thread that made them
+_sessions = threading.local()
+
+
+def get_session(width, height, backend='auto'):
+    """
+    Session for a resolution, made on first use.
+
+    Parameters
+    ----------
+    width: int
+        Width of TS space.
+    height: int
+        Height of TS space.
+    backend: str
+        'gl', 'cpu' or 'auto', see select_backend.
+
+    Returns
+    -------
+    AccumulatorSession
+    """
+    if not hasattr(_sessions, 'cache'):
+        _sessions.cache = {}
+
+    key = (width, height, backend)
+
+    if key not in _sessions.cache:
+        _sessions.cache[key] = AccumulatorSession(width, height, backend)
+
+    return _sessions.cache[key]
+
+
 if __name__ == '__main__':
     # 0, 0 is in the middle of opengl, 1,1 is top right
     # https://www.khronos.org/registry/OpenGL-Refpages/gl4/html/gl_FragCoord.xhtml
@@ -106,7 +623,7 @@ if __name__ == '__main__':
         0.0, -1.0, 0.0,
         ], dtype=np.float32)
 
-    space = TS(1024, 768, VCOUNT, verticies.ctypes.data)
+    space = select_backend()(1024, 768, verticies)
     img = space.accumulate()
 
     print(dict(zip(np.unique(img), np.bincount(img.flatten()))))
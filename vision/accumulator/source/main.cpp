@@ -2,6 +2,8 @@
 
 #include <iostream>
 #include <cstdint>
+#include <vector>
+#include <algorithm>
 
 #include <GL/glew.h>
 #include <GLFW/glfw3.h>
@@ -21,7 +23,7 @@ const int INT_PER_VERTEX = 3;
 
 class TSSpace{
   public:
-		GLFWwindow* window;
+		GLFWwindow* window = nullptr;
 
 		const char* vshader = "shaders/vertex.glsl";
 		const char* fshader = "shaders/fragment_accumulator.glsl";
@@ -31,11 +33,19 @@ class TSSpace{
 		GLsizeiptr BUFF_DATA_SIZE;
 
 		GLuint tex, buf;
+		GLuint VertexArrayID, vertexbuffer, programID;
+
+		// gl objects are made once and reused by every accumulate
+		bool buffers_ready = false;
+		bool uploaded = false;
 
 		GLuint VCOUNT, VSIZE;
 		GLsizeiptr VERTEX_DATA_SIZE;
   		float *vertex_buffer_data = nullptr;
 
+		// Verticies expanded from points by set_points, reused between frames
+		std::vector<float> point_verticies;
+
   	TSSpace(const int width, const int height){
 		/* 
 		@fn TSSpace
@@ -121,6 +131,15 @@ class TSSpace{
 		BUFF_DATA_SIZE = BUFF_SIZE * sizeof(uint32_t);
 	}
 
+	void make_current(){
+		/*
+		@fn make_current
+		@breif Make this space's context current, sessions of other sizes in
+		the same thread have their own.
+		*/
+		glfwMakeContextCurrent(window);
+	}
+
 	void set_verticies(const GLuint vertex_count, float *vertex_values){
 		/* 
 		@fn set_verticies
@@ -136,22 +155,80 @@ class TSSpace{
 		vertex_buffer_data = vertex_values;
 	}
 
-	void accumulate(){
+	void set_points(const GLuint point_count, const float *points, const float u_offset, const float v_offset,
+			const float v_scale, const float d){
 		/* 
-		@fn accumulate
-		@breif Counts number of lines drawn on each pixel.
+		@fn set_points
+		@breif Sets space verticies from edge points, each point is a T and an S line.
+
+		Point (x, y) is the polyline (-d, -y), (0, x), (d, y) in TS space, drawn as the
+		lines (0, x) -> (-d, -y) and (0, x) -> (d, y) in opengl coordinates.
+
+		@param point_count uint Number of points.
+		@param points float* XY(row, column) of each point.
+		@param u_offset float U of the TS space origin, pixels.
+		@param v_offset float V of the TS space origin, pixels.
+		@param v_scale float Pixels per unit of v.
+		@param d float Spacing between axis along u.
+		*/
+		// pixel -> opengl, new = (2 * old + 1) / size - 1
+		const float u_scale = 2.f / WIDTH, u_shift = 1.f / WIDTH - 1.f;
+		const float gl_v_scale = 2.f * v_scale / HEIGHT, v_shift = (2.f * v_offset + 1.f) / HEIGHT - 1.f;
 
-		@pre Opengl is initialized, verticies are set and shaders exist.
+		const float u_left = (u_offset - d) * u_scale + u_shift;
+		const float u_middle = u_offset * u_scale + u_shift;
+		const float u_right = (u_offset + d) * u_scale + u_shift;
+
+		point_verticies.resize((size_t) point_count * 4 * INT_PER_VERTEX);
+
+		float *vertex = point_verticies.data();
+		for(GLuint i = 0; i < point_count; i++, vertex += 4 * INT_PER_VERTEX){
+			const float x = points[2 * i] * gl_v_scale + v_shift;
+			const float y = points[2 * i + 1] * gl_v_scale;
+
+			const float values[4 * INT_PER_VERTEX] = {
+				u_middle, x, 0.f, u_left, v_shift - y, 0.f,
+				u_middle, x, 0.f, u_right, v_shift + y, 0.f};
+
+			std::copy(values, values + 4 * INT_PER_VERTEX, vertex);
+		}
+
+		set_verticies(point_count * 4, point_verticies.data());
+	}
+
+	~TSSpace(){
+		/*
+		@fn ~TSSpace
+		@breif Free gl objects and the window.
 		*/
+		if(window == nullptr)
+			return;
 
-		// setup
-		GLuint *filler = new GLuint[BUFF_SIZE];
-		for(int i = 0; i < BUFF_SIZE; i++)
-			filler[i] = 0;
+		glfwMakeContextCurrent(window);
+
+		if(buffers_ready){
+			glDeleteBuffers(1, &buf);
+			glDeleteTextures(1, &tex);
+			glDeleteBuffers(1, &vertexbuffer);
+			glDeleteVertexArrays(1, &VertexArrayID);
+			glDeleteProgram(programID);
+		}
+
+		glfwDestroyWindow(window);
+	}
+
+	void setup_buffers(){
+		/*
+		@fn setup_buffers
+		@breif Create output buffer, vertex buffer and shader program.
+
+		@pre Opengl is initialized and shaders exist.
+		*/
+		make_current();
 
 		glGenBuffers(1, &buf);
 		glBindBuffer(GL_TEXTURE_BUFFER, buf);
-		glBufferData(GL_TEXTURE_BUFFER, BUFF_DATA_SIZE, filler, GL_DYNAMIC_COPY);
+		glBufferData(GL_TEXTURE_BUFFER, BUFF_DATA_SIZE, NULL, GL_DYNAMIC_COPY);
 
 		glGenTextures(1, &tex);
 		glBindTexture(GL_TEXTURE_BUFFER, tex); 
@@ -159,16 +236,51 @@ class TSSpace{
 
 		glBindImageTexture(0, tex, 0, GL_FALSE, 0, GL_READ_WRITE, GL_R32UI); 
 
-		GLuint VertexArrayID;
 		glGenVertexArrays(1, &VertexArrayID);
 		glBindVertexArray(VertexArrayID);
 
-		GLuint vertexbuffer;
 		glGenBuffers(1, &vertexbuffer);
+
+		programID = LoadShaders(vshader, fshader); 
+
+		buffers_ready = true;
+	}
+
+	void upload(){
+		/*
+		@fn upload
+		@breif Copy verticies to the gpu.
+
+		@pre Verticies are set.
+		*/
+		make_current();
+
+		if(!buffers_ready)
+			setup_buffers();
+
 		glBindBuffer(GL_ARRAY_BUFFER, vertexbuffer);
-		glBufferData(GL_ARRAY_BUFFER, VERTEX_DATA_SIZE, vertex_buffer_data, GL_STATIC_DRAW);
+		glBufferData(GL_ARRAY_BUFFER, VERTEX_DATA_SIZE, vertex_buffer_data, GL_STREAM_DRAW);
 
-		GLuint programID = LoadShaders(vshader, fshader); 
+		uploaded = true;
+	}
+
+	void accumulate(){
+		/* 
+		@fn accumulate
+		@breif Counts number of lines drawn on each pixel.
+
+		@pre Opengl is initialized, verticies are set and shaders exist.
+		*/
+		make_current();
+
+		// setup
+		if(!uploaded)
+			upload();
+
+		// zero last frame's counts on the gpu
+		const GLuint zero = 0;
+		glBindBuffer(GL_TEXTURE_BUFFER, buf);
+		glClearBufferData(GL_TEXTURE_BUFFER, GL_R32UI, GL_RED_INTEGER, GL_UNSIGNED_INT, &zero);
 
 		// process
 		//do {
@@ -181,18 +293,36 @@ class TSSpace{
 		glVertexAttribPointer(0, INT_PER_VERTEX, GL_FLOAT, GL_FALSE, 0, (void*)0);
 
  		glUseProgram(programID);
+		glUniform1i(glGetUniformLocation(programID, "width"), WIDTH);
 		
 		glDrawArrays(GL_LINES, 0, VCOUNT);
 
 		glDisableVertexAttribArray(0);
 	
 		glfwSwapBuffers(window);
+
+		glMemoryBarrier(GL_BUFFER_UPDATE_BARRIER_BIT);
+		glFinish();
 		
 		// DEBUG
 		//glfwPollEvents();
 		//}while( glfwGetKey(window, GLFW_KEY_ESCAPE ) != GLFW_PRESS && glfwWindowShouldClose(window) == 0 );
-	
-		delete[] filler;
+
+		uploaded = false;
+	}
+
+	void read_output(uint32_t * output){
+		/* 
+		@fn read_output
+		@breif Copy processed data to output, the window is kept for the next accumulate.
+
+		@pre Buffer id buf contains processed values. Size allocated at output = BUFF_SIZE.
+
+		@param output uint* Location of gpu buffer to end go.
+		*/
+		make_current();
+
+		glGetNamedBufferSubData(buf, 0, BUFF_DATA_SIZE, output);
 	}
 
 	void convert_output(uint32_t * output){
@@ -204,8 +334,9 @@ class TSSpace{
 
 		@param output uint* Location of gpu buffer to end go.
 		*/
-		glGetNamedBufferSubData(buf, 0, BUFF_DATA_SIZE, output);
+		read_output(output);
 		glfwDestroyWindow(window);  // cannot destroy window before read
+		window = nullptr;
 	}
 };
 
@@ -269,4 +400,13 @@ extern "C" {
 		space->convert_output(data);
 	}
 
+	// Persistent session, see py_to_cpp.AccumulatorSession
+	void setup_buffers(TSSpace* space){space->setup_buffers();}
+	void set_verticies(TSSpace* space, const GLuint v_count, float *verticies){space->set_verticies(v_count, verticies);}
+	void set_points(TSSpace* space, const GLuint p_count, float *points, const float u_offset, const float v_offset,
+			const float v_scale, const float d){space->set_points(p_count, points, u_offset, v_offset, v_scale, d);}
+	void upload(TSSpace* space){space->upload();}
+	void read_output(TSSpace* space, uint32_t *output){space->read_output(output);}
+	void destroy_ts(TSSpace* space){delete space;}
+
 }
\ No newline at end of file
@@ -0,0 +1,312 @@
+"""
+Time each stage of the vision pipeline over a fixed synthetic corpus.
+
+Every stage is timed on the output of the stage before it, for each
+resolution. Mean and percentile times and the peak memory allocated are
+written to json. When a baseline is given, any stage slower or hungrier
+than the baseline by more than the tolerance is reported and the exit code
+is 1.
+
+Usage
+-----
+python3 -m benchmarks.stages --save-baseline benchmarks/baseline.json   On a known good tree.
+python3 -m benchmarks.stages --baseline benchmarks/baseline.json        Check for regressions.
+"""
+import sys
+import json
+import time
+import platform
+import tracemalloc
+from argparse import ArgumentParser
+
+import cv2
+import numpy as np
+
+from generator.QrCode import QrCode
+from generator.dataset import Augmentation, render_frame
+from normalize.edges import get_edges
+from normalize.ts_converter import binarize_mat, get_ts_verticies, pix_to_opengl
+from accumulator.py_to_cpp import AccumulatorSession
+from accumulator.maxima import find_maxima, maxima_to_lines
+from processing.crop_n_stitch import stitch
+from lines.pclines import ts_parameters, V_SCALE
+
+RESOLUTIONS = ((320, 240), (640, 480), (1280, 960))
+
+PERCENTILES = (50, 95, 99)
+
+# Threshold of binarize_mat, same as the qr-pipeline demo
+EDGE_THRESHOLD = .5
+
+# Differences below these are noise, not regressions
+SLACK_MS = .05
+SLACK_BYTES = 1 << 16
+
+
+def corpus(width, height, count, seed=0):
+    """
+    Synthetic frames, the same for the same arguments.
+
+    Parameters
+    ----------
+    width, height: int
+        Frame size.
+    count: int
+        Number of frames.
+    seed: int
+        Frame i is made from seed + i.
+
+    Returns
+    -------
+    List of (frame, value).
+    """
+    frames = []
+    for index in range(count):
+        rng = np.random.RandomState(seed + index)
+        value = str(rng.randint(0, 10000)).zfill(4)
+
+        frame, _ = render_frame(value, width, height, Augmentation(), rng)
+        frames.append((frame, value))
+
+    return frames
+
+
+def load_read():
+    """
+    processing.read.read, None when libzbar is not installed.
+    """
+    try:
+        from processing.read import read
+    except ImportError:
+        return None
+
+    return read
+
+
+def stages():
+    """
+    Stages to time, in pipeline order.
+
+    Returns
+    -------
+    List of (name, func, make_input). func is timed, make_input turns a
+    corpus frame and the previous stage's output into func's arguments.
+    """
+    ts_width, ts_height, u_offset, v_offset, d = ts_parameters()
+
+    session = AccumulatorSession(ts_width, ts_height, backend='cpu')
+
+    def verticies(binary):
+        return get_ts_verticies(binary, u_offset, v_offset, V_SCALE, d)
+
+    def maxima(accumulated):
+        return maxima_to_lines(*find_maxima(accumulated), d, u_offset, v_offset)
+
+    def fragments(frame, value):
+        qr = QrCode(value)
+        return (qr.top_right_corner, qr.top_left_corner, qr.bottom_left_corner, qr.bottom_right_corner)
+
+    table = [
+        ('get_edges', get_edges, lambda frame, value, previous: (frame,)),
+        ('binarize_mat', binarize_mat, lambda frame, value, previous: (previous, EDGE_THRESHOLD)),
+        ('get_ts_verticies', verticies, lambda frame, value, previous: (previous,)),
+        ('pix_to_opengl', pix_to_opengl, lambda frame, value, previous: (previous, ts_width, ts_height)),
+        ('accumulate', session.feed, lambda frame, value, previous: (previous,)),
+        ('maxima', maxima, lambda frame, value, previous: (previous,)),
+        ('stitch', stitch, lambda frame, value, previous: fragments(frame, value)),
+    ]
+
+    read = load_read()
+
+    if read is not None:
+        table.append(('read', read, lambda frame, value, previous: (previous,)))
+
+    return table
+
+
+def peak_memory(func, args):
+    """
+    Peak bytes allocated by python and numpy during a call.
+    """
+    tracemalloc.start()
+
+    try:
+        func(*args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def summarize(times, peaks):
+    """
+    Statistics of a stage, times in milliseconds.
+    """
+    times = np.array(times) * 1e3
+
+    summary = {'mean_ms': float(times.mean())}
+    summary.update({f'p{q}_ms': float(value) for q, value in zip(PERCENTILES, np.percentile(times, PERCENTILES))})
+    summary['peak_bytes'] = int(max(peaks))
+    summary['samples'] = len(times)
+
+    return summary
+
+
+def run(resolutions=RESOLUTIONS, count=5, repeat=5, seed=0):
+    """
+    Benchmark every stage at every resolution.
+
+    Parameters
+    ----------
+    resolutions: list of (width, height)
+        Frame sizes.
+    count: int
+        Frames per resolution.
+    repeat: int
+        Times each stage is run per frame.
+    seed: int
+        Corpus seed.
+
+    Returns
+    -------
+    dict of resolution -> stage -> statistics, see summarize.
+    """
+    results = {}
+
+    for width, height in resolutions:
+        frames = corpus(width, height, count, seed)
+        table = stages()
+
+        times = {name: [] for name, _, _ in table}
+        peaks = {name: [] for name, _, _ in table}
+
+        for frame, value in frames:
+            previous = None
+
+            for name, func, make_input in table:
+                args = make_input(frame, value, previous)
+
+                # Warm caches and pools before timing
+                previous = func(*args)
+
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    func(*args)
+                    times[name].append(time.perf_counter() - start)
+
+                peaks[name].append(peak_memory(func, args))
+
+        results[f'{width}x{height}'] = {name: summarize(times[name], peaks[name]) for name, _, _ in table}
+
+    return results
+
+
+def compare(results, baseline, tolerance=1.5, memory_tolerance=1.5, statistic='p50_ms'):
+    """
+    Stages that got worse than a baseline.
+
+    Parameters
+    ----------
+    results: dict
+        Output of run.
+    baseline: dict
+        Output of run on a known good tree.
+    tolerance: float
+        Max ratio of a stage's time to its baseline time.
+    memory_tolerance: float
+        Max ratio of a stage's peak memory to its baseline.
+    statistic: str
+        Time statistic compared, the median is the least noisy.
+
+    Returns
+    -------
+    List of str describing each regression, empty if none. Stages missing
+    from the baseline are not compared, differences within SLACK_MS and
+    SLACK_BYTES are ignored.
+    """
+    regressions = []
+
+    for resolution, stage_results in results.items():
+        for stage, result in stage_results.items():
+            reference = baseline.get(resolution, {}).get(stage)
+
+            if reference is None:
+                continue
+
+            if result[statistic] > reference[statistic] * tolerance + SLACK_MS:
+                regressions.append(f'{resolution} {stage}: {statistic} {result[statistic]:.3f} > '
+                                   f'{tolerance} x {reference[statistic]:.3f}')
+
+            if result['peak_bytes'] > reference['peak_bytes'] * memory_tolerance + SLACK_BYTES:
+                regressions.append(f'{resolution} {stage}: peak_bytes {result["peak_bytes"]} > '
+                                   f'{memory_tolerance} x {reference["peak_bytes"]}')
+
+    return regressions
+
+
+def environment():
+    """
+    Versions the timings depend on.
+    """
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+    }
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+
+    parser.add_argument('--out', type=str, dest='out', default='benchmark.json',
+                        help='File to write the results to.')
+    parser.add_argument('--baseline', type=str, dest='baseline',
+                        help='Results of a known good tree to compare against.')
+    parser.add_argument('--save-baseline', type=str, dest='save_baseline',
+                        help='Also write the results as a baseline here.')
+    parser.add_argument('--tolerance', type=float, dest='tolerance', default=1.5,
+                        help='Max slowdown of a stage relative to the baseline.')
+    parser.add_argument('--memory-tolerance', type=float, dest='memory_tolerance', default=1.5,
+                        help='Max peak memory growth of a stage relative to the baseline.')
+    parser.add_argument('--frames', type=int, dest='frames', default=5,
+                        help='Frames per resolution.')
+    parser.add_argument('--repeat', type=int, dest='repeat', default=5,
+                        help='Runs of each stage per frame.')
+    parser.add_argument('--resolutions', type=str, dest='resolutions', nargs='+',
+                        help='Frame sizes as WIDTHxHEIGHT, defaults to 320x240 640x480 1280x960.')
+
+    options = parser.parse_args()
+
+    resolutions = RESOLUTIONS
+    if options.resolutions:
+        resolutions = [tuple(int(v) for v in resolution.split('x')) for resolution in options.resolutions]
+
+    # Single threaded opencv, timings should not depend on the core count
+    cv2.setNumThreads(1)
+
+    results = run(resolutions, options.frames, options.repeat)
+
+    report = {'environment': environment(), 'results': results}
+
+    for path in filter(None, (options.out, options.save_baseline)):
+        with open(path, 'w') as file:
+            json.dump(report, file, indent=2)
+
+    for resolution, stage_results in results.items():
+        print(resolution)
+
+        for stage, result in stage_results.items():
+            print(f'    {stage:<18} mean {result["mean_ms"]:9.3f}ms  p95 {result["p95_ms"]:9.3f}ms  '
+                  f'peak {result["peak_bytes"] / 2 ** 20:8.2f}MiB')
+
+    if options.baseline:
+        with open(options.baseline) as file:
+            baseline = json.load(file)['results']
+
+        regressions = compare(results, baseline, options.tolerance, options.memory_tolerance)
+
+        for regression in regressions:
+            print(f'REGRESSION {regression}')
+
+        sys.exit(1 if regressions else 0)
@@ -40,6 +40,7 @@ class QrCode(object):
     UPSCALE_FACTOR = 5
 
     def __init__(self, value='0'):
+        self._cache = {}
         self.encoded_value = value
 
     def show(self, title=TITLE):
@@ -63,30 +64,76 @@ class QrCode(object):
         """Getter for the value the QR code represents"""
         return self._encoded_value
 
+    def _memoize(self, name, make):
+        """
+        Derived image, made on first access and kept until the encoded
+        value changes. Callers should not modify it.
+
+        Parameters
+        ----------
+        name : str
+            Key of the image.
+        make : callable
+            Makes the image.
+
+        Returns
+        -------
+        np array
+        """
+        if name not in self._cache:
+            self._cache[name] = make()
+
+        return self._cache[name]
+
+    def _make_img(self):
+        """Encodes the value as a greyscale image, 0 black and 255 white."""
+        qr = qrcode.QRCode(
+            version=1,
+            error_correction=qrcode.constants.ERROR_CORRECT_H,
+            box_size=10,
+            border=2,
+        )
+
+        qr.add_data(str(self.encoded_value))
+        qr.make(fit=True)
+
+        img = qr.make_image(fill_color="black", back_color="white")
+
+        # Through the buffer protocol instead of a python sequence of pixels
+        return np.array(img.convert('L'), dtype=np.uint8)
+
     @property
     def img(self):
         """Getter for the QR code as an OpenCV compatible image"""
-        return self._img
+        return self._memoize('img', self._make_img)
 
     @property
     def top_left_corner(self):
         """Gets the top left corner segment of the QR code."""
-        return self._top_left_corner
+        return self._memoize('top_left_corner', lambda: self.img[:self.mid_y(), :self.mid_x()])
 
     @property
     def top_right_corner(self):
         """Gets the top right corner segment of the QR code."""
-        return self._top_right_corner
+        return self._memoize('top_right_corner', lambda: self.img[:self.mid_y(), self.mid_x():])
 
     @property
     def bottom_left_corner(self):
         """Gets the bottom left corner segment of the QR code."""
-        return self._bottom_left_corner
+        return self._memoize('bottom_left_corner', lambda: self.img[self.mid_y():, :self.mid_x()])
 
     @property
     def bottom_right_corner(self):
         """Gets the bottom right corner segment of the QR code."""
-        return self._bottom_right_corner
+        return self._memoize('bottom_right_corner', lambda: self.img[self.mid_y():, self.mid_x():])
+
+    @property
+    def _corner_width(self):
+        return self.top_left_corner.shape[1]
+
+    @property
+    def _corner_height(self):
+        return self.top_left_corner.shape[0]
 
     def mid_y(self):
         """Gets the midpoint of the image along the y-axis"""
@@ -100,12 +147,16 @@ class QrCode(object):
     def combined_image(self):
         """
         Gets a image with 4 QR code segments separated out to simulate IARC
-        Mission 8.
+        Mission 8. Made once per encoded value.
         """
+        return self._memoize('combined_image', self._make_combined_image)
+
+    def _make_combined_image(self):
+        """Lays out the 4 segments and the plaintext value."""
 
         # Create image and read in border mask.
-        self._combined_image = (np.ones((self._corner_width*QrCode.UPSCALE_FACTOR,
-            self._corner_width*QrCode.UPSCALE_FACTOR, 3))*255).astype(np.uint8)
+        self._combined_image = np.full((self._corner_width*QrCode.UPSCALE_FACTOR,
+            self._corner_width*QrCode.UPSCALE_FACTOR, 3), 255, np.uint8)
 
         # border_img_path = 'border.png'
         # border = cv2.imread(border_img_path, cv2.IMREAD_GRAYSCALE)
@@ -173,21 +224,6 @@ class QrCode(object):
         """
 
         self._encoded_value = value
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_H,
-            box_size=10,
-            border=2,
-        )
-
-        qr.add_data(str(value))
-        qr.make(fit=True)
 
-        img = qr.make_image(fill_color="black", back_color="white")
-        self._img = np.asarray(img.getdata()).reshape(img.size[0], img.size[1]).astype(np.uint8)
-        self._top_left_corner = self.img[:self.mid_y(), :self.mid_x()]
-        self._bottom_left_corner = self.img[self.mid_y():, :self.mid_x()]
-        self._top_right_corner = self.img[:self.mid_y(), self.mid_x():]
-        self._bottom_right_corner = self.img[self.mid_y():, self.mid_x():]
-        self._corner_width = self.top_left_corner.shape[1]
-        self._corner_height = self.top_left_corner.shape[0]
\ No newline at end of file
+        # Derived images are remade on their next access
+        self._cache.clear()
\ No newline at end of file
@@ -0,0 +1,300 @@
+"""
+Generate synthetic mission frames for benchmarking the vision pipeline.
+
+Each frame is a QrCode.combined_image layout of a random value, warped
+into the frame with a random perspective and optionally blurred, hit with
+noise bursts and partly occluded. Frames are written to a memory mapped
+.npy stack with a json sidecar of the ground truth: the value, the corners
+of each fragment and the equations of its sides.
+
+Usage
+-----
+python3 -m generator.dataset --frames 1000 --out frames.npy --workers 4
+
+Frames can then be streamed with np.load(path, mmap_mode='r'), or run with
+python3 qr-pipeline.py --batch frames.npy.
+"""
+import os
+import json
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from generator.QrCode import QrCode, BORDER_SIZE
+
+# Fragments in the order of their ground truth
+FRAGMENTS = ('top_left', 'top_right', 'bottom_left', 'bottom_right')
+
+# Slope used for sides along a row, y = mx + b can not hold them exactly
+MAX_SLOPE = 1e9
+
+
+class Augmentation(object):
+    """
+    How frames are distorted.
+
+    Parameters
+    ----------
+    perspective: float
+        Max distance each layout corner moves, relative to the layout size.
+    scale: (float, float)
+        Range of the layout's size relative to the frame's shorter side.
+    blur: float
+        Max gaussian blur sigma.
+    noise: float
+        Chance of a frame getting a burst of noise.
+    occlusion: float
+        Chance of a frame being partly covered.
+    """
+    def __init__(self, perspective=.1, scale=(.5, .9), blur=1.5, noise=.3, occlusion=.2):
+        self.perspective = perspective
+        self.scale = scale
+        self.blur = blur
+        self.noise = noise
+        self.occlusion = occlusion
+
+
+def side_equations(corners):
+    """
+    Lines through the sides of a quadrilateral.
+
+    Parameters
+    ----------
+    corners: np array
+        4 (x, y) corners, clockwise from the top left, x is the row.
+
+    Returns
+    -------
+    np array of 4 (m, b) lines y = mx + b, top, right, bottom then left.
+    """
+    start, end = corners, np.roll(corners, -1, axis=0)
+
+    dx = end[:, 0] - start[:, 0]
+    dy = end[:, 1] - start[:, 1]
+
+    # Sides along a row get a very steep slope instead of an infinite one
+    with np.errstate(divide='ignore', invalid='ignore'):
+        m = dy / dx
+
+    m = np.where(np.isfinite(m), np.clip(m, -MAX_SLOPE, MAX_SLOPE), MAX_SLOPE)
+
+    return np.stack((m, start[:, 1] - m * start[:, 0]), axis=-1)
+
+
+def fragment_rectangles(qr):
+    """
+    Corners of each fragment in the combined image.
+
+    Parameters
+    ----------
+    qr: QrCode
+        Code the combined image is of.
+
+    Returns
+    -------
+    dict of fragment -> np array of 4 (x, y) corners clockwise from the top
+    left, x is the row.
+    """
+    height, width = qr.top_left_corner.shape[:2]
+    size = width * QrCode.UPSCALE_FACTOR
+
+    near, far = BORDER_SIZE, size - BORDER_SIZE
+
+    tops = {'top': near, 'bottom': far - height}
+    lefts = {'left': near, 'right': far - width}
+
+    rectangles = {}
+    for fragment in FRAGMENTS:
+        vertical, horizontal = fragment.split('_')
+        top, left = tops[vertical], lefts[horizontal]
+
+        rectangles[fragment] = np.array([[top, left], [top, left + width],
+                                         [top + height, left + width], [top + height, left]], float)
+
+    return rectangles
+
+
+def render_frame(value, width, height, augmentation, rng):
+    """
+    Make a frame of a qr code's mission layout.
+
+    Parameters
+    ----------
+    value: str
+        Value to encode.
+    width, height: int
+        Frame size.
+    augmentation: Augmentation
+        Distortions to apply.
+    rng: np.random.RandomState
+        Source of randomness.
+
+    Returns
+    -------
+    frame, truth: 2d np array[uint8] and dict of the ground truth.
+    """
+    qr = QrCode(value)
+
+    layout = cv2.cvtColor(qr.combined_image, cv2.COLOR_BGR2GRAY)
+    size = layout.shape[0]
+
+    # Layout corners in the frame, (column, row) for cv2
+    side = min(width, height) * rng.uniform(*augmentation.scale)
+    center = np.array([width, height]) / 2. + rng.uniform(-.5, .5, 2) * (np.array([width, height]) - side)
+
+    square = np.array([[-1, -1], [1, -1], [1, 1], [-1, 1]]) * side / 2.
+    jitter = rng.uniform(-1, 1, (4, 2)) * augmentation.perspective * side
+
+    src = np.float32([[0, 0], [size, 0], [size, size], [0, size]])
+    dst = np.float32(center + square + jitter)
+
+    h = cv2.getPerspectiveTransform(src, dst)
+
+    background = int(rng.randint(0, 256))
+    frame = cv2.warpPerspective(layout, h, (width, height), flags=cv2.INTER_LINEAR,
+                                borderMode=cv2.BORDER_CONSTANT, borderValue=background)
+
+    fragments = []
+    for fragment, corners in fragment_rectangles(qr).items():
+        points = cv2.perspectiveTransform(np.float64(corners[None, :, ::-1]), h)[0, :, ::-1]
+
+        fragments.append({
+            'fragment': fragment,
+            'corners': points.tolist(),
+            'lines': side_equations(points).tolist(),
+        })
+
+    if augmentation.occlusion and rng.rand() < augmentation.occlusion:
+        # Something in front of the screen, up to a third of the layout
+        extent = (rng.uniform(.05, .33, 2) * side).astype(int)
+        corner = (dst.min(axis=0) + rng.rand(2) * (dst.max(axis=0) - dst.min(axis=0) - extent)).astype(int)
+        cv2.rectangle(frame, tuple(int(v) for v in corner), tuple(int(v) for v in corner + extent),
+                      int(rng.randint(0, 256)), -1)
+
+    if augmentation.blur:
+        sigma = rng.uniform(0, augmentation.blur)
+
+        if sigma > .3:
+            cv2.GaussianBlur(frame, (0, 0), sigma, dst=frame)
+
+    if augmentation.noise and rng.rand() < augmentation.noise:
+        # Burst of sensor noise over part of the frame
+        burst_height, burst_width = rng.randint(height // 8, height + 1), rng.randint(width // 8, width + 1)
+        top, left = rng.randint(0, height - burst_height + 1), rng.randint(0, width - burst_width + 1)
+
+        region = frame[top:top + burst_height, left:left + burst_width]
+        noise = rng.normal(0, rng.uniform(10, 60), region.shape)
+        region[...] = np.clip(region + noise, 0, 255)
+
+    return frame, {'value': value, 'fragments': fragments}
+
+
+def _render_chunk(path, indices, width, height, augmentation, seed):
+    """
+    Render frames straight into the stack, in a worker process.
+
+    Returns
+    -------
+    List of ground truth dicts of the frames.
+    """
+    cv2.setNumThreads(1)
+
+    frames = np.load(path, mmap_mode='r+')
+
+    truths = []
+    for index in indices:
+        rng = np.random.RandomState(seed + index)
+        value = str(rng.randint(0, 10000)).zfill(4)
+
+        frames[index], truth = render_frame(value, width, height, augmentation, rng)
+
+        truth['index'] = int(index)
+        truths.append(truth)
+
+    frames.flush()
+
+    return truths
+
+
+def generate(path, count, width=640, height=480, augmentation=None, workers=None, seed=0, chunksize=16):
+    """
+    Generate a stack of frames across a process pool.
+
+    Parameters
+    ----------
+    path: str
+        .npy file to write the (count, height, width) uint8 stack to, the
+        ground truth goes to the same path with a .json extension.
+    count: int
+        Number of frames.
+    width, height: int
+        Frame size.
+    augmentation: Augmentation
+        Distortions, the defaults if None.
+    workers: int
+        Number of processes, defaults to the number of cpus.
+    seed: int
+        Frame i is made from seed + i, the same seed gives the same frames.
+    chunksize: int
+        Frames rendered per task.
+
+    Returns
+    -------
+    Path of the ground truth sidecar.
+    """
+    if augmentation is None:
+        augmentation = Augmentation()
+
+    frames = np.lib.format.open_memmap(path, mode='w+', dtype=np.uint8, shape=(count, height, width))
+    del frames
+
+    chunks = [range(start, min(start + chunksize, count)) for start in range(0, count, chunksize)]
+
+    truths = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_render_chunk, path, chunk, width, height, augmentation, seed)
+                   for chunk in chunks]
+
+        for future in futures:
+            truths.extend(future.result())
+
+    sidecar = os.path.splitext(path)[0] + '.json'
+
+    with open(sidecar, 'w') as file:
+        json.dump({'width': width, 'height': height, 'seed': seed, 'frames': truths}, file)
+
+    return sidecar
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+
+    parser.add_argument('--frames', type=int, dest='frames', default=1000,
+                        help='Number of frames to generate.')
+    parser.add_argument('--out', type=str, dest='out', default='frames.npy',
+                        help='.npy stack to write, the ground truth goes next to it as .json.')
+    parser.add_argument('--width', type=int, dest='width', default=640)
+    parser.add_argument('--height', type=int, dest='height', default=480)
+    parser.add_argument('--workers', type=int, dest='workers',
+                        help='Number of processes, defaults to the cpu count.')
+    parser.add_argument('--seed', type=int, dest='seed', default=0)
+    parser.add_argument('--perspective', type=float, dest='perspective', default=.1,
+                        help='Max corner movement relative to the layout size.')
+    parser.add_argument('--blur', type=float, dest='blur', default=1.5,
+                        help='Max gaussian blur sigma.')
+    parser.add_argument('--noise', type=float, dest='noise', default=.3,
+                        help='Chance of a noise burst per frame.')
+    parser.add_argument('--occlusion', type=float, dest='occlusion', default=.2,
+                        help='Chance of an occlusion per frame.')
+
+    options = parser.parse_args()
+
+    augmentation = Augmentation(options.perspective, blur=options.blur, noise=options.noise,
+                                occlusion=options.occlusion)
+
+    sidecar = generate(options.out, options.frames, options.width, options.height, augmentation,
+                       options.workers, options.seed)
+
+    print(f'Wrote {options.frames} frames to {options.out}, ground truth to {sidecar}')
@@ -0,0 +1,174 @@
+"""
+Find the fastest line detector that is accurate enough, per resolution.
+
+Each available detector runs on synthetic frames(generator.dataset) that
+went through the pipeline's preprocessing. A detector's accuracy is the
+fraction of fragment sides matched by one of its strongest distinct lines.
+The fastest detector meeting the target is stored for lines.detectors.
+select_detector.
+
+Usage
+-----
+python3 -m lines.calibrate --resolutions 640x480 1280x960 --target .5
+"""
+import os
+import json
+import time
+from argparse import ArgumentParser
+
+import numpy as np
+
+from generator.dataset import Augmentation, render_frame
+from normalize.preprocess import Preprocessor
+from lines.cluster import cluster_lines, line_normals, aligned_differences
+from lines.detectors import DETECTORS, CALIBRATION_PATH, available_detectors, make_detector
+
+
+def corpus(width, height, count, seed=0):
+    """
+    Preprocessed synthetic frames and their fragment sides.
+
+    Returns
+    -------
+    List of (edges, sides), sides an (n, 2) np array of (m, b).
+    """
+    preprocessor = Preprocessor()
+
+    frames = []
+    for index in range(count):
+        rng = np.random.RandomState(seed + index)
+        value = str(rng.randint(0, 10000)).zfill(4)
+
+        frame, truth = render_frame(value, width, height, Augmentation(), rng)
+
+        sides = np.concatenate([fragment['lines'] for fragment in truth['fragments']])
+        frames.append((preprocessor(frame).copy(), sides))
+
+    return frames
+
+
+def recall(lines, sides, center, n_lines=32, angle_tolerance=np.radians(2), offset_tolerance=4.):
+    """
+    Fraction of true sides matched by a detected line.
+
+    Parameters
+    ----------
+    lines: np array[LINE_DTYPE]
+        Detected lines.
+    sides: np array
+        (n, 2) true (m, b) lines.
+    center: (x, y)
+        Image center, see cluster.line_normals.
+    n_lines: int
+        Only this many of the strongest distinct lines count.
+    angle_tolerance, offset_tolerance:
+        Max differences of a match, radians and pixels.
+
+    Returns
+    -------
+    float in [0, 1]
+    """
+    lines = cluster_lines(lines, center=center, max_lines=n_lines)
+
+    if not len(lines):
+        return 0.
+
+    theta, rho = line_normals(lines['m'], lines['b'], center)
+    true_theta, true_rho = line_normals(sides[:, 0], sides[:, 1], center)
+
+    angle, offset, _ = aligned_differences(true_theta[:, None], true_rho[:, None], theta[None, :], rho[None, :])
+    matched = (np.abs(angle) <= angle_tolerance) & (np.abs(offset) <= offset_tolerance)
+
+    return float(matched.any(axis=1).mean())
+
+
+def evaluate(detector, frames, repeat=3):
+    """
+    Time and accuracy of a detector.
+
+    Returns
+    -------
+    dict of mean time in milliseconds and mean recall.
+    """
+    times, recalls = [], []
+
+    for edges, sides in frames:
+        center = (edges.shape[0] / 2, edges.shape[1] / 2)
+
+        # First run warms sessions and caches
+        lines = detector(edges)
+        recalls.append(recall(lines, sides, center))
+
+        for _ in range(repeat):
+            start = time.perf_counter()
+            detector(edges)
+            times.append(time.perf_counter() - start)
+
+    return {'time_ms': float(np.mean(times) * 1e3), 'recall': float(np.mean(recalls))}
+
+
+def calibrate(width, height, target=.5, count=8, names=None, seed=0):
+    """
+    Pick the fastest accurate detector for a resolution.
+
+    Parameters
+    ----------
+    width, height: int
+        Frame size.
+    target: float
+        Min recall of the chosen detector.
+    count: int
+        Frames to evaluate on.
+    names: list of str
+        Detectors to try, every available one if None.
+    seed: int
+        Corpus seed.
+
+    Returns
+    -------
+    dict of the chosen detector(None if none met the target), the target
+    and every detector's results.
+    """
+    frames = corpus(width, height, count, seed)
+
+    results = {name: evaluate(make_detector(name), frames) for name in names or available_detectors()}
+
+    accurate = [name for name, result in results.items() if result['recall'] >= target]
+    chosen = min(accurate, key=lambda name: results[name]['time_ms']) if accurate else None
+
+    return {'detector': chosen, 'target': target, 'results': results}
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+
+    parser.add_argument('--resolutions', type=str, dest='resolutions', nargs='+', default=['640x480'],
+                        help='Frame sizes as WIDTHxHEIGHT.')
+    parser.add_argument('--target', type=float, dest='target', default=.5,
+                        help='Min fraction of fragment sides found.')
+    parser.add_argument('--frames', type=int, dest='frames', default=8,
+                        help='Frames per resolution.')
+    parser.add_argument('--detectors', type=str, dest='detectors', nargs='+', choices=sorted(DETECTORS),
+                        help='Detectors to try, defaults to every available one.')
+    parser.add_argument('--out', type=str, dest='out', default=CALIBRATION_PATH,
+                        help='Calibration file, resolutions not calibrated now are kept.')
+
+    options = parser.parse_args()
+
+    calibration = {}
+    if os.path.exists(options.out):
+        with open(options.out) as file:
+            calibration = json.load(file)
+
+    for resolution in options.resolutions:
+        width, height = (int(v) for v in resolution.split('x'))
+
+        calibration[resolution] = calibrate(width, height, options.target, options.frames, options.detectors)
+
+        for name, result in calibration[resolution]['results'].items():
+            print(f'{resolution} {name:<12} {result["time_ms"]:9.2f}ms  recall {result["recall"]:.2f}')
+
+        print(f'{resolution} -> {calibration[resolution]["detector"]}')
+
+    with open(options.out, 'w') as file:
+        json.dump(calibration, file, indent=2)
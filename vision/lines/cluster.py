@@ -0,0 +1,287 @@
+"""
+Merge near duplicate PC Lines maxima and find the fragments they bound.
+
+One physical edge leaves many maxima in TS space, slightly different
+slopes and intercepts. Lines are compared by the angle of their direction
+and their signed distance from a center point, where nearby lines are close
+no matter how steep they are.
+"""
+import cv2
+import numpy as np
+
+from accumulator.maxima import LINE_DTYPE
+from processing.crop_n_stitch import quadrilateral
+
+
+def line_normals(m, b, center=(0., 0.)):
+    """
+    Angle and offset of lines y = mx + b.
+
+    Parameters
+    ----------
+    m, b: np arrays
+        Slope and intercept of each line, x is the row.
+    center: (x, y)
+        Offsets are measured from here, e.g. the image center.
+
+    Returns
+    -------
+    theta, rho: direction angle in (-pi/2, pi/2) and signed distance from
+    center. (theta + pi, -rho) is the same line.
+    """
+    theta = np.arctan(np.asarray(m, float))
+
+    # cos(theta) y - sin(theta) x = rho, relative to center
+    rho = np.cos(theta) * (np.asarray(b, float) - center[1]) + np.sin(theta) * center[0]
+
+    return theta, rho
+
+
+def normals_to_lines(theta, rho, center=(0., 0.)):
+    """
+    Slope and intercept of lines, inverse of line_normals.
+    """
+    cos, sin = np.cos(theta), np.sin(theta)
+
+    return sin / cos, (rho - sin * center[0]) / cos + center[1]
+
+
+def aligned_differences(theta, rho, other_theta, other_rho):
+    """
+    Angle and offset differences between lines, after turning the other
+    lines by pi where that brings their angles closer.
+
+    Returns
+    -------
+    angle, offset, flip: differences and +-1 for how the other rho was
+    turned, broadcast over the inputs.
+    """
+    turns = np.round((theta - other_theta) / np.pi)
+
+    flip = np.where(turns % 2, -1., 1.)
+
+    return theta - other_theta - turns * np.pi, rho - flip * other_rho, flip
+
+
+def cluster_lines(lines, angle_tolerance=np.radians(2), offset_tolerance=4., center=(0., 0.), max_lines=None):
+    """
+    Merge lines that are near duplicates.
+
+    The line with the most votes seeds a cluster of every line within the
+    tolerances of it, the cluster becomes their vote weighted mean line.
+    Repeats with the lines left.
+
+    Parameters
+    ----------
+    lines: np array[LINE_DTYPE]
+        Lines, e.g. from PCLines.
+    angle_tolerance: float
+        Max angle between lines of a cluster, radians.
+    offset_tolerance: float
+        Max distance between lines of a cluster, pixels.
+    center: (x, y)
+        Point offsets are measured from, the image center keeps offsets of
+        lines through the image small.
+    max_lines: int
+        Number of clusters to make, all lines are clustered if None.
+
+    Returns
+    -------
+    np array[LINE_DTYPE] of distinct lines sorted by votes, votes are the
+    sum of the cluster's.
+    """
+    lines = np.sort(lines, order='votes')[::-1]
+
+    theta, rho = line_normals(lines['m'], lines['b'], center)
+    weights = lines['votes'].astype(float)
+
+    angle, offset, flip = aligned_differences(theta[:, None], rho[:, None], theta[None, :], rho[None, :])
+    close = (np.abs(angle) <= angle_tolerance) & (np.abs(offset) <= offset_tolerance)
+
+    remaining = np.ones(len(lines), bool)
+    clusters = []
+
+    while remaining.any() and (max_lines is None or len(clusters) < max_lines):
+        seed = np.argmax(remaining)
+
+        members = close[seed] & remaining
+        remaining &= ~members
+
+        # Mean in the seed's orientation
+        weight = weights[members] / max(weights[members].sum(), 1.)
+        mean_theta = theta[seed] - (angle[seed, members] * weight).sum()
+        mean_rho = (flip[seed, members] * rho[members] * weight).sum()
+
+        clusters.append((mean_theta, mean_rho, lines['votes'][members].sum(), lines['space'][seed]))
+
+    merged = np.zeros(len(clusters), LINE_DTYPE)
+
+    if clusters:
+        mean_theta, mean_rho, votes, space = zip(*clusters)
+
+        merged['m'], merged['b'] = normals_to_lines(np.array(mean_theta), np.array(mean_rho), center)
+        merged['votes'] = votes
+        merged['space'] = space
+
+    return merged[np.argsort(merged['votes'], kind='stable')[::-1]]
+
+
+def quadrilateral_candidates(lines, parallel_tolerance=np.radians(10), perpendicular_tolerance=np.radians(30),
+                             min_size=10., center=(0., 0.)):
+    """
+    Every way distinct lines bound a quadrilateral, scored.
+
+    Sides come in two pairs of near parallel lines at least min_size
+    apart, the pairs near perpendicular. The score is the votes of the 4
+    sides times how square it is, the ratio of its shorter to longer side
+    separation.
+
+    Parameters
+    ----------
+    lines: np array[LINE_DTYPE]
+        Distinct lines, see cluster_lines.
+    parallel_tolerance: float
+        Max angle between opposite sides, radians.
+    perpendicular_tolerance: float
+        Max difference from a right angle between adjacent sides, radians.
+    min_size: float
+        Min distance between opposite sides, pixels.
+    center: (x, y)
+        See line_normals.
+
+    Returns
+    -------
+    sides, scores: (n, 4) np array of line indices, opposite sides
+    first, and np array of n scores, best first.
+    """
+    theta, rho = line_normals(lines['m'], lines['b'], center)
+    votes = lines['votes'].astype(float)
+
+    # Pairs of opposite sides
+    first, second = np.triu_indices(len(lines), 1)
+
+    angle, offset, _ = aligned_differences(theta[first], rho[first], theta[second], rho[second])
+    parallel = (np.abs(angle) <= parallel_tolerance) & (np.abs(offset) >= min_size)
+
+    first, second, separation = first[parallel], second[parallel], np.abs(offset[parallel])
+    pair_theta = theta[first] - angle[parallel] / 2
+
+    # Two pairs that are near perpendicular
+    a, b = np.triu_indices(len(first), 1)
+
+    between = np.abs(aligned_differences(pair_theta[a], 0., pair_theta[b], 0.)[0])
+    perpendicular = np.abs(between - np.pi / 2) <= perpendicular_tolerance
+
+    a, b = a[perpendicular], b[perpendicular]
+
+    sides = np.stack((first[a], second[a], first[b], second[b]), axis=-1)
+
+    squareness = np.minimum(separation[a], separation[b]) / np.maximum(separation[a], separation[b])
+    scores = votes[sides].sum(axis=1) * squareness
+
+    order = np.argsort(-scores, kind='stable')
+
+    return sides[order], scores[order]
+
+
+def perimeter_coverage(edges, corners, samples=64):
+    """
+    Fraction of the least covered side of a quadrilateral lying on edges.
+
+    Lines found by PC Lines run across the whole image, this tells sides
+    that are really there from sides made of lines of other edges.
+
+    Parameters
+    ----------
+    edges: 2d np array
+        Binary edge map, 1 on edges.
+    corners: np array
+        (n, 4, 2) (x, y) corners of n quadrilaterals.
+    samples: int
+        Points checked per side.
+
+    Returns
+    -------
+    np array of n fractions in [0, 1].
+    """
+    # Edges can be a pixel off the fitted side
+    near = cv2.dilate((edges == 1).view(np.uint8), np.ones((3, 3), np.uint8))
+
+    steps = np.linspace(0., 1., samples, endpoint=False)[:, None]
+
+    start = corners[:, :, None, :]
+    end = np.roll(corners, -1, axis=1)[:, :, None, :]
+
+    points = np.rint(start + (end - start) * steps).astype(np.int64)
+
+    inside = np.all((points >= 0) & (points < edges.shape[:2]), axis=-1)
+    points = np.where(inside[..., None], points, 0)
+
+    # Every side has to be there, not just most of the perimeter
+    return np.where(inside, near[points[..., 0], points[..., 1]], 0).mean(axis=2).min(axis=1)
+
+
+def fragment_quadrilaterals(lines, edges=None, n_fragments=4, max_lines=16, max_candidates=256, min_score=0.,
+                            **candidate_options):
+    """
+    Best scoring quadrilateral of each fragment.
+
+    Candidates are taken best first, skipping any whose bounding box
+    overlaps one already taken.
+
+    Parameters
+    ----------
+    lines: np array[LINE_DTYPE]
+        Distinct lines sorted by votes, see cluster_lines.
+    edges: 2d np array
+        Edge map the lines are from. When given, the best candidates are
+        rescored by how much of their least covered side is on an edge
+        times how square they are.
+    n_fragments: int
+        Number of quadrilaterals to find.
+    max_lines: int
+        Only the lines with the most votes are considered.
+    max_candidates: int
+        Number of best candidates rescored and searched.
+    min_score: float
+        Candidates scoring lower are never taken.
+    candidate_options:
+        See quadrilateral_candidates.
+
+    Returns
+    -------
+    List of (sides, corners, score): np array[LINE_DTYPE] of the 4 sides,
+    np array of 4 (x, y) corners clockwise from the top left and the score,
+    best first.
+    """
+    lines = lines[:max_lines]
+
+    sides, scores = quadrilateral_candidates(lines, **candidate_options)
+    sides, scores = sides[:max_candidates], scores[:max_candidates]
+
+    corners = np.array([quadrilateral(lines[indices]) for indices in sides]).reshape(-1, 4, 2)
+
+    if edges is not None and len(sides):
+        # Votes only broke ties for the rescoring, keep the squareness
+        squareness = scores / lines['votes'][sides].astype(float).sum(axis=1)
+        scores = perimeter_coverage(edges, corners) * squareness
+
+        order = np.argsort(-scores, kind='stable')
+        sides, scores, corners = sides[order], scores[order], corners[order]
+
+    boxes = []
+    fragments = []
+
+    for indices, points, score in zip(sides, corners, scores):
+        if len(fragments) == n_fragments or score < min_score:
+            break
+
+        low, high = points.min(axis=0), points.max(axis=0)
+
+        if any(np.all(low < other_high) and np.all(other_low < high) for other_low, other_high in boxes):
+            continue
+
+        boxes.append((low, high))
+        fragments.append((lines[indices], points, float(score)))
+
+    return fragments
@@ -0,0 +1,293 @@
+"""
+Interchangeable line detectors.
+
+Every detector takes a binary edge map(1 on edges) and returns an np
+array[LINE_DTYPE] of (m, b, votes, space) lines y = mx + b sorted by votes,
+x is the row, the same as PCLines:
+- `PCLinesDetector` -- PC Lines on the opengl or numpy accumulator.
+- `HoughDetector` -- cv2.HoughLinesP, votes are segment lengths.
+- `LSDDetector` -- cv2's line segment detector, votes are segment lengths.
+
+Use `make_detector` to make one by name, `select_detector` for the one
+lines/calibrate.py found fastest for a resolution.
+"""
+import os
+import json
+
+import cv2
+import numpy as np
+
+from accumulator.maxima import LINE_DTYPE
+from accumulator.py_to_cpp import lib
+from lines.pclines import PCLines
+
+# Written by lines/calibrate.py
+CALIBRATION_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'calibration.json')
+
+# Slope used for lines along a row, y = mx + b can not hold them exactly
+MAX_SLOPE = 1e9
+
+
+def segments_to_lines(x0, y0, x1, y1, votes):
+    """
+    Lines through segments.
+
+    Parameters
+    ----------
+    x0, y0, x1, y1: np arrays
+        Segment end points, x is the row.
+    votes: np array
+        Strength of each segment.
+
+    Returns
+    -------
+    np array[LINE_DTYPE] sorted by votes.
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        m = (y1 - y0) / (x1 - x0)
+
+    m = np.where(np.isfinite(m), np.clip(m, -MAX_SLOPE, MAX_SLOPE), MAX_SLOPE)
+
+    lines = np.zeros(len(m), LINE_DTYPE)
+    lines['m'] = m
+    lines['b'] = y0 - m * x0
+    lines['votes'] = np.rint(votes)
+
+    # Same spaces as PC Lines, S holds m <= 0
+    lines['space'] = np.where(m > 0, 'T', 'S')
+
+    return lines[np.argsort(lines['votes'], kind='stable')[::-1]]
+
+
+class LineDetector(object):
+    """
+    Base of line detectors.
+
+    Subclasses implement detect and set name.
+    """
+    name = None
+
+    @classmethod
+    def available(cls):
+        """
+        Whether the detector can run on this machine.
+        """
+        return True
+
+    def detect(self, edges):
+        """
+        Find lines in an edge map.
+
+        Parameters
+        ----------
+        edges: 2d np array
+            Binary edge map, 1 on edges.
+
+        Returns
+        -------
+        np array[LINE_DTYPE] sorted by votes.
+        """
+        raise NotImplementedError
+
+    def __call__(self, edges):
+        return self.detect(edges)
+
+
+class PCLinesDetector(LineDetector):
+    """
+    PC Lines, see lines.pclines.PCLines.
+
+    Parameters
+    ----------
+    backend: str
+        Accumulator, 'gl' or 'cpu'.
+    neighbourhood, threshold, scale, reducer:
+        See PCLines.
+    """
+    def __init__(self, backend='cpu', neighbourhood=3, threshold=1, scale=1, reducer=None):
+        self.backend = backend
+        self.neighbourhood = neighbourhood
+        self.threshold = threshold
+        self.scale = scale
+        self.reducer = reducer
+
+    @property
+    def name(self):
+        return f'pclines-{self.backend}'
+
+    def detect(self, edges):
+        return PCLines(edges, self.neighbourhood, self.threshold, self.scale, self.backend, self.reducer)
+
+
+class PCLinesGLDetector(PCLinesDetector):
+    """
+    PC Lines on the opengl accumulator, needs qr.so.
+    """
+    def __init__(self, **options):
+        super().__init__('gl', **options)
+
+    @classmethod
+    def available(cls):
+        return lib is not None
+
+
+class PCLinesCPUDetector(PCLinesDetector):
+    """
+    PC Lines on the numpy accumulator.
+    """
+    def __init__(self, **options):
+        super().__init__('cpu', **options)
+
+
+class HoughDetector(LineDetector):
+    """
+    Probabilistic hough transform.
+
+    Parameters
+    ----------
+    threshold: int
+        Min votes of a segment.
+    min_length: float
+        Min segment length, pixels.
+    max_gap: float
+        Max gap between pixels of a segment, pixels.
+    """
+    name = 'hough'
+
+    def __init__(self, threshold=50, min_length=30, max_gap=5):
+        self.threshold = threshold
+        self.min_length = min_length
+        self.max_gap = max_gap
+
+    def detect(self, edges):
+        segments = cv2.HoughLinesP((edges == 1).view(np.uint8), 1, np.pi / 180, self.threshold,
+                                   minLineLength=self.min_length, maxLineGap=self.max_gap)
+
+        return lines_from_cv2(segments)
+
+
+class LSDDetector(LineDetector):
+    """
+    Line segment detector, fits segments to the edge map's gradients.
+
+    Parameters
+    ----------
+    min_length: float
+        Shorter segments are dropped, pixels.
+    """
+    name = 'lsd'
+
+    def __init__(self, min_length=30):
+        self.min_length = min_length
+
+        self._lsd = None
+
+    @classmethod
+    def available(cls):
+        return hasattr(cv2, 'createLineSegmentDetector')
+
+    def detect(self, edges):
+        if self._lsd is None:
+            self._lsd = cv2.createLineSegmentDetector()
+
+        segments = self._lsd.detect(np.where(edges == 1, 255, 0).astype(np.uint8))[0]
+
+        return lines_from_cv2(segments, self.min_length)
+
+
+def lines_from_cv2(segments, min_length=0.):
+    """
+    Lines of cv2 segments.
+
+    Parameters
+    ----------
+    segments: np array or None
+        (n, 1, 4) segments (x1, y1, x2, y2), x is the column.
+    min_length: float
+        Shorter segments are dropped.
+
+    Returns
+    -------
+    np array[LINE_DTYPE], votes are segment lengths.
+    """
+    if segments is None:
+        return np.zeros(0, LINE_DTYPE)
+
+    columns0, rows0, columns1, rows1 = segments.reshape(-1, 4).astype(float).T
+
+    length = np.hypot(rows1 - rows0, columns1 - columns0)
+    keep = length >= max(min_length, 1e-9)
+
+    return segments_to_lines(rows0[keep], columns0[keep], rows1[keep], columns1[keep], length[keep])
+
+
+DETECTORS = {
+    'pclines-gl': PCLinesGLDetector,
+    'pclines-cpu': PCLinesCPUDetector,
+    'hough': HoughDetector,
+    'lsd': LSDDetector,
+}
+
+
+def available_detectors():
+    """
+    Names of the detectors that can run on this machine.
+    """
+    return [name for name, detector in DETECTORS.items() if detector.available()]
+
+
+def make_detector(name='auto', **options):
+    """
+    Make a line detector.
+
+    Parameters
+    ----------
+    name: str
+        Key of DETECTORS, 'auto' is PC Lines on opengl when qr.so loads and
+        numpy otherwise.
+    options:
+        Passed to the detector.
+
+    Returns
+    -------
+    LineDetector
+    """
+    if name == 'auto':
+        name = 'pclines-gl' if PCLinesGLDetector.available() else 'pclines-cpu'
+
+    detector = DETECTORS[name]
+
+    if not detector.available():
+        raise OSError(f"Line detector {name} is not available on this machine.")
+
+    return detector(**options)
+
+
+def select_detector(width, height, path=CALIBRATION_PATH):
+    """
+    Detector calibrated for a resolution, see lines/calibrate.py.
+
+    Parameters
+    ----------
+    width, height: int
+        Frame size.
+    path: str
+        Calibration file.
+
+    Returns
+    -------
+    LineDetector, make_detector('auto') when the resolution was not
+    calibrated or its detector is not available.
+    """
+    name = 'auto'
+
+    if os.path.exists(path):
+        with open(path) as file:
+            calibration = json.load(file)
+
+        name = calibration.get(f'{width}x{height}', {}).get('detector', 'auto')
+
+    if name not in DETECTORS or not DETECTORS[name].available():
+        name = 'auto'
+
+    return make_detector(name)
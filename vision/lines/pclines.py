@@ -0,0 +1,341 @@
+"""
+PC Lines line detection at full resolution or coarse to fine.
+"""
+import numpy as np
+
+from accumulator.py_to_cpp import get_session
+from accumulator.maxima import find_maxima, maxima_to_lines, LINE_DTYPE
+from accumulator.incremental import IncrementalAccumulator
+
+N_MAXIMA = 500
+
+V_SCALE = 1
+
+# TS space size at scale 1
+TS_WIDTH = 1024  # >=  2 * D + 10
+TS_HEIGHT = 768  # >= max(IMG_WIDTH, IMG_HEIGHT)
+
+
+def ts_parameters(scale=1):
+    """
+    Size and layout of TS space.
+
+    Parameters
+    ----------
+    scale: float
+        Size relative to the full 1024x768 space.
+
+    Returns
+    -------
+    width, height, u_offset, v_offset, d
+    """
+    width = int(TS_WIDTH * scale)
+    height = int(TS_HEIGHT * scale)
+
+    return width, height, width // 2, height // 2, width // 2 - 1
+
+
+def accumulate_points(x, y, scale=1, backend='auto', weights=None):
+    """
+    Accumulate the TS space lines of points.
+
+    Parameters
+    ----------
+    x, y: np arrays
+        Row and column of each point.
+    scale: float
+        TS space size, see ts_parameters.
+    backend: str
+        'gl', 'cpu' or 'auto', see py_to_cpp.select_backend.
+    weights: np array
+        Votes of each point, 1 if None, see AccumulatorSession.feed_points.
+
+    Returns
+    -------
+    np array[uint32] of votes, indexed [v, u]. Owned by the accumulator
+    session, valid until the next accumulation of this size.
+    """
+    width, height, u_offset, v_offset, d = ts_parameters(scale)
+
+    # Accumulators make the TS space lines of each point themselves
+    points = np.stack((x, y), axis=-1)
+
+    # Opengl accumulator when qr.so loads, numpy otherwise
+    return get_session(width, height, backend).feed_points(points, u_offset, v_offset, V_SCALE, d,
+                                                           weights=weights)
+
+
+def PCLines(edges, neighbourhood=3, threshold=1, scale=1, backend='auto', reducer=None):
+    """
+    PC Lines algorithm for detecting lines.
+
+    Parameters
+    ----------
+    edges: image
+        Values to calculate line formula from.
+    neighbourhood: int
+        Width of the area a TS space maxima must be the largest value in.
+    threshold: int
+        Minimum number of votes for a maxima to be a line.
+    scale: float
+        TS space size relative to 1024x768, see ts_parameters.
+    backend: str
+        Accumulator, 'gl', 'cpu' or 'auto'.
+    reducer: normalize.reduce.EdgeReducer
+        Thins and subsamples the edges to bound the points accumulated,
+        every edge pixel is accumulated if None.
+
+    Returns
+    -------
+    Detected slope intercept parameters, np array[LINE_DTYPE] of
+    (m, b, votes, space) sorted by votes. x is the row and y the column
+    of edges.
+
+    Description
+    -----------
+    Convert cartesian to line segments in Twisted and Straight space.
+    Straight space consists of the parralel axes x', y'.
+    Twisted space consists of the parralel axes x', -y'.
+
+       v    T          S
+       |-y        |x         |y
+       |          |          |
+       |          |          |
+    ---|----------|----------|---u
+       |-d        |0         |d
+       |          |          |
+       |          |          |
+    (T and S space attatched in the uv plane. Parralel axes separated by
+    distance d along the u axis. Each parralel axis is length v.)
+
+    The length of the axis u and v does not need to be infinite. u only
+    needs to fill cover the interval [-d, d], v needs to cover the interval
+    [-max(W/2, H/2), max(W/2, H/2)] (W is width of plane, H is height).
+
+    Line formulas are calculated in slope intercept form. Local maxima
+    in TS space, above a theshold, are thought to be relevant lines.
+
+    Line formula based on space:
+        ℓ: y = mx + b
+        ℓS = (d, b, 1 − m),  −∞ ≤ m ≤ 0
+        ℓT = (−d, −b, 1 + m),  0 ≤ m ≤ ∞.
+
+        ℓ has one image in TS space; except when m = 0 or m = ±∞, 
+        meaning, when ℓ lies in both spaces either on axis x' or y'.
+
+        Attaching the y′ and −y′ axes results in an enclosed Mobius strip.
+
+    Slope based on location
+        ℓ is between x' & y' iff −∞ < m < 0.
+        ℓ is between x' & -y' iff 0 < m < ∞.
+        ℓ is on the x' axis for vertical lines m = ±∞.
+        ℓ is on the y', -y' axis at m=0.
+        ℓ is an ideal point, at infinity, at m=1.
+    """
+    if reducer is None:
+        x, y = np.nonzero(edges == 1)
+        weights = None
+    else:
+        x, y, weights = reducer(edges)
+
+    accumulated = accumulate_points(x, y, scale, backend, weights)
+
+    # cv2.imshow("img", np.where(accumulated[::-1] > 0, 1, 0.))
+    # cv2.waitKey(0)
+
+    _, _, u_offset, v_offset, d = ts_parameters(scale)
+
+    maxima = find_maxima(accumulated, N_MAXIMA, neighbourhood, threshold)
+
+    return maxima_to_lines(*maxima, d, u_offset, v_offset)
+
+
+class IncrementalPCLines(object):
+    """
+    PC Lines for consecutive video frames.
+
+    TS space is kept between frames and only updated with the edge pixels
+    that changed, see accumulator.incremental. Call from a single thread.
+
+    Parameters
+    ----------
+    neighbourhood, threshold, scale:
+        See PCLines.
+    rebuild_every: int
+        Frames between full accumulations.
+    """
+    def __init__(self, neighbourhood=3, threshold=1, scale=1, rebuild_every=100):
+        self.neighbourhood = neighbourhood
+        self.threshold = threshold
+
+        width, height, self.u_offset, self.v_offset, self.d = ts_parameters(scale)
+
+        self.accumulator = IncrementalAccumulator(width, height, self.u_offset, self.v_offset,
+                                                  V_SCALE, self.d, rebuild_every)
+
+    def __call__(self, edges):
+        """
+        Detect the lines of the next frame.
+
+        Parameters
+        ----------
+        edges: image
+            Binary edge map.
+
+        Returns
+        -------
+        np array[LINE_DTYPE], see PCLines.
+        """
+        accumulated = self.accumulator.update(edges)
+
+        maxima = find_maxima(accumulated, N_MAXIMA, self.neighbourhood, self.threshold)
+
+        return maxima_to_lines(*maxima, self.d, self.u_offset, self.v_offset)
+
+
+def line_to_ts(m, b, d):
+    """
+    Location of lines in TS space, inverse of maxima_to_lines.
+
+    Parameters
+    ----------
+    m, b: np arrays
+        Slope and intercept of each line.
+    d: float
+        Spacing between axis along u.
+
+    Returns
+    -------
+    u, v: np arrays relative to the TS space origin.
+    """
+    # S space holds m <= 0, T space m > 0
+    divisor = np.where(m > 0, -(1 + m), 1 - m)
+
+    return d / divisor, b / divisor
+
+
+def downscale_edges(edges, factor):
+    """
+    Shrink an edge map, a pixel is an edge if any pixel it covers is.
+
+    Parameters
+    ----------
+    edges: 2d np array
+        Binary edge map.
+    factor: int
+        Amount to shrink by.
+
+    Returns
+    -------
+    2d np array[uint8] edge map.
+    """
+    height, width = edges.shape[0] // factor, edges.shape[1] // factor
+
+    blocks = (edges[:height * factor, :width * factor] == 1).reshape(height, factor, width, factor)
+
+    return blocks.any(axis=(1, 3)).view(np.uint8)
+
+
+def window_votes(x, y, u, v, window, d):
+    """
+    Accumulate points only in a square window of TS space.
+
+    Each point's S or T segment is sampled once per TS space column in the
+    window, instead of rasterizing it over the whole space.
+
+    Parameters
+    ----------
+    x, y: np arrays
+        Row and column of each point.
+    u, v: int
+        Center of the window relative to the TS space origin.
+    window: int
+        Half width of the window.
+    d: float
+        Spacing between axis along u.
+
+    Returns
+    -------
+    2d np array[int] of votes, indexed [v, u] from the window's corner.
+    """
+    size = 2 * window + 1
+
+    columns = np.arange(u - window, u + window + 1)
+
+    # S: (0, x) -> (d, y), T: (0, x) -> (-d, -y)
+    ends = np.where(columns >= 0, y[:, None], -y[:, None])
+    rows = x[:, None] + (ends - x[:, None]) * (np.abs(columns) / d)
+
+    rows = np.floor(rows + .5).astype(int) - (v - window)
+    columns = np.broadcast_to(np.arange(size), rows.shape)
+
+    inside = (rows >= 0) & (rows < size)
+
+    return np.bincount(rows[inside] * size + columns[inside], minlength=size * size).reshape(size, size)
+
+
+def multiscale_PCLines(edges, factor=2, n_lines=16, band=2, window=4, neighbourhood=3, threshold=1):
+    """
+    Coarse to fine PC Lines.
+
+    Candidates are found by PCLines on a downscaled edge map with a TS
+    space shrunk by the same factor. Each candidate is refined by
+    accumulating the full resolution edge pixels near it only in a small
+    TS space window around where the candidate is expected, see
+    window_votes. The cost follows the number of lines instead of the
+    number of pixels.
+
+    Parameters
+    ----------
+    edges: image
+        Binary edge map.
+    factor: int
+        Downscale factor of the coarse level, 2 or 4.
+    n_lines: int
+        Number of coarse candidates to refine.
+    band: float
+        Max distance in pixels of an edge pixel from a candidate to be
+        used in its refinement.
+    window: int
+        Refined maxima are searched for within this many TS space pixels
+        of the candidate.
+    neighbourhood, threshold:
+        See PCLines.
+
+    Returns
+    -------
+    np array[LINE_DTYPE] of refined lines sorted by votes.
+    """
+    candidates = PCLines(downscale_edges(edges, factor), neighbourhood, threshold, 1. / factor)[:n_lines]
+
+    x, y = np.nonzero(edges == 1)
+
+    d = ts_parameters()[4]
+
+    # Same slope, intercept scales with the image
+    m, b = candidates['m'], candidates['b'] * factor
+
+    u, v = line_to_ts(m, b, d)
+    u, v = np.rint(u).astype(int), np.rint(v).astype(int)
+
+    lines = np.zeros(len(candidates), LINE_DTYPE)
+
+    for i in range(len(candidates)):
+        near = np.abs(m[i] * x - y + b[i]) <= band * np.sqrt(m[i] ** 2 + 1)
+
+        votes = window_votes(x[near], y[near], u[i], v[i], window, d)
+
+        if votes.max() < threshold:
+            continue
+
+        row, column = np.unravel_index(np.argmax(votes), votes.shape)
+
+        lines[i] = maxima_to_lines([u[i] + column - window], [v[i] + row - window], [votes[row, column]],
+                                   d, 0, 0)[0]
+
+    lines = lines[lines['votes'] > 0]
+
+    # Candidates refined to the same line are kept once
+    lines = lines[np.unique(lines[['m', 'b']], return_index=True)[1]]
+
+    return lines[np.argsort(lines['votes'], kind='stable')[::-1]]
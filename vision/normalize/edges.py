@@ -1,19 +1,136 @@
 """
 Greyscale, blur and get edges of an image
 """
+import threading
+
 import cv2
 import numpy as np
 
+# Output depth of the laplacian for each dtype
+DEPTHS = {
+    np.dtype(np.float64): cv2.CV_64F,
+    np.dtype(np.float32): cv2.CV_32F,
+    np.dtype(np.int16): cv2.CV_16S,
+}
+
+
+class EdgeDetector(object):
+    """
+    Find edges with a box blur and laplacian, or canny.
+
+    Kernels and working buffers are kept between calls, so a detector
+    should not be shared between threads.
+
+    Parameters
+    ----------
+    dtype: np dtype
+        Laplacian output type, float64, float32 or int16.
+    canny: bool
+        Use canny instead, outputs a uint8 binary edge map(1 on edges).
+        Images must be uint8. Hysteresis follows edges past the roi
+        padding, so edges of a roi can differ from the full image's.
+    canny_thresholds: (float, float)
+        Hysteresis thresholds for canny.
+    """
+    # Box blur, laplacian(ksize 1) and its border reach this far
+    PADDING = 3
+
+    def __init__(self, dtype=np.float64, canny=False, canny_thresholds=(50, 150)):
+        self.dtype = np.dtype(np.uint8 if canny else dtype)
+        self.canny = canny
+        self.canny_thresholds = canny_thresholds
+
+        assert canny or self.dtype in DEPTHS, f"Unsupported dtype {dtype}!"
+
+        self.kernel = np.ones((5, 5), np.float32)/5
+
+        self._grey = None
+        self._filtered = None
+        self._edges = None
+
+    def _buffer(self, name, shape, dtype):
+        """
+        Working buffer, remade when the shape or type changes.
+        """
+        buffer = getattr(self, name)
+
+        if buffer is None or buffer.shape != shape or buffer.dtype != dtype:
+            buffer = np.empty(shape, dtype)
+            setattr(self, name, buffer)
+
+        return buffer
+
+    def __call__(self, image, roi=None, out=None):
+        """
+        Get the edges in an image.
+
+        Parameters
+        ----------
+        image: np array
+            Greyscale or BGR image.
+        roi: (x, y, width, height)
+            Only find edges in this rectangle, whole image if None. Matches
+            the full image's edges exactly for the laplacian, see canny.
+        out: np array
+            Where to write the edges, must be the roi's shape and dtype.
+
+        Returns
+        -------
+        np array of edges in the roi.
+        """
+        if len(image.shape) == 3:
+            # has more than one channel
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY,
+                                 dst=self._buffer('_grey', image.shape[:2], image.dtype))
+
+        crop = (slice(None), slice(None))
+
+        if roi is not None:
+            x, y, width, height = roi
+
+            # Keep enough surroundings that the roi matches the full image
+            top, left = max(y - self.PADDING, 0), max(x - self.PADDING, 0)
+            image = image[top:y + height + self.PADDING, left:x + width + self.PADDING]
+
+            crop = (slice(y - top, y - top + height), slice(x - left, x - left + width))
+
+        shape = image[crop].shape
+
+        if out is None:
+            out = np.empty(shape, self.dtype)
+
+        assert out.shape == shape and out.dtype == self.dtype, "Output must match the roi!"
+
+        if self.canny:
+            edges = cv2.Canny(image, *self.canny_thresholds,
+                              edges=self._buffer('_edges', image.shape, np.uint8))
+            np.minimum(edges[crop], 1, out=out)
+
+            return out
+
+        dst = cv2.filter2D(image, -1, self.kernel, dst=self._buffer('_filtered', image.shape, image.dtype))
+
+        if roi is None:
+            return cv2.Laplacian(dst, DEPTHS[self.dtype], dst=out)
+
+        # Laplacian of the padded roi, only the roi is kept
+        edges = cv2.Laplacian(dst, DEPTHS[self.dtype], dst=self._buffer('_edges', image.shape, self.dtype))
+        np.copyto(out, edges[crop])
+
+        return out
+
+
+# Detector per thread for get_edges
+_local = threading.local()
+
+
 def get_edges(image):
     """Get the edges in an image"""
-    if len(image.shape) == 3:
-        # has more than one channel
-        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-
-    kernel = np.ones((5, 5), np.float32)/5
-    dst = cv2.filter2D(image, -1, kernel)
-    lap = cv2.Laplacian(dst, cv2.CV_64F)
-    return lap
+    if not hasattr(_local, 'detector'):
+        _local.detector = EdgeDetector()
+
+    return _local.detector(image)
+
 
 if __name__ == '__main__':
     qr = cv2.imread('code.png')
@@ -0,0 +1,136 @@
+"""
+Turn camera frames into binary edge maps without per frame allocations.
+"""
+import cv2
+import numpy as np
+
+from normalize.edges import EdgeDetector
+
+
+class Preprocessor(object):
+    """
+    Invert, blur, find edges of and binarize frames with buffers kept
+    between frames.
+
+    Parameters
+    ----------
+    width: int
+        Width of frames, buffers are made on the first frame if None.
+    height: int
+        Height of frames.
+    threshold: float
+        Blurred laplacian values above this are edges.
+    """
+    def __init__(self, width=None, height=None, threshold=.96):
+        self.threshold = threshold
+
+        self.detector = EdgeDetector(np.float32)
+
+        self.shape = None
+
+        if width is not None and height is not None:
+            self.allocate(width, height)
+
+    def allocate(self, width, height):
+        """
+        Make working buffers for a frame size.
+
+        Parameters
+        ----------
+        width: int
+            Width of frames.
+        height: int
+            Height of frames.
+        """
+        self.shape = (height, width)
+
+        self.grey = np.empty(self.shape, np.uint8)
+        self.inverted = np.empty(self.shape, np.uint8)
+        self.laplacian = np.empty(self.shape, np.float32)
+        self.blurred = np.empty(self.shape, np.float32)
+        self.edges = np.empty(self.shape, np.uint8)
+
+    def __call__(self, img, out=None):
+        """
+        Preprocess a frame.
+
+        Parameters
+        ----------
+        img: np array[uint8]
+            Greyscale or BGR frame.
+        out: np array[uint8]
+            Where to write the edges, a buffer reused by the next call is
+            returned if None.
+
+        Returns
+        -------
+        np array[uint8] edge map, 1 on edges and 0 elsewhere.
+        """
+        assert img.dtype == np.uint8, "Frames must be uint8!"
+
+        if img.shape[:2] != self.shape:
+            self.allocate(img.shape[1], img.shape[0])
+
+        if img.ndim == 3:
+            img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY, dst=self.grey)
+
+        cv2.bitwise_not(img, dst=self.inverted)
+
+        self.detector(self.inverted, out=self.laplacian)
+
+        cv2.GaussianBlur(self.laplacian, (3, 3), cv2.BORDER_DEFAULT, dst=self.blurred)
+
+        if out is None:
+            out = self.edges
+
+        np.greater(self.blurred, self.threshold, out=out.view(np.bool_))
+
+        return out
+
+
+class BufferRing(object):
+    """
+    Fixed set of output buffers handed out in turn.
+
+    A buffer is handed out again after every other buffer has been, so the
+    last size - 1 results stay valid while they wait in later stages.
+
+    Parameters
+    ----------
+    size: int
+        Number of buffers, more than the results that can be held at once.
+    dtype: np dtype
+        Type of the buffers.
+    """
+    def __init__(self, size, dtype=np.uint8):
+        self.dtype = np.dtype(dtype)
+
+        self._buffers = [None] * size
+        self._next = 0
+
+    def __len__(self):
+        return len(self._buffers)
+
+    def __call__(self, shape):
+        """
+        Next buffer, remade if its shape changed.
+
+        Parameters
+        ----------
+        shape: tuple
+            Shape of the buffer.
+
+        Returns
+        -------
+        np array of shape and the ring's dtype.
+        """
+        shape = tuple(shape)
+
+        buffer = self._buffers[self._next]
+
+        if buffer is None or buffer.shape != shape:
+            buffer = self._buffers[self._next] = np.empty(shape, self.dtype)
+
+        self._next = (self._next + 1) % len(self._buffers)
+
+        return buffer
@@ -0,0 +1,189 @@
+"""
+Bound the number of edge points sent to TS space.
+
+Accumulation time grows with the number of edge pixels, thick laplacian
+edges and noise can make tens of thousands of them. Edges are thinned to
+one pixel wide lines and/or randomly subsampled, evenly over the image, to
+at most a fixed number of points. Each kept point votes for the points it
+stands in for so TS space maxima keep their strength.
+"""
+import cv2
+import numpy as np
+
+
+def _neighbours(image):
+    """
+    The 8 neighbours of each pixel, clockwise from the one above.
+
+    Returns
+    -------
+    np array of shape (8, height, width), 0 outside the image.
+    """
+    padded = np.pad(image, 1)
+    height, width = image.shape
+
+    offsets = ((0, 1), (0, 2), (1, 2), (2, 2), (2, 1), (2, 0), (1, 0), (0, 0))
+
+    return np.stack([padded[row:row + height, column:column + width] for row, column in offsets])
+
+
+def thin(edges, max_iterations=None):
+    """
+    Thin edges to lines one pixel wide.
+
+    Uses cv2.ximgproc.thinning when opencv contrib is installed, Zhang-Suen
+    thinning in numpy otherwise.
+
+    Parameters
+    ----------
+    edges: 2d np array
+        Binary edge map, 1 on edges.
+    max_iterations: int
+        Stop early after this many passes, thinning runs until nothing
+        changes if None.
+
+    Returns
+    -------
+    np array[uint8] binary edge map, 1 on edges.
+    """
+    image = (edges == 1).view(np.uint8)
+
+    if hasattr(cv2, 'ximgproc') and max_iterations is None:
+        return cv2.ximgproc.thinning(image * 255) // 255
+
+    image = image.copy()
+
+    iteration = 0
+    while max_iterations is None or iteration < max_iterations:
+        changed = False
+
+        # Zhang-Suen, neighbours p2..p9 are p[0]..p[7]. The first sub pass
+        # peels south east edges, the second north west ones
+        for a, b in (((0, 2, 4), (2, 4, 6)), ((0, 2, 6), (0, 4, 6))):
+            p = _neighbours(image)
+
+            count = p.sum(axis=0, dtype=np.uint8)
+            transitions = ((p == 0) & (np.roll(p, -1, axis=0) == 1)).sum(axis=0)
+
+            remove = (image == 1) & (count >= 2) & (count <= 6) & (transitions == 1) \
+                & (p[list(a)].min(axis=0) == 0) & (p[list(b)].min(axis=0) == 0)
+
+            if remove.any():
+                image[remove] = 0
+                changed = True
+
+        iteration += 1
+
+        if not changed:
+            break
+
+    return image
+
+
+def subsample(x, y, shape, max_points, cells=8, rng=None):
+    """
+    Randomly pick at most max_points points, spread evenly over the image.
+
+    The image is split into a cells x cells grid, each cell keeps its share
+    of max_points in proportion to the points in it.
+
+    Parameters
+    ----------
+    x, y: np arrays
+        Row and column of each point.
+    shape: (height, width)
+        Size of the image the points are in.
+    max_points: int
+        Number of points to keep.
+    cells: int
+        Grid cells along each side of the image.
+    rng: np.random.RandomState
+        Source of randomness, a fixed seed if None.
+
+    Returns
+    -------
+    keep, weights: indices of the kept points and how many points each
+    stands in for.
+    """
+    if len(x) <= max_points:
+        return np.arange(len(x)), np.ones(len(x))
+
+    if rng is None:
+        rng = np.random.RandomState(0)
+
+    cell = (x * cells // shape[0]) * cells + y * cells // shape[1]
+    counts = np.bincount(cell, minlength=cells * cells)
+
+    # Cells keep their share rounded down, the points left over go to the
+    # cells that lost the most to rounding
+    share = counts * (max_points / len(x))
+    quota = np.floor(share).astype(np.int64)
+
+    left = max_points - quota.sum()
+    quota[np.argsort(quota - share, kind='stable')[:left]] += 1
+
+    # Random order within each cell, the first quota points are kept
+    order = np.lexsort((rng.random_sample(len(x)), cell))
+    starts = np.cumsum(counts) - counts
+
+    ranked = cell[order]
+    keep = order[np.arange(len(x)) - starts[ranked] < quota[ranked]]
+
+    return keep, counts[cell[keep]] / quota[cell[keep]]
+
+
+class EdgeReducer(object):
+    """
+    Edge points of a binary edge map, thinned and subsampled.
+
+    Parameters
+    ----------
+    thinning: bool
+        Thin edges to one pixel wide lines first.
+    max_points: int
+        Max number of points returned, all are kept if None.
+    cells: int
+        Grid cells along each side of the image, see subsample. Weights
+        differ between cells unless 1, the opengl accumulator can only
+        apply uniform weights exactly.
+    seed: int
+        Seed of the subsampling.
+    """
+    def __init__(self, thinning=True, max_points=4096, cells=8, seed=0):
+        self.thinning = thinning
+        self.max_points = max_points
+        self.cells = cells
+
+        self.rng = np.random.RandomState(seed)
+
+    def __call__(self, edges):
+        """
+        Reduce an edge map to weighted points.
+
+        Parameters
+        ----------
+        edges: 2d np array
+            Binary edge map, 1 on edges.
+
+        Returns
+        -------
+        x, y, weights: row, column and vote weight of each point, weights
+        is None when every edge pixel was kept.
+        """
+        weight = 1.
+
+        if self.thinning:
+            before = np.count_nonzero(edges == 1)
+            edges = thin(edges)
+
+            # Thinned points stand in for the pixels peeled off, on average
+            weight = before / max(np.count_nonzero(edges), 1)
+
+        x, y = np.nonzero(edges == 1)
+
+        if self.max_points is None or len(x) <= self.max_points:
+            return x, y, None if weight == 1. else np.full(len(x), weight)
+
+        keep, weights = subsample(x, y, edges.shape[:2], self.max_points, self.cells, self.rng)
+
+        return x[keep], y[keep], weights * weight
@@ -26,7 +26,7 @@ def binarize_mat(img, threshold=.5):
     return img
 
 
-def pix_to_opengl(values, window_width, window_height):
+def pix_to_opengl(values, window_width, window_height, out=None, inplace=False):
     """
     Because the location of 1.0 in opengl varies by the number of pixels
     in the window.
@@ -45,28 +45,41 @@ def pix_to_opengl(values, window_width, window_height):
 
     window_height: int
         Height of window to be displayed in.
+
+    out: np array[float32]
+        Contiguous buffer the same size as values to write into.
+
+    inplace: bool
+        Overwrite values, must be a contiguous float32 array.
  
     Returns
     -------
     np array of verticies that opengl can work with.
     """
-    out = []
+    values = np.asarray(values)
+
+    if inplace:
+        out = values
+    elif out is None:
+        out = np.empty(values.shape, np.float32)
 
-    for i in range(0, len(values), 3):
-        old_x = values[i]
-        old_y = values[i+1]
-        old_z = values[i+2]
+    assert out.dtype == np.float32 and out.flags.c_contiguous, "Output must be contiguous float32!"
+    assert out.size == values.size, "Output must be the same size as values!"
 
-        new_x = (2.0 * old_x + 1.0) / window_width - 1.0
-        new_y = (2.0 * old_y + 1.0) / window_height - 1.0
-        new_z = old_z
+    # new = (2 * old + 1) / size - 1, z is unchanged
+    scale = np.array([2. / window_width, 2. / window_height, 1.], np.float32)
+    shift = np.array([1. / window_width - 1., 1. / window_height - 1., 0.], np.float32)
 
-        out += [new_x, new_y, new_z]
+    view = out.reshape(-1, 3)
 
-    return np.array(out, dtype=np.float32)
+    np.multiply(values.reshape(-1, 3), scale, out=view, casting='unsafe')
+    view += shift
 
+    return out
 
-def get_ts_verticies(edges, u_offset, v_offset, v_scale, d, z=0.):
+
+def get_ts_verticies(edges, u_offset, v_offset, v_scale, d, z=0.,
+                     window_width=None, window_height=None):
     """
     Convert edge coordinates to two-segment polyline defined by
     three points: (−d, −y),(0, x),(d, y), for TS space.
@@ -79,25 +92,60 @@ def get_ts_verticies(edges, u_offset, v_offset, v_scale, d, z=0.):
     	Spacing between axis along u.
     z: float
     	Z value.
+    window_width: int
+        If given with window_height, verticies are written directly in
+        opengl coordinates for a window of this size, see pix_to_opengl.
+    window_height: int
+        Height of opengl window.
+
+    Returns
+    -------
+    Numpy array[float32] of pairs of 3 representing verticies of lines.
+    """
+    x, y = np.nonzero(edges == 1)
+
+    return points_to_ts_verticies(x, y, u_offset, v_offset, v_scale, d, z,
+                                  window_width, window_height)
+
+
+def points_to_ts_verticies(x, y, u_offset, v_offset, v_scale, d, z=0.,
+                           window_width=None, window_height=None):
+    """
+    Convert point coordinates to TS space verticies, see get_ts_verticies.
+
+    Parameters
+    ----------
+    x: np array
+        X(row) coordinate of each point.
+    y: np array
+        Y(column) coordinate of each point.
+    ...
 
     Returns
     -------
     Numpy array[float32] of pairs of 3 representing verticies of lines.
     """
-    z = float(z)
+    # Vertex i of every point is (u[i], v_scale[i] * coord + v_shift[i], z)
+    u = np.array([0., -d, 0., d]) + u_offset
+    v_scale = np.array([v_scale, -v_scale, v_scale, v_scale])
+    v_shift = np.full(4, float(v_offset))
+
+    if window_width is not None and window_height is not None:
+        # pix_to_opengl folded into the affine constants
+        u = (2. * u + 1.) / window_width - 1.
+        v_scale = 2. * v_scale / window_height
+        v_shift = (2. * v_shift + 1.) / window_height - 1.
+
+    verticies = np.empty((len(x), 4, 3), np.float32)
 
-    rule = lambda x, y: [
-        0. + u_offset, x * v_scale + v_offset, z, 
-        -d + u_offset, -y * v_scale + v_offset, z,
-        0. + u_offset, x * v_scale + v_offset, z, 
-        d + u_offset, y * v_scale + v_offset, z]
+    for i, coord in enumerate((x, y, x, y)):
+        np.multiply(coord, v_scale[i], out=verticies[:, i, 1], casting='unsafe')
+        verticies[:, i, 1] += np.float32(v_shift[i])
 
-    verticies = []
-    for index, value in np.ndenumerate(edges):
-        if value == 1:
-            verticies += rule(*map(float, index))
+    verticies[:, :, 0] = u
+    verticies[:, :, 2] = z
 
-    return np.array(verticies, dtype=np.float32)
+    return verticies.reshape(-1)
 
 
 if __name__ == '__main__':
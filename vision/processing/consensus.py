@@ -0,0 +1,331 @@
+"""
+Decode cache and multi frame consensus for video.
+
+The same qr code is visible for 30 seconds, so most frames decode to a
+value already seen. Decodes are cached by a perceptual hash of the image,
+and a value is only accepted once it has been read in several frames, which
+filters out one off misreads. Frames that look like a confirmed one are not
+decoded at all.
+"""
+import time
+import threading
+from collections import OrderedDict, defaultdict, deque
+
+import cv2
+import numpy as np
+
+# Returned by DecodeCache.get for keys not cached
+MISS = object()
+
+
+def image_hash(image, size=8):
+    """
+    Difference hash of an image, similar images have close hashes.
+
+    The image is shrunk to (size + 1)x size and each bit is whether a pixel
+    is brighter than its right neighbour, so the hash ignores scale,
+    brightness and contrast.
+
+    Parameters
+    ----------
+    image: np array
+        Greyscale or BGR image.
+    size: int
+        Hash is size * size bits.
+
+    Returns
+    -------
+    int
+    """
+    image = np.asarray(image)
+
+    if image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+    small = cv2.resize(image.astype(np.float32), (size + 1, size), interpolation=cv2.INTER_AREA)
+
+    bits = (small[:, 1:] > small[:, :-1]).reshape(-1)
+
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+def hash_distance(first, second):
+    """
+    Number of differing bits between two hashes.
+    """
+    return bin(first ^ second).count('1')
+
+
+class DecodeCache(object):
+    """
+    Least recently used cache of decodes that expire.
+
+    Parameters
+    ----------
+    maxsize: int
+        Max number of decodes kept, least recently used are dropped first.
+    ttl: float
+        Seconds a decode is kept for.
+    failure_ttl: float
+        Seconds a failed decode is kept for, failures are not cached if 0.
+        A frame that failed to decode says little about the next one.
+    clock: callable
+        Current time in seconds.
+    """
+    def __init__(self, maxsize=128, ttl=30., failure_ttl=0., clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.failure_ttl = failure_ttl
+        self.clock = clock
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """
+        Cached value of a key.
+
+        Parameters
+        ----------
+        key: hashable
+            Usually an image_hash.
+
+        Returns
+        -------
+        Value, MISS if not cached or expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is None or self.clock() > entry[1]:
+                self._entries.pop(key, None)
+                self.misses += 1
+                return MISS
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+
+            return entry[0]
+
+    def put(self, key, value):
+        """
+        Cache a value.
+
+        Parameters
+        ----------
+        key: hashable
+            Usually an image_hash.
+        value: object
+            Decoded value, None for images that did not decode.
+        """
+        ttl = self.ttl if value is not None else self.failure_ttl
+
+        if ttl <= 0:
+            return
+
+        with self._lock:
+            self._entries[key] = (value, self.clock() + ttl)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def read(self, image, decoder, key=None):
+        """
+        Decode an image unless an image with the same hash was.
+
+        Parameters
+        ----------
+        image: np array
+            Image with a qr code.
+        decoder: callable
+            Decodes an image, e.g. processing.read.read.
+        key: int
+            Hash of the image if already known.
+
+        Returns
+        -------
+        Decoded value or None.
+        """
+        return self.lookup(image, decoder, key)[0]
+
+    def lookup(self, image, decoder, key=None):
+        """
+        Decode an image unless an image with the same hash was, see read.
+
+        Returns
+        -------
+        value, decoded: decoded value or None and whether decoder was
+        called, False for cached values.
+        """
+        if key is None:
+            key = image_hash(image)
+
+        value = self.get(key)
+
+        if value is not MISS:
+            return value, False
+
+        value = decoder(image) or None
+        self.put(key, value)
+
+        return value, True
+
+
+class ConsensusReader(object):
+    """
+    Read a qr code over a stream of frames.
+
+    A value is confirmed once it is read in `confirmations` frames within
+    `window` seconds. Cached values are only trusted once confirmed, frames
+    with an unconfirmed cached value are decoded again so a misread can not
+    confirm itself. Frames hashing within `max_distance` bits of a frame
+    that read a confirmed value return it without decoding, for as long as
+    such frames keep coming.
+
+    Not thread safe, use one per stream.
+
+    Parameters
+    ----------
+    confirmations: int
+        Number of frames a value must be read in.
+    window: float
+        Seconds reads count towards a confirmation, and a confirmed frame
+        is remembered for after it was last seen.
+    max_distance: int
+        Max hash distance of a frame to a confirmed frame to skip decoding.
+    decoder: callable
+        Decodes an image, processing.read.read if None. Called with the
+        frame and any extra arguments the reader is called with.
+    cache: DecodeCache
+        Decodes shared between frames, one is made if None.
+    clock: callable
+        Current time in seconds.
+
+    Attributes
+    ----------
+    decodes: int
+        Number of frames decoded.
+    skipped: int
+        Number of frames matching a confirmed frame.
+    """
+    # Max number of confirmed frame hashes remembered
+    MAX_CONFIRMED = 64
+
+    def __init__(self, confirmations=3, window=30., max_distance=4, decoder=None, cache=None,
+                 clock=time.monotonic):
+        if decoder is None:
+            # pyzbar needs libzbar, only load it when decoding for real
+            from processing.read import read as decoder
+
+        self.confirmations = confirmations
+        self.window = window
+        self.max_distance = max_distance
+
+        self.decoder = decoder
+        self.cache = DecodeCache(ttl=window, clock=clock) if cache is None else cache
+        self.clock = clock
+
+        # value -> times it was read, hash -> (value, time) of confirmed frames
+        self._sightings = defaultdict(deque)
+        self._confirmed = OrderedDict()
+
+        self.decodes = 0
+        self.skipped = 0
+
+    def _decode(self, image, key, args):
+        """
+        Decode through the cache, counting real decodes. Cached values not
+        confirmed yet are decoded again.
+
+        Returns
+        -------
+        Decoded value or None.
+        """
+        value = self.cache.get(key)
+
+        if value is MISS or (value is not None and not self.confirmed(value)):
+            value = self.decoder(image, *args) or None
+            self.cache.put(key, value)
+
+            self.decodes += 1
+
+        return value
+
+    def confirmed(self, value):
+        """
+        Whether a value has been read in enough recent frames.
+        """
+        times = self._sightings.get(value, ())
+
+        return len(times) >= self.confirmations
+
+    def _match(self, key, now):
+        """
+        Value of a recent confirmed frame with a close hash, None otherwise.
+        """
+        for confirmed_key in list(self._confirmed):
+            value, seen = self._confirmed[confirmed_key]
+
+            if now - seen > self.window:
+                del self._confirmed[confirmed_key]
+            elif hash_distance(key, confirmed_key) <= self.max_distance:
+                # Still in view, e.g. hovering over the code
+                self._confirmed[confirmed_key] = (value, now)
+                self._confirmed.move_to_end(confirmed_key)
+
+                return value
+
+        return None
+
+    def __call__(self, image, *args):
+        """
+        Read the next frame.
+
+        Parameters
+        ----------
+        image: np array
+            Frame or stitched image with a qr code, frames are compared by
+            its hash.
+        args:
+            Passed on to the decoder, e.g. the frame's edges and lines.
+
+        Returns
+        -------
+        Confirmed value if the frame reads one, otherwise None.
+        """
+        now = self.clock()
+        key = image_hash(image)
+
+        value = self._match(key, now)
+
+        if value is not None:
+            self.skipped += 1
+            return value
+
+        value = self._decode(image, key, args)
+
+        if value is None:
+            return None
+
+        times = self._sightings[value]
+        times.append(now)
+
+        while times and now - times[0] > self.window:
+            times.popleft()
+
+        if not self.confirmed(value):
+            return None
+
+        self._confirmed[key] = (value, now)
+
+        while len(self._confirmed) > self.MAX_CONFIRMED:
+            self._confirmed.popitem(last=False)
+
+        return value
@@ -1,7 +1,84 @@
+import threading
+from collections import OrderedDict
+
 import numpy as np
+import cv2
+
+# Ways to split 4 lines into 2 pairs of opposite sides
+PAIRINGS = np.array([[[0, 1], [2, 3]], [[0, 2], [1, 3]], [[0, 3], [1, 2]]])
+
+
+def line_parameters(line_eq):
+    """
+    Slopes and intercepts of lines.
+
+    Parameters
+    ----------
+    line_eq: [(m, b), ...] or np array[LINE_DTYPE]
+        Lines y = mx + b, x is the row and y the column.
+
+    Returns
+    -------
+    m, b: np arrays[float]
+    """
+    line_eq = np.asarray(line_eq)
+
+    if line_eq.dtype.names:
+        return line_eq['m'].astype(float), line_eq['b'].astype(float)
+
+    line_eq = line_eq.astype(float).reshape(-1, 2)
+
+    return line_eq[:, 0], line_eq[:, 1]
+
+
+def quadrilateral(line_eq):
+    """
+    Corners of the quadrilateral bounded by 4 lines.
+
+    Lines are paired into opposite sides by how parallel they are, each
+    corner is where a side meets one of the other pair.
+
+    Parameters
+    ----------
+    line_eq: [(m, b), ...] or np array[LINE_DTYPE]
+        4 lines y = mx + b, x is the row and y the column.
+
+    Returns
+    -------
+    np array[float] of 4 (row, column) corners, clockwise from the top left.
+    """
+    m, b = line_parameters(line_eq)
+
+    assert len(m) == 4, "Need 4 lines to bound a quadrilateral!"
+
+    # Angle between every two lines, ignoring direction
+    angles = np.arctan(m)
+    difference = np.abs(angles[:, None] - angles[None, :])
+    difference = np.minimum(difference, np.pi - difference)
+
+    pairing = PAIRINGS[np.argmin(difference[PAIRINGS[:, :, 0], PAIRINGS[:, :, 1]].sum(axis=1))]
 
+    # Corners in order around the quadrilateral, ac bc bd ad
+    first = pairing[0, [0, 1, 1, 0]]
+    second = pairing[1, [0, 0, 1, 1]]
 
-def crop(image, line_eq):
+    # m1 x + b1 = m2 x + b2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rows = (b[second] - b[first]) / (m[first] - m[second])
+
+    assert np.isfinite(rows).all(), "Adjacent sides can not be parallel!"
+
+    corners = np.stack((rows, m[first] * rows + b[first]), axis=-1)
+
+    # Clockwise as seen in the image, rows go down
+    center = corners.mean(axis=0)
+    order = np.argsort(np.arctan2(corners[:, 0] - center[0], corners[:, 1] - center[1]))
+    corners = corners[order]
+
+    return np.roll(corners, -np.argmin(corners.sum(axis=1)), axis=0)
+
+
+def crop(image, line_eq, mask=True, fill=0):
     """
     Crop an image based on given line equations.
 
@@ -9,33 +86,196 @@ def crop(image, line_eq):
     ----------
     image: 2d np array
         Image to crop.
-    line_eq: [(m, b), ...]
-        Line equations to crop by.
+    line_eq: [(m, b), ...] or np array[LINE_DTYPE]
+        4 lines y = mx + b bounding the region, x is the row and y the
+        column, e.g. from PCLines.
+    mask: bool
+        Set pixels of the bounding box outside the region to fill.
+    fill: scalar
+        Value outside the region.
 
     Returns
     -------
-    Cropped image.
+    Cropped image, limited to the region's bounding box. A view of image
+    unless masking changed pixels.
     """
+    corners = np.round(quadrilateral(line_eq)).astype(np.int64)
 
+    height, width = image.shape[:2]
 
-def stitch(im1, im2, im3, im4):
+    top, left = np.maximum(corners.min(axis=0), 0)
+    bottom, right = np.minimum(corners.max(axis=0) + 1, (height, width))
+
+    cropped = image[top:bottom, left:right]
+
+    if not mask or not cropped.size:
+        return cropped
+
+    # cv2 points are (column, row)
+    points = (corners[:, ::-1] - (left, top)).astype(np.int32)
+
+    inside = np.zeros(cropped.shape[:2], np.uint8)
+    cv2.fillConvexPoly(inside, points, 1)
+
+    if inside.all():
+        return cropped
+
+    cropped = cropped.copy()
+    cropped[inside == 0] = fill
+
+    return cropped
+
+
+class CanvasPool(object):
     """
-    Stitch images together.
+    Stitching canvases kept between calls, one per output shape.
+
+    A canvas remembers the layout last stitched on it, only the parts the
+    next layout leaves uncovered are cleared. Not thread safe.
 
     Parameters
     ----------
-    im1: 2d np array
-        Image for quartile 1.
-    ...
+    maxsize: int
+        Max number of canvases kept, least recently used are dropped.
+    dtype: np dtype
+        Type of canvases, fragments are cast to it.
+    """
+    def __init__(self, maxsize=4, dtype=np.uint8):
+        self.maxsize = maxsize
+        self.dtype = np.dtype(dtype)
+
+        # shape -> (canvas, slices last covered)
+        self._canvases = OrderedDict()
+
+    def __len__(self):
+        return len(self._canvases)
+
+    def canvas(self, shape, slices):
+        """
+        Canvas of a shape, zero everywhere outside slices.
+
+        Parameters
+        ----------
+        shape: tuple
+            Shape of the canvas.
+        slices: list of (slice, slice)
+            Regions the caller is about to overwrite.
+
+        Returns
+        -------
+        np array of shape and the pool's dtype.
+        """
+        shape = tuple(shape)
+
+        if shape in self._canvases:
+            self._canvases.move_to_end(shape)
+            canvas, covered = self._canvases[shape]
+
+            if covered != slices:
+                for region in uncovered(shape, slices):
+                    canvas[region] = 0
+        else:
+            canvas = np.zeros(shape, self.dtype)
+
+        self._canvases[shape] = (canvas, slices)
+
+        while len(self._canvases) > self.maxsize:
+            self._canvases.popitem(last=False)
+
+        return canvas
+
+
+def uncovered(shape, slices):
+    """
+    Parts of a stitching canvas no image covers.
+
+    Parameters
+    ----------
+    shape: tuple
+        Shape of the canvas.
+    slices: list of (slice, slice)
+        Where each image is, see layout.
 
     Returns
     -------
-    Image of all images put together.
+    List of (rows, columns) slices, two per quadrant: the full width strip
+    beyond the image and the strip beside it.
     """
-    WIDTH = max(len(im1[0]), len(im3[0])) + max(len(im2[0]), len(im4[0]))
+    height, width = shape[:2]
+
+    # Center of the canvas, every image touches it
+    b, a = slices[0][0].stop, slices[0][1].start
+
+    regions = []
+    for (rows, columns), top, right in zip(slices, (True, True, False, False), (True, False, False, True)):
+        quadrant_columns = slice(a, width) if right else slice(0, a)
+
+        regions.append((slice(0, rows.start) if top else slice(rows.stop, height), quadrant_columns))
+        regions.append((rows, slice(columns.stop, width) if right else slice(0, columns.start)))
+
+    return regions
+
+
+def layout(im1, im2, im3, im4):
+    """
+    Where stitch puts each image.
+
+    Parameters
+    ----------
+    im1, im2, im3, im4: np arrays
+        Images for each quadrant, see stitch.
+
+    Returns
+    -------
+    shape, slices: canvas shape and a (rows, columns) slice per image.
+    """
+    WIDTH = max(len(im1[0]), len(im4[0])) + max(len(im2[0]), len(im3[0]))
     HEIGHT = max(len(im1), len(im2)) + max(len(im4), len(im3))
 
-    out = np.zeros(shape=(HEIGHT, WIDTH))
+    a = max(len(im2[0]), len(im3[0]))
+    b = max(len(im1), len(im2))
+
+    slices = [
+        (slice(b-len(im1), b), slice(a, a+len(im1[0]))),
+        (slice(b-len(im2), b), slice(a-len(im2[0]), a)),
+        (slice(b, b+len(im3)), slice(a-len(im3[0]), a)),
+        (slice(b, b+len(im4)), slice(a, a+len(im4[0]))),
+    ]
+
+    return (HEIGHT, WIDTH) + np.shape(im1)[2:], slices
+
+
+# Canvas pool per thread for stitch
+_local = threading.local()
+
+
+def _pool():
+    if not hasattr(_local, 'pool'):
+        _local.pool = CanvasPool()
+
+    return _local.pool
+
+
+def stitch_canvas(im1, im2, im3, im4, pool=None):
+    """
+    Stitch images onto a pooled canvas.
+
+    Parameters
+    ----------
+    im1, im2, im3, im4: np arrays
+        Images for each quadrant, see stitch.
+    pool: CanvasPool
+        Pool to take the canvas from, this thread's if None.
+
+    Returns
+    -------
+    canvas, slices: uint8 canvas reused by the next stitch of its shape,
+    and where each image is on it. canvas[slices[i]] can be overwritten to
+    swap an image of the same size.
+    """
+    shape, slices = layout(im1, im2, im3, im4)
+
+    out = (_pool() if pool is None else pool).canvas(shape, slices)
 
     """
     |-----------------|
@@ -50,16 +290,28 @@ def stitch(im1, im2, im3, im4):
     |-----------------|
     """
 
-    a = max(len(im2[0]), len(im3[0]))
-    b = max(len(im1), len(im2))
+    for image, region in zip((im1, im2, im3, im4), slices):
+        out[region] = image
+
+    return out, slices
 
-    out[b-len(im1):b, a:a+len(im1[0])] = im1
-    out[b-len(im2):b, a-len(im2[0]): a] = im2
 
-    out[b:b+len(im3), a-len(im3[0]):a] = im3
-    out[b:b+len(im4), a:a+len(im4[0])] = im4
+def stitch(im1, im2, im3, im4):
+    """
+    Stitch images together.
+
+    Parameters
+    ----------
+    im1: 2d np array
+        Image for quartile 1.
+    ...
 
-    return out
+    Returns
+    -------
+    Image of all images put together, a uint8 canvas reused by the next
+    stitch of the same size in this thread.
+    """
+    return stitch_canvas(im1, im2, im3, im4)[0]
 
 
 if __name__ == '__main__':
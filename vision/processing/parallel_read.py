@@ -0,0 +1,91 @@
+"""
+Decode stitch orderings concurrently.
+"""
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+
+from processing.crop_n_stitch import stitch
+
+EXECUTORS = {'thread': ThreadPoolExecutor, 'process': ProcessPoolExecutor}
+
+
+def make_executor(kind='thread', workers=4):
+    """
+    Make a pool to decode with.
+
+    pyzbar releases the gil while decoding so threads are usually enough,
+    processes avoid the gil for the stitching too at the cost of copying
+    the sections to each worker.
+
+    Parameters
+    ----------
+    kind: str
+        'thread' or 'process'.
+    workers: int
+        Number of decodes run at once.
+
+    Returns
+    -------
+    concurrent.futures.Executor
+    """
+    return EXECUTORS[kind](max_workers=workers)
+
+
+def stitch_and_read(sections, ordering):
+    """
+    Stitch sections in an order and read the result.
+
+    Parameters
+    ----------
+    sections: list of 4 np arrays
+        Sections of a qr code.
+    ordering: tuple of 4 int
+        Index of the section for each quadrant, see crop_n_stitch.stitch.
+
+    Returns
+    -------
+    int or None
+    """
+    # pyzbar needs libzbar, only load it when decoding for real
+    from processing.read import read
+
+    return read(stitch(*[sections[i] for i in ordering]))
+
+
+def parallel_read(sections, orderings, executor):
+    """
+    Decode orderings concurrently until one reads.
+
+    Orderings are submitted in the given order, so the most likely ones
+    start first. Once one is read, or a decode raises, the orderings that
+    have not started are cancelled.
+
+    Parameters
+    ----------
+    sections: list of 4 np arrays
+        Sections of a qr code.
+    orderings: list of tuples
+        Orderings to try, see stitch_and_read.
+    executor: concurrent.futures.Executor
+        Pool to decode with.
+
+    Returns
+    -------
+    Interpreted code if successful else none, and the number of decodes
+    that were started.
+    """
+    futures = [executor.submit(stitch_and_read, sections, ordering) for ordering in orderings]
+
+    code = None
+    try:
+        for future in as_completed(futures):
+            code = future.result()
+
+            if code:
+                break
+    finally:
+        for pending in futures:
+            pending.cancel()
+
+    decodes = sum(not future.cancelled() for future in futures)
+
+    return code, decodes
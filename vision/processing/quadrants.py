@@ -0,0 +1,240 @@
+"""
+Figure out which corner of a qr code each fragment is.
+
+The three finder patterns(7x7 module squares, 1:1:3:1:1 dark light ratio
+through their center) sit in the top left, top right and bottom left corners
+of a qr code. Timing patterns(alternating modules) run from the top left
+finder to the other two. Assuming fragments are straightened, a fragment
+with a finder in its top left corner and timing both right and down is the
+top left of the code, the bottom right fragment has no finder.
+"""
+from itertools import permutations
+
+import numpy as np
+
+# Order of fragments taken by crop_n_stitch.stitch, im1 -> im4
+QUADRANTS = ('top_right', 'top_left', 'bottom_left', 'bottom_right')
+
+# Flip making a corner the top left, rows then columns
+FLIPS = {
+    'top_left': (slice(None), slice(None)),
+    'top_right': (slice(None), slice(None, None, -1)),
+    'bottom_left': (slice(None, None, -1), slice(None)),
+    'bottom_right': (slice(None, None, -1), slice(None, None, -1)),
+}
+
+# Which timing patterns(horizontal, vertical) leave each finder, seen
+# from the finder's corner
+TIMING = {
+    'top_left': (True, True),
+    'top_right': (True, False),
+    'bottom_left': (False, True),
+}
+
+FINDER_RATIO = np.array([1, 1, 3, 1, 1])
+
+# Best ordering must beat the second best by this much to skip searching
+MIN_MARGIN = .5
+
+
+def binarize(fragment):
+    """
+    Dark modules of a fragment.
+
+    Parameters
+    ----------
+    fragment: 2d np array
+        Greyscale image, dark modules are low values.
+
+    Returns
+    -------
+    2d np array[bool], True where dark.
+    """
+    fragment = np.asarray(fragment)
+
+    if fragment.ndim == 3:
+        fragment = fragment.mean(axis=2)
+
+    return fragment < (float(fragment.min()) + float(fragment.max())) / 2
+
+
+def runs(line):
+    """
+    Run lengths of a boolean line, starting at its first True value.
+
+    Parameters
+    ----------
+    line: 1d np array[bool]
+
+    Returns
+    -------
+    start, lengths: index of the first True and np array of run lengths.
+    """
+    changes = np.flatnonzero(line[1:] != line[:-1]) + 1
+    bounds = np.concatenate(([0], changes, [len(line)]))
+
+    if not len(line) or not line[0]:
+        bounds = bounds[1:]
+
+    if len(bounds) < 2:
+        return len(line), np.empty(0, int)
+
+    return bounds[0], np.diff(bounds)
+
+
+def ratio_score(lengths, ratio=FINDER_RATIO):
+    """
+    How closely the first runs of a line follow a ratio.
+
+    Parameters
+    ----------
+    lengths: np array
+        Run lengths, first one dark.
+    ratio: np array
+        Expected relative lengths.
+
+    Returns
+    -------
+    float in [0, 1], 1 is a perfect match.
+    """
+    if len(lengths) < len(ratio):
+        return 0.
+
+    lengths = lengths[:len(ratio)]
+    module = lengths.sum() / ratio.sum()
+
+    error = np.abs(lengths - ratio * module).sum() / lengths.sum()
+
+    return max(0., 1. - 2. * error)
+
+
+def finder_score(dark):
+    """
+    Score the top left corner of a fragment for a finder pattern.
+
+    Parameters
+    ----------
+    dark: 2d np array[bool]
+        Binarized fragment, oriented so the corner to test is top left.
+
+    Returns
+    -------
+    score, row, column, module: confidence in [0, 1], pixel location of the
+    finder's top left corner and the module size in pixels.
+    """
+    size = min(dark.shape)
+    diagonal = dark[np.arange(size), np.arange(size)]
+
+    start, lengths = runs(diagonal)
+    score = ratio_score(lengths)
+
+    if not score:
+        return 0., start, start, 0.
+
+    module = lengths[:len(FINDER_RATIO)].sum() / FINDER_RATIO.sum()
+    center = int(start + 3.5 * module)
+
+    if center >= size:
+        return 0., start, start, module
+
+    # Confirm across the center row and column, the quiet zone may differ
+    column, lengths = runs(dark[center])
+    score = min(score, ratio_score(lengths))
+
+    row, lengths = runs(dark[:, center])
+    score = min(score, ratio_score(lengths))
+
+    return score, row, column, module
+
+
+def timing_score(dark, row, column, module, horizontal):
+    """
+    Fraction of modules alternating along a timing pattern.
+
+    Parameters
+    ----------
+    dark: 2d np array[bool]
+        Binarized fragment, oriented so the finder is top left.
+    row, column: int
+        Pixel location of the finder.
+    module: float
+        Module size in pixels.
+    horizontal: bool
+        Check the timing pattern running right, otherwise down.
+
+    Returns
+    -------
+    float in [0, 1], random data scores around .5.
+    """
+    if not horizontal:
+        dark = dark.T
+        row, column = column, row
+
+    row = int(row + 6.5 * module)
+    along = column + (np.arange(8, 8 + dark.shape[1] / module) + .5) * module
+    along = along[along < dark.shape[1]].astype(int)
+
+    if row >= dark.shape[0] or not len(along):
+        return 0.
+
+    expected = np.arange(len(along)) % 2 == 0
+
+    return float(np.mean(dark[row, along] == expected))
+
+
+def quadrant_scores(fragment):
+    """
+    Confidence of a fragment being each quadrant of a qr code.
+
+    Parameters
+    ----------
+    fragment: 2d np array
+        Straightened fragment of a qr code.
+
+    Returns
+    -------
+    np array of 4 scores in [0, 1], ordered like QUADRANTS.
+    """
+    dark = binarize(fragment)
+
+    scores = {}
+    for corner, directions in TIMING.items():
+        oriented = dark[FLIPS[corner]]
+        score, row, column, module = finder_score(oriented)
+
+        if score:
+            timing = [timing_score(oriented, row, column, module, horizontal)
+                      for horizontal, present in zip((True, False), directions) if present]
+            score *= min(1., 2. * min(timing) - .5)
+
+        scores[corner] = max(score, 0.)
+
+    scores['bottom_right'] = 1. - max(scores.values())
+
+    return np.array([scores[quadrant] for quadrant in QUADRANTS])
+
+
+def rank_orderings(fragments):
+    """
+    Rank every assignment of fragments to quadrants.
+
+    Parameters
+    ----------
+    fragments: list of 4 2d np arrays
+        Fragments of a qr code in any order.
+
+    Returns
+    -------
+    orderings, ambiguous: list of index tuples, fragments[ordering[i]] is
+    quadrant i, best first. Ambiguous is False when the best ordering is
+    clearly better than the rest.
+    """
+    scores = np.array([quadrant_scores(fragment) for fragment in fragments])
+
+    orderings = np.array(list(permutations(range(len(fragments)))))
+    totals = scores[orderings, np.arange(len(QUADRANTS))].sum(axis=1)
+
+    rank = np.argsort(-totals, kind='stable')
+    ambiguous = totals[rank[0]] - totals[rank[1]] < MIN_MARGIN
+
+    return [tuple(ordering) for ordering in orderings[rank]], bool(ambiguous)
@@ -20,10 +20,7 @@ def read(image):
     """
     data = decode(image)  ## Outputs 4 corner locations as well!!
 
-    if data:
-        data = int(data[0][0])
-
-    return data
+    return int(data[0][0]) if data else None
 
 
 if __name__ == '__main__':
@@ -1,52 +1,246 @@
 """
 Make a cropped piece of an image square
 """
+import threading
+from collections import OrderedDict
+
 import numpy as np
 import cv2
 
 
-def straighten(img, pts):
+def output_size(pts):
     """
-    Straighten a section of an image
+    Size of a straightened quadrilateral, its longest opposite sides.
+
+    Parameters
+    ----------
+    pts: np array
+        4 (x, y) corners, clockwise from the top left, x is the row.
+
+    Returns
+    -------
+    width, height: int
+    """
+    pts = np.asarray(pts, float)
+
+    sides = np.linalg.norm(pts - np.roll(pts, -1, axis=0), axis=1)
+
+    # top, right, bottom, left
+    width = max(sides[0], sides[2])
+    height = max(sides[1], sides[3])
+
+    return max(int(round(width)), 1), max(int(round(height)), 1)
+
+
+class Straightener(object):
+    """
+    Perspective rectification for video, where corners barely move.
+
+    Homographies are memoized by corners rounded to a grid and outputs
+    are warped into buffers kept between calls. Not thread safe.
 
     https://stackoverflow.com/questions/41995916/opencv-straighten-an-image-with-python
 
+    Parameters
+    ----------
+    quantum: float
+        Corners are rounded to multiples of this many pixels, corners that
+        round the same share a homography.
+    maxsize: int
+        Max number of homographies kept, least recently used are dropped.
+    """
+    def __init__(self, quantum=1., maxsize=64):
+        self.quantum = quantum
+        self.maxsize = maxsize
+
+        self._homographies = OrderedDict()
+        self._buffers = {}
+
+        self.hits = 0
+        self.misses = 0
+
+    def homography(self, pts, size=None):
+        """
+        Homography mapping corners to an upright rectangle.
+
+        Parameters
+        ----------
+        pts: np array
+            4 (x, y) corners, clockwise from the top left, x is the row.
+        size: (int, int)
+            Width and height of the rectangle, see output_size if None.
+
+        Returns
+        -------
+        h, size: 3x3 np array and (width, height).
+        """
+        quantized = np.round(np.asarray(pts, float) / self.quantum).astype(np.int64)
+
+        key = (quantized.tobytes(), size)
+
+        if key in self._homographies:
+            self._homographies.move_to_end(key)
+            self.hits += 1
+
+            return self._homographies[key]
+
+        self.misses += 1
+
+        pts = quantized * self.quantum
+
+        if size is None:
+            size = output_size(pts)
+
+        width, height = size
+
+        #---- cv2 points are (column, row)
+        pts_src = np.float32(pts[:, ::-1])
+        pts_dst = np.float32([[0, 0], [width - 1, 0], [width - 1, height - 1], [0, height - 1]])
+
+        #---- Exact for 4 points, no need for findHomography's fitting
+        h = cv2.getPerspectiveTransform(pts_src, pts_dst)
+
+        self._homographies[key] = (h, size)
+
+        while len(self._homographies) > self.maxsize:
+            self._homographies.popitem(last=False)
+
+        return h, size
+
+    def _buffer(self, slot, shape, dtype):
+        """
+        Output buffer for a slot, remade when the shape or type changes.
+        """
+        buffer = self._buffers.get(slot)
+
+        if buffer is None or buffer.shape != shape or buffer.dtype != dtype:
+            buffer = np.empty(shape, dtype)
+            self._buffers[slot] = buffer
+
+        return buffer
+
+    def __call__(self, img, pts, size=None, out=None, slot=0):
+        """
+        Straighten a section of an image.
+
+        Parameters
+        ----------
+        img: cv2 img(np.array)
+            Base image.
+        pts: np array
+            4 (x, y) corners of the section, clockwise from the top left,
+            x is the row. See crop_n_stitch.quadrilateral.
+        size: (int, int)
+            Width and height of the output, see output_size if None.
+        out: np array
+            Where to write the output, must match its shape and type.
+        slot: hashable
+            Output buffer to use if out is None, the result is valid until
+            the next call with the same slot.
+
+        Returns
+        -------
+        Straightened version of the image within given coordinates.
+        """
+        h, (width, height) = self.homography(pts, size)
+
+        shape = (height, width) + img.shape[2:]
+
+        if out is None:
+            out = self._buffer(slot, shape, img.dtype)
+
+        assert out.shape == shape and out.dtype == img.dtype, "Output must match the straightened section!"
+
+        return cv2.warpPerspective(img, h, (width, height), dst=out)
+
+    def batch(self, img, corners, size=None):
+        """
+        Straighten every section of a frame.
+
+        Parameters
+        ----------
+        img: cv2 img(np.array)
+            Base image.
+        corners: list of np arrays
+            Corners of each section, see __call__.
+        size: (int, int)
+            Width and height of every output, each has its own if None.
+
+        Returns
+        -------
+        List of straightened sections, valid until the next batch.
+        """
+        return [self(img, pts, size, slot=('batch', i)) for i, pts in enumerate(corners)]
+
+
+# Straightener per thread for straighten
+_local = threading.local()
+
+
+def _straightener():
+    if not hasattr(_local, 'straightener'):
+        _local.straightener = Straightener()
+
+    return _local.straightener
+
+
+def straighten(img, pts, size=None, out=None):
+    """
+    Straighten a section of an image
+
     Parameters
     ----------
     img: cv2 img(np.array)
         Base image.
     pts: list of 4 x, y coordinates
-        Points that make up bounding box of image to be straightened.
+        Points that make up bounding box of image to be straightened,
+        clockwise from the top left, x is the row.
+    size: (int, int)
+        Width and height of the output, fit to the points if None.
+    out: np array
+        Where to write the output, a new array if None.
 
     Returns
     -------
     Straightened version of the image within given coordinates.
     """
+    straightener = _straightener()
 
-    HEIGHT = 552
-    WIDTH = 77
+    if out is None:
+        h, (width, height) = straightener.homography(pts, size)
+        out = np.empty((height, width) + img.shape[2:], img.dtype)
 
-    CHANNELS = 3
+    return straightener(img, pts, size, out)
 
-    #---- 4 corner points of the bounding box
-    pts_src = np.array([[17, 0], [77, 5], [0, 552], [53, 552]])
 
-    #---- 4 corner points of the black image you want to impose it on
-    pts_dst = np.array([[0, 0], [WIDTH, 0], [0, HEIGHT], [WIDTH, HEIGHT]])
+def straighten_all(img, corners, size=None):
+    """
+    Straighten all fragments of a frame in one go.
 
-    #---- forming the black image of specific size
-    im_dst = np.zeros((HEIGHT, WIDTH, CHANNELS) if CHANNELS > 1 else (HEIGHT, WIDTH), np.uint8)
+    Parameters
+    ----------
+    img: cv2 img(np.array)
+        Base image.
+    corners: list of np arrays
+        Corners of each fragment, see straighten.
+    size: (int, int)
+        Width and height of every output, fit to each fragment if None.
 
-    #---- Framing the homography matrix
-    h, _ = cv2.findHomography(pts_src, pts_dst)
+    Returns
+    -------
+    List of straightened fragments, in buffers reused by the next call in
+    this thread.
+    """
+    return _straightener().batch(img, corners, size)
 
-    #---- transforming the image bound in the rectangle to straighten
-    out = cv2.warpPerspective(img, h, (im_dst.shape[1], im_dst.shape[0]))
 
-    return out
+if __name__ == '__main__':
+    image = np.zeros((600, 100), np.uint8)
+    pts = np.array([[0, 17], [5, 77], [552, 53], [552, 0]])
 
+    cv2.fillConvexPoly(image, np.int32(pts[:, ::-1]), 255)
 
-if __name__ == '__main__':
-    output = straighten()
+    output = straighten(image, pts)
 
     cv2.imshow("", output)
+    cv2.waitKey(0)
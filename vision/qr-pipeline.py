@@ -1,252 +1,437 @@
 """
 Pipeline from image of qr code to sending its value.
+
+Usage
+-----
+python3 qr-pipeline.py                                  Demo on a synthetic image.
+python3 qr-pipeline.py --batch img/ --workers 4         Process a directory,
+    glob or .npy stack of frames and report throughput.
+python3 qr-pipeline.py --stream 0                       Process a camera live.
 """
+import os
+import sys
+import json
+import glob
+import time
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+
 import cv2
 import numpy as np
-from scipy.signal import argrelextrema
 
 from generator.QrCode import QrCode
 from normalize.edges import get_edges
-from normalize.ts_converter import get_ts_verticies, binarize_mat, pix_to_opengl
-from accumulator.py_to_cpp import TS
+from normalize.preprocess import Preprocessor, BufferRing
+from normalize.ts_converter import binarize_mat
+from lines.pclines import PCLines, IncrementalPCLines
+from lines.cluster import cluster_lines, fragment_quadrilaterals
+from lines.detectors import select_detector
+
+# Buffers reused for every frame of the stream
+PREPROCESSOR = Preprocessor()
+
+# Edge maps of batch frames, each is done with before the next frame
+EDGE_BUFFERS = BufferRing(2)
+
+# Calibrated line detector of each frame size, see lines/calibrate.py
+DETECTORS = {}
 
 
 ## Add to pipeline
 from processing.crop_n_stitch import crop, stitch
 from processing.straighten import straighten
-from processing.read import read
+from processing.quadrants import rank_orderings
+from processing.parallel_read import parallel_read, stitch_and_read, make_executor
+from processing.consensus import ConsensusReader
+from stream.pipeline import Stage, StreamPipeline
 
 
-def preprocess(imgs):
+def preprocess(imgs, buffers=EDGE_BUFFERS):
     """
     Preprocess images.
+
+    Parameters
+    ----------
+    imgs: list of np array[uint8]
+        Frames, replaced with their binary edge maps.
+    buffers: BufferRing
+        Where the edge maps are written, each stays valid for len(buffers)
+        - 1 more frames.
+
+    Returns
+    -------
+    imgs
     """
     for i in range(len(imgs)):
-        img = imgs[i]
+        imgs[i] = PREPROCESSOR(imgs[i], out=buffers(imgs[i].shape[:2]))
+
+    return imgs
 
-        img = 255 - img
 
-        edges = get_edges(img)
+def permute_ordering(im1, im2, im3, im4, executor=None):
+    """
+    Stitch the sections in the order their content points to, search the
+    other orderings from most to least likely only if that is ambiguous.
 
-        edges = cv2.GaussianBlur(edges, (3, 3), cv2.BORDER_DEFAULT)
+    Parameters
+    ----------
+    im: 4 cv2 images(np.array)
+        Images of sections of qr codes.
+    executor: concurrent.futures.Executor
+        Pool to decode ambiguous orderings concurrently with, see
+        processing.parallel_read.make_executor. One at a time if None.
 
-        img = binarize_mat(edges, threshold=.98)
+    Returns
+    -------
+    Interpreted code if successful else none, and the number of decodes
+    that were needed.
+    """
+    sections = [im1, im2, im3, im4]
 
-        img = cv2.GaussianBlur(img, (5, 5), cv2.BORDER_DEFAULT)
+    orderings, ambiguous = rank_orderings(sections)
 
-        img = binarize_mat(edges, threshold=.96)
+    if not ambiguous:
+        orderings = orderings[:1]
+    elif executor is not None:
+        return parallel_read(sections, orderings, executor)
 
-        imgs[i] = img
+    for decodes, ordering in enumerate(orderings, 1):
+        code = stitch_and_read(sections, ordering)
 
-    return imgs
+        if code:
+            return code, decodes
+
+    return None, len(orderings)
 
 
-def permute_ordering(im1, im2, im3, im4):
+def read_fragments(frame, edges, lines, executor=None):
     """
-    Permute every stiching ordering in hopes of finding one that pyzbar
-    will read.
-    
+    Straighten the qr code fragments the lines bound and decode them
+    stitched.
+
     Parameters
     ----------
-    im: 4 cv2 images(np.array)
-        Images of sections of qr codes.
+    frame: 2d np array[uint8]
+        Greyscale image.
+    edges: 2d np array
+        Binary edge map of the frame.
+    lines: np array[LINE_DTYPE]
+        Lines found in the edges.
+    executor: concurrent.futures.Executor
+        See permute_ordering.
 
     Returns
     -------
-    Interpreted code if successful else none.
+    Interpreted code or None, the number of fragments found and the
+    number of decodes. Nothing is decoded unless 4 fragments are found.
     """
-    sections1 = [im1, im2, im3, im4]
+    center = (edges.shape[0] / 2, edges.shape[1] / 2)
+
+    # Merge near duplicate maxima of the same edge
+    lines = cluster_lines(lines, center=center, max_lines=32)
+
+    fragments = fragment_quadrilaterals(lines, edges, n_fragments=4, center=center)
+
+    if len(fragments) < 4:
+        return None, len(fragments), 0
+
+    # Ordering and decoding expect upright, axis aligned fragments
+    sections = [straighten(frame, corners) for _, corners, _ in fragments]
+
+    code, decodes = permute_ordering(*sections, executor=executor)
+
+    return code, len(fragments), decodes
 
-    for i, image1 in enumerate(sections1):
-        sections2 = sections1.copy()
-        del sections2[i]
 
-        for j, image2 in enumerate(sections2):
-            sections3 = sections2.copy()
-            del sections3[j]
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp')
 
-            for k, image3 in enumerate(sections3):
-                sections4 = sections3.copy()
-                del sections4[k]
 
-                image4 = sections4[0]
+def list_frames(source):
+    """
+    Find the frames of a batch.
+
+    Parameters
+    ----------
+    source: str
+        Directory of images, glob pattern of images or .npy stack of frames.
+
+    Returns
+    -------
+    List of (path, index) frame locations, index is None for image files.
+    """
+    if source.endswith('.npy'):
+        count = len(np.load(source, mmap_mode='r'))
 
-                full_image = stitch(image1, image2, image3, image4)
+        return [(source, i) for i in range(count)]
 
-                code = read(full_image)
+    if os.path.isdir(source):
+        source = os.path.join(source, '*')
 
-                if code:
-                    return code
+    paths = sorted(path for path in glob.glob(source) if path.lower().endswith(IMAGE_EXTENSIONS))
 
-    return None
+    return [(path, None) for path in paths]
 
 
-def PCLines(edges):
+def load_frame(path, index=None):
     """
-    PC Lines algorithm for detecting lines.
+    Load a frame as a greyscale image.
 
     Parameters
     ----------
-    edges: image
-        Values to calculate line formula from.
+    path: str
+        Image file or .npy stack.
+    index: int
+        Frame in the stack, None for image files.
 
     Returns
     -------
-    Detected slope intercept parameters [(m, b), ...].
-
-    Description
-    -----------
-    Convert cartesian to line segments in Twisted and Straight space.
-    Straight space consists of the parralel axes x', y'.
-    Twisted space consists of the parralel axes x', -y'.
-
-       v    T          S
-       |-y        |x         |y
-       |          |          |
-       |          |          |
-    ---|----------|----------|---u
-       |-d        |0         |d
-       |          |          |
-       |          |          |
-    (T and S space attatched in the uv plane. Parralel axes separated by
-    distance d along the u axis. Each parralel axis is length v.)
-
-    The length of the axis u and v does not need to be infinite. u only
-    needs to fill cover the interval [-d, d], v needs to cover the interval
-    [-max(W/2, H/2), max(W/2, H/2)] (W is width of plane, H is height).
-
-    Line formulas are calculated in slope intercept form. Local maxima
-    in TS space, above a theshold, are thought to be relevant lines.
-
-    Line formula based on space:
-        ℓ: y = mx + b
-        ℓS = (d, b, 1 − m),  −∞ ≤ m ≤ 0
-        ℓT = (−d, −b, 1 + m),  0 ≤ m ≤ ∞.
-
-        ℓ has one image in TS space; except when m = 0 or m = ±∞, 
-        meaning, when ℓ lies in both spaces either on axis x' or y'.
-
-        Attaching the y′ and −y′ axes results in an enclosed Mobius strip.
-
-    Slope based on location
-        ℓ is between x' & y' iff −∞ < m < 0.
-        ℓ is between x' & -y' iff 0 < m < ∞.
-        ℓ is on the x' axis for vertical lines m = ±∞.
-        ℓ is on the y', -y' axis at m=0.
-        ℓ is an ideal point, at infinity, at m=1.
+    2d np array[uint8], None if the image could not be read.
     """
-    N_MAXIMA = 500
+    if index is None:
+        return cv2.imread(path, cv2.IMREAD_GRAYSCALE)
 
-    V_SCALE = 1
+    frame = np.asarray(np.load(path, mmap_mode='r')[index])
 
-    IMG_WIDTH = len(edges[0])
-    IMG_HEIGHT = len(edges)
+    if frame.ndim == 3:
+        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
 
-    scale = 1  # width needs to be set in fragment shader also!
-    TS_WIDTH = int(1024 * scale) # >=  2 * D + 10
-    TS_HEIGHT = int(768 * scale) # >= max(IMG_WIDTH, IMG_HEIGHT)
+    return frame
 
-    U_OFFSET = TS_WIDTH // 2
-    V_OFFSET = TS_HEIGHT // 2
 
-    D = TS_WIDTH // 2 - 1
+def process_frame(frame):
+    """
+    Run a frame through the pipeline.
 
-    verticies = get_ts_verticies(edges, U_OFFSET, V_OFFSET, V_SCALE, D)
+    Parameters
+    ----------
+    frame: 2d np array[uint8]
+        Greyscale image.
 
-    opengl_verticies = pix_to_opengl(verticies, TS_WIDTH, TS_HEIGHT)
+    Returns
+    -------
+    dict of the decoded value, number of lines and fragments found and
+    number of decodes, see read_fragments.
+    """
+    edges, = preprocess([frame])
+
+    height, width = edges.shape[:2]
+
+    if (width, height) not in DETECTORS:
+        DETECTORS[width, height] = select_detector(width, height)
 
-    space = TS(TS_WIDTH, TS_HEIGHT, opengl_verticies)
-    accumulated = space.accumulate()
+    lines = DETECTORS[width, height](edges)
 
-    accumulated = accumulated.reshape((TS_HEIGHT, TS_WIDTH))
+    # Batch workers already fill every cpu, orderings are decoded one at a time
+    code, fragments, decodes = read_fragments(frame, edges, lines)
 
-    accumulated = accumulated[::-1]
+    return {'code': code, 'lines': len(lines), 'fragments': fragments, 'decodes': decodes}
+
+
+def _batch_worker_init():
+    """
+    Keep opencv to one thread per worker process.
+    """
+    cv2.setNumThreads(1)
 
-    # cv2.imshow("img", np.where(accumulated > 0, 1, 0.))
-    # cv2.waitKey(0)
 
-    ########################
-    # S Space
-    # ℓ : u = d/(1-m)
-    # ℓ : v = b/(1-m)
+def _batch_worker(location):
+    """
+    Load and time a frame in a worker process.
 
-    # m = -d/u + 1
-    # b = dv/u
+    Parameters
+    ----------
+    location: (path, index)
+        Frame location, see list_frames.
 
-    # T Space
-    # ℓ : u = -d/(1+m)
-    # ℓ : v = -b/(1+m)
+    Returns
+    -------
+    dict of frame results, with an error and no code if the frame could
+    not be loaded or processed.
+    """
+    path, index = location
 
-    # m = -d/u - 1
-    # b = dv/u
+    start = time.perf_counter()
 
-    # Parametrization
-    ## y = mx + b
-    ## point l* has (d, b, 1-m)
+    # One bad frame must not abort the whole batch
+    try:
+        frame = load_frame(path, index)
 
-    def m(u):
-        """
-        Calculate slope based off u axis.
-        """
-        # S: + 1, T: -1
-        if u == 0:
-            return 0
-        elif u > 0:
-            return (-D / u) + 1
+        if frame is None:
+            result = {'code': None, 'error': 'could not read frame'}
         else:
-            return (-D / u) - 1
+            result = process_frame(frame)
+    except Exception as error:
+        result = {'code': None, 'error': repr(error)}
 
-    def b(u, v):
-        """
-        Calculate y intercept based of TS space coordinates.
-        """
-        if u == 0:
-            return 0
+    result.update(path=path, index=index, latency=time.perf_counter() - start)
 
-        return abs(D * v / u)# + IMG_HEIGHT // 2
+    return result
 
-    ################
+
+def run_batch(source, results_path='results.jsonl', workers=None):
     """
-    accumulated = cv2.GaussianBlur(np.float32(accumulated), (3, 3), 0)
+    Process a batch of frames across a process pool.
+
+    Parameters
+    ----------
+    source: str
+        Frames to process, see list_frames.
+    results_path: str
+        File to write a json line of results per frame to.
+    workers: int
+        Number of processes, defaults to the number of cpus.
 
-    cv2.imshow("", accumulated)
-    cv2.waitKey(0)
+    Returns
+    -------
+    dict of frames, fps, p50/p95/p99 latency(s), decode success rate of
+    the straightened and stitched fragments and number of frames that errored.
     """
-    ################
+    locations = list_frames(source)
 
-    maxima_keys = argrelextrema(accumulated, np.greater)
+    assert locations, f'No frames found in {source}'
 
-    maxima = [(maxima_keys[1][i], maxima_keys[0][i]) for i in range(len(maxima_keys[0]))]
+    start = time.perf_counter()
 
-    maxima = dict(zip(maxima, list(accumulated[maxima_keys])))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_batch_worker_init) as executor, \
+            open(results_path, 'w') as results_file:
+        results = []
 
-    # maxima = {1: 2, 3: 4, 4: 3, 2: 1, 0: 0}
-    sorted_x = sorted(maxima.items(), key=lambda kv: kv[1])[::-1]
+        for result in executor.map(_batch_worker, locations, chunksize=4):
+            results_file.write(json.dumps(result) + '\n')
+            results.append(result)
 
-    maxima = [v[0] for v in sorted_x][:N_MAXIMA]
-    
-    ################
+    elapsed = time.perf_counter() - start
+
+    latencies = np.array([result['latency'] for result in results])
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+
+    return {
+        'frames': len(results),
+        'fps': len(results) / elapsed,
+        'p50': float(p50),
+        'p95': float(p95),
+        'p99': float(p99),
+        'success_rate': float(np.mean([result['code'] is not None for result in results])),
+        'errors': sum('error' in result for result in results),
+    }
+
+
+def camera_frames(camera):
+    """
+    Read greyscale frames from a camera until it stops.
+
+    Parameters
+    ----------
+    camera: int or str
+        Camera index or video path for cv2.VideoCapture.
+
+    Returns
+    -------
+    Generator of 2d np array[uint8].
+    """
+    capture = cv2.VideoCapture(camera)
 
-    # maxima = [maxima[2]]
+    try:
+        while True:
+            success, frame = capture.read()
 
-    ################
+            if not success:
+                break
 
-    accumulated = np.where(accumulated > 0, 1, 0.)
+            yield cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    finally:
+        capture.release()
 
-    for u, v in maxima:
-        accumulated = cv2.circle(accumulated, (u, v), 5, .5)
 
-    #cv2.imshow("Accumulation w/ maxima", accumulated)
-    #cv2.waitKey(0)
+def stream_stages(executor=None, maxsize=1):
+    """
+    Stages of the pipeline for StreamPipeline, each passes the frame along
+    with its own output.
+
+    Parameters
+    ----------
+    executor: concurrent.futures.Executor
+        Pool to decode ambiguous orderings concurrently with, see
+        permute_ordering. Must outlive the pipeline, the caller shuts it
+        down.
+    maxsize: int
+        Number of frames that can wait for each stage.
+
+    Returns
+    -------
+    list of Stage
+    """
+    # Edge maps are held while queued for or processed by the lines and read
+    # stages, plus the one being written
+    buffers = BufferRing(2 * (maxsize + 1) + 1)
+
+    def preprocess_stage(frame):
+        return frame, preprocess([frame], buffers)[0]
+
+    # Consecutive frames barely change, only their differences are accumulated
+    pclines = IncrementalPCLines()
+
+    def lines_stage(value):
+        frame, edges = value
+        return frame, edges, pclines(edges)
+
+    def decode(frame, edges, lines):
+        return read_fragments(frame, edges, lines, executor)[0]
+
+    # Only report a code once it reads in several frames
+    reader = ConsensusReader(decoder=decode)
 
-    print('Maxima:', maxima)
+    def read_stage(value):
+        frame, edges, lines = value
+        return {'code': reader(frame, edges, lines), 'lines': len(lines)}
 
-    lines = [(m(u-U_OFFSET), b(u - U_OFFSET, v - V_OFFSET)) for u, v in maxima]
+    stages = [
+        Stage('preprocess', preprocess_stage, maxsize),
+        Stage('lines', lines_stage, maxsize),
+        Stage('read', read_stage, maxsize),
+    ]
 
-    return lines
+    return stages
 
 
 if __name__ == '__main__':
+    parser = ArgumentParser()
+
+    parser.add_argument('--batch', type=str, dest='batch',
+                        help='Directory, glob or .npy stack of frames to process.')
+    parser.add_argument('--workers', type=int, dest='workers',
+                        help='Number of processes for --batch, defaults to the cpu count.')
+    parser.add_argument('--results', type=str, dest='results', default='results.jsonl',
+                        help='File to write per frame results of --batch to.')
+    parser.add_argument('--stream', type=str, dest='stream',
+                        help='Camera index or video to process live.')
+
+    options = parser.parse_args()
+
+    if options.batch:
+        report = run_batch(options.batch, options.results, options.workers)
+
+        print(f"{report['frames']} frames, {report['fps']:.2f} frames/s")
+        print(f"Latency p50 {report['p50'] * 1000:.1f}ms, p95 {report['p95'] * 1000:.1f}ms, "
+              f"p99 {report['p99'] * 1000:.1f}ms")
+        print(f"Decoded {report['success_rate']:.1%}, {report['errors']} frames errored")
+
+        sys.exit(0)
+
+    if options.stream:
+        camera = int(options.stream) if options.stream.isdigit() else options.stream
+
+        # Ambiguous orderings are decoded concurrently, pyzbar releases the gil
+        with make_executor('thread') as executor:
+            pipeline = StreamPipeline(stream_stages(executor))
+
+            for index, latency, result in pipeline.run(camera_frames(camera)):
+                print(f"Frame {index}: {result['code']}, {result['lines']} lines, {latency * 1000:.0f}ms")
+
+        for name, metrics in pipeline.metrics.items():
+            print(name, metrics)
+
+        sys.exit(0)
 
     #####################
     """
@@ -335,22 +520,18 @@ if __name__ == '__main__':
 
         lines = PCLines(edges)
 
-        print("(m, b):", lines)
+        print("(m, b):", lines[['m', 'b']])
 
-        x = lines
+        # Merge near duplicate maxima of the same edge
+        lines = cluster_lines(lines, center=(edges.shape[0] / 2, edges.shape[1] / 2))
 
-        x = sorted(x, key=lambda t: t[0])
+        print("(m, b):", lines[['m', 'b']])
 
-        lines = x[:len(x) // 8] + x[len(x) // 8 * 7:]
+        x = np.array([0, 1000])
 
-        print("(m, b):", lines)
+        points = np.stack(np.broadcast_arrays(x, lines['m'][:, None] * x + lines['b'][:, None]), axis=-1)
 
-        def line_generator(i, x):
-            return (x, lines[i][0]*x + lines[i][1])
-
-        points = [line_generator(i, x) for i in range(len(lines)) for x in [0, 1000]]
-
-        pts = np.array(points, np.int32)
+        pts = points.astype(np.int32)
         pts = pts.reshape((-1, 1, 2))
 
         line_edges = cv2.polylines(edges, [pts], True, .5, 1)
@@ -361,10 +542,11 @@ if __name__ == '__main__':
 
         ###############
 
-        #img = crop(image, lines)
+        for sides, corners, score in fragment_quadrilaterals(lines, edges):
+            img = crop(image, sides)
 
-        #cv2.imshow("Cropped image", img)
-        #cv2.waitKey(0)
+            cv2.imshow(f"Cropped image, score {score:.2f}", img)
+            cv2.waitKey(0)
  
 
 """
@@ -377,5 +559,7 @@ if __name__ == '__main__':
 
     im1, im2, im3, im4 = images
 
-    print(permute_ordering(im1, im3, im3, im4))
+    code, decodes = permute_ordering(im1, im3, im2, im4)
+
+    print(f'{code} after {decodes} decodes')
 """
@@ -2,11 +2,14 @@
 
 layout (r32ui) uniform uimageBuffer image_buffer;  
 
+// Width of the window, set by the accumulator
+uniform int width;
+
 // DEBUG
 out vec4 fragment_color;
 
 void main(void){
-    int loc = int((gl_FragCoord.y - .5) * 1024 * 1 + gl_FragCoord.x);
+    int loc = int((gl_FragCoord.y - .5) * width + gl_FragCoord.x);
     imageAtomicAdd(image_buffer, loc, 1);
 
     // DEBUG
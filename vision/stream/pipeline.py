@@ -0,0 +1,259 @@
+"""
+Staged frame pipeline for live camera input.
+
+Each stage runs in its own thread and passes its output to the next stage
+through a bounded queue. When a queue is full its oldest frame is dropped,
+a qr code is shown for 30 seconds so a fresh frame is worth more than
+processing every frame.
+"""
+import time
+import queue
+import threading
+from collections import namedtuple
+
+# Frame moving through the pipeline, time is when it entered
+Item = namedtuple('Item', ['index', 'time', 'value'])
+
+# Put on a queue to stop the stage reading it
+STOP = object()
+
+
+class Stage(object):
+    """
+    Step of the pipeline.
+
+    Parameters
+    ----------
+    name: str
+        Name used for metrics.
+    func: callable
+        Called with the previous stage's output, returns this stage's
+        output. Returning None drops the frame, raising drops it and
+        counts an error.
+    maxsize: int
+        Number of frames that can wait for this stage.
+    """
+    def __init__(self, name, func, maxsize=1):
+        self.name = name
+        self.func = func
+
+        self.input = queue.Queue(maxsize)
+
+        self.processed = 0
+        self.dropped = 0
+        self.errors = 0
+        self.last_error = None
+        self.service_time = 0.
+        self.last_service_time = 0.
+
+        self._lock = threading.Lock()
+
+    def offer(self, item):
+        """
+        Queue a frame, dropping the oldest waiting frame if full.
+
+        Parameters
+        ----------
+        item: Item or STOP
+            Frame to queue.
+        """
+        while True:
+            try:
+                self.input.put_nowait(item)
+                return
+            except queue.Full:
+                pass
+
+            try:
+                stale = self.input.get_nowait()
+            except queue.Empty:
+                continue
+
+            if stale is STOP:
+                # Never drop a stop, frames after it are not processed
+                self.input.put(stale)
+                return
+
+            with self._lock:
+                self.dropped += 1
+
+    def process(self, item):
+        """
+        Run the stage on a frame.
+
+        Parameters
+        ----------
+        item: Item
+            Frame to process.
+
+        Returns
+        -------
+        Item with this stage's output or None if dropped.
+        """
+        start = time.perf_counter()
+
+        value = self.func(item.value)
+
+        elapsed = time.perf_counter() - start
+
+        with self._lock:
+            self.processed += 1
+            self.service_time += elapsed
+            self.last_service_time = elapsed
+
+        return None if value is None else item._replace(value=value)
+
+    def failed(self, error):
+        """
+        Count a frame the stage raised on.
+
+        Parameters
+        ----------
+        error: Exception
+            What was raised.
+        """
+        with self._lock:
+            self.errors += 1
+            self.last_error = repr(error)
+
+    @property
+    def metrics(self):
+        """
+        dict of queue depth, frames processed, frames dropped, frames the
+        stage raised on and the last error, and mean and last service time
+        in seconds.
+        """
+        with self._lock:
+            return {
+                'queue_depth': self.input.qsize(),
+                'processed': self.processed,
+                'dropped': self.dropped,
+                'errors': self.errors,
+                'last_error': self.last_error,
+                'mean_service_time': self.service_time / self.processed if self.processed else 0.,
+                'last_service_time': self.last_service_time,
+            }
+
+
+class StreamPipeline(object):
+    """
+    Run frames through stages concurrently.
+
+    Parameters
+    ----------
+    stages: list of Stage
+        Stages in order.
+    maxsize: int
+        Number of finished frames kept for the consumer.
+    """
+    def __init__(self, stages, maxsize=1):
+        self.stages = stages
+
+        # Results are a stage the consumer runs
+        self.output = Stage('output', lambda value: value, maxsize)
+
+        self._threads = []
+
+    def _work(self, stage, downstream):
+        """
+        Process frames until stopped.
+        """
+        while True:
+            item = stage.input.get()
+
+            if item is STOP:
+                downstream.input.put(STOP)
+                return
+
+            # A bad frame must not kill the worker, STOP would never reach
+            # the consumer
+            try:
+                item = stage.process(item)
+            except Exception as error:
+                stage.failed(error)
+                continue
+
+            if item is not None:
+                downstream.offer(item)
+
+    def start(self):
+        """
+        Start a worker per stage.
+        """
+        downstream = self.stages[1:] + [self.output]
+
+        self._threads = [threading.Thread(target=self._work, args=(stage, after), daemon=True)
+                         for stage, after in zip(self.stages, downstream)]
+
+        for thread in self._threads:
+            thread.start()
+
+    def put(self, frame, index=None):
+        """
+        Feed a frame to the first stage, never blocks.
+
+        Parameters
+        ----------
+        frame: object
+            Input of the first stage.
+        index: int
+            Frame number.
+        """
+        self.stages[0].offer(Item(index, time.perf_counter(), frame))
+
+    def stop(self):
+        """
+        Stop the workers once the frames they have are done.
+        """
+        self.stages[0].input.put(STOP)
+
+    def results(self):
+        """
+        Yield finished frames as (index, latency in seconds, value) until
+        the pipeline is stopped.
+        """
+        while True:
+            item = self.output.input.get()
+
+            if item is STOP:
+                break
+
+            item = self.output.process(item)
+
+            yield item.index, time.perf_counter() - item.time, item.value
+
+        for thread in self._threads:
+            thread.join()
+
+    def run(self, frames):
+        """
+        Run a source of frames through the pipeline.
+
+        Parameters
+        ----------
+        frames: iterable
+            Frames, e.g. from a camera. Read in a separate thread so slow
+            stages cannot hold the camera back.
+
+        Returns
+        -------
+        Generator, see results.
+        """
+        def feed():
+            for index, frame in enumerate(frames):
+                self.put(frame, index)
+
+            self.stop()
+
+        self.start()
+
+        threading.Thread(target=feed, daemon=True).start()
+
+        return self.results()
+
+    @property
+    def metrics(self):
+        """
+        dict of metrics per stage name, see Stage.metrics.
+        """
+        return {stage.name: stage.metrics for stage in self.stages + [self.output]}
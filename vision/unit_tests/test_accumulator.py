@@ -0,0 +1,316 @@
+"""
+Unit test for the numpy TS space accumulator.
+"""
+import unittest
+from unittest import mock
+
+import numpy as np
+
+import sys, os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from accumulator import py_to_cpp
+from accumulator.py_to_cpp import CpuTS, AccumulatorSession, select_backend, load_library, lib
+from accumulator.maxima import find_maxima, maxima_to_lines
+from accumulator.incremental import IncrementalAccumulator
+from normalize.ts_converter import pix_to_opengl, get_ts_verticies
+
+
+class TestCpuAccumulator(unittest.TestCase):
+    """
+    Numpy accumulator tester.
+    """
+    WIDTH = 64
+    HEIGHT = 48
+
+    def accumulate(self, pixel_verticies):
+        """
+        Accumulate lines given in pixel coordinates.
+
+        Parameters
+        ----------
+        pixel_verticies: list of float
+            [x, y, z, ...] pixel locations, every 2 verticies is a line.
+        """
+        verticies = pix_to_opengl(np.array(pixel_verticies, np.float32), self.WIDTH, self.HEIGHT)
+
+        return CpuTS(self.WIDTH, self.HEIGHT, verticies).accumulate()
+
+    def test_output_format(self):
+        """
+        Test output matches the opengl accumulator's.
+        """
+        img = self.accumulate([0, 0, 0, 10, 0, 0])
+
+        self.assertEqual(img.shape, (self.HEIGHT, self.WIDTH))
+        self.assertEqual(img.dtype, np.uint32)
+
+    def test_horizontal(self):
+        """
+        Test a horizontal line votes once per pixel, last pixel excluded.
+        """
+        img = self.accumulate([5, 10, 0, 25, 10, 0])
+
+        self.assertEqual(img.sum(), 20)
+        self.assertTrue(np.all(img[10, 5:25] == 1))
+
+    def test_intersection(self):
+        """
+        Test crossing lines overlap on one pixel.
+        """
+        img = self.accumulate([
+            0, 0, 0, 40, 40, 0,
+            0, 40, 0, 40, 0, 0,
+            20, 0, 0, 20, 40, 0])
+
+        self.assertEqual(img.max(), 3)
+        self.assertEqual(img[20, 20], 3)
+
+    def test_clipping(self):
+        """
+        Test pixels outside of the window are dropped.
+        """
+        img = self.accumulate([-20, 5, 0, 20, 5, 0])
+
+        self.assertEqual(img.sum(), 20)
+
+    def test_batching(self):
+        """
+        Test output does not depend on the rasterization batch size.
+        """
+        rng = np.random.RandomState(0)
+        pixels = rng.uniform(-10, 70, size=(200, 3)).astype(np.float32)
+        pixels[:, 2] = 0
+        verticies = pix_to_opengl(pixels.ravel(), self.WIDTH, self.HEIGHT)
+
+        space = CpuTS(self.WIDTH, self.HEIGHT, verticies)
+        expected = space.accumulate()
+
+        space.PIXEL_BATCH = 7
+        self.assertTrue(np.array_equal(space.accumulate(), expected))
+
+    def test_weights(self):
+        """
+        Test weighted lines vote their weight, rounded.
+        """
+        verticies = pix_to_opengl(np.array([5, 10, 0, 25, 10, 0, 10, 0, 0, 10, 40, 0], np.float32),
+                                  self.WIDTH, self.HEIGHT)
+
+        img = CpuTS(self.WIDTH, self.HEIGHT, verticies).accumulate()
+
+        space = CpuTS(self.WIDTH, self.HEIGHT)
+        space.set_verticies(verticies, np.array([2.5, 1.]))
+        weighted = space.accumulate()
+
+        self.assertEqual(weighted[10, 10], 4)
+        self.assertEqual(weighted[10, 5], 2)
+        self.assertEqual(weighted[20, 10], 1)
+        self.assertTrue(np.array_equal(weighted > 0, img > 0))
+
+    def test_backend_selection(self):
+        """
+        Test explicit backend selection.
+        """
+        self.assertIs(select_backend('cpu'), CpuTS)
+
+
+class TestSession(unittest.TestCase):
+    """
+    Persistent accumulator session tester.
+    """
+
+    def test_feed(self):
+        """
+        Test frames are double buffered and match a one off accumulator.
+        """
+        session = AccumulatorSession(64, 48, backend='cpu')
+
+        first = pix_to_opengl(np.array([0, 0, 0, 40, 40, 0], np.float32), 64, 48)
+        second = pix_to_opengl(np.array([0, 10, 0, 40, 10, 0], np.float32), 64, 48)
+
+        img1 = session.feed(first)
+        img2 = session.feed(second)
+
+        self.assertIsNot(img1, img2)
+        self.assertTrue(np.array_equal(img1, CpuTS(64, 48, first).accumulate()))
+        self.assertTrue(np.array_equal(img2, CpuTS(64, 48, second).accumulate()))
+
+        self.assertIs(session.feed(first), img1)
+        self.assertTrue(np.array_equal(img1, CpuTS(64, 48, first).accumulate()))
+
+        out = np.full((48, 64), 7, np.uint32)
+        self.assertIs(session.feed(second, out=out), out)
+        self.assertTrue(np.array_equal(out, img2))
+
+        self.assertEqual(set(session.timings), {'setup', 'upload', 'accumulate', 'readback'})
+
+    def test_feed_points(self):
+        """
+        Test compact points accumulate the same as their TS verticies.
+        """
+        width, height, layout = 128, 96, (64, 48, 1, 63)
+
+        edges = (np.random.RandomState(0).rand(40, 30) > .9).astype(np.uint8)
+        points = np.argwhere(edges == 1)
+
+        session = AccumulatorSession(width, height, backend='cpu')
+
+        expected = session.feed(get_ts_verticies(edges, *layout, window_width=width, window_height=height)).copy()
+
+        for dtype in [np.int16, np.float32]:
+            self.assertTrue(np.array_equal(session.feed_points(points.astype(dtype), *layout), expected))
+
+        weights = np.full(len(points), 2.)
+        self.assertTrue(np.array_equal(session.feed_points(points, *layout, weights=weights), 2 * expected))
+
+    @unittest.skipIf(lib is None, "qr.so is not built or no opengl")
+    def test_gl_feed_points(self):
+        """
+        Test qr.so expands compact points into the same lines as get_ts_verticies.
+        """
+        width, height, layout = 128, 96, (64, 48, 1, 63)
+
+        edges = (np.random.RandomState(0).rand(40, 30) > .9).astype(np.uint8)
+
+        session = AccumulatorSession(width, height, backend='gl')
+
+        expected = session.feed(get_ts_verticies(edges, *layout, window_width=width, window_height=height)).copy()
+
+        self.assertTrue(np.array_equal(session.feed_points(np.argwhere(edges == 1), *layout), expected))
+
+    @unittest.skipIf(lib is None, "qr.so is not built or no opengl")
+    def test_gl_weights(self):
+        """
+        Test the opengl accumulator warns about weights it can not apply.
+        """
+        points = np.array([[10, 5], [20, 30]])
+        session = AccumulatorSession(128, 96, backend='gl')
+
+        uniform = session.feed_points(points, 64, 48, 1, 63, weights=np.array([2., 2.])).copy()
+        self.assertTrue(np.array_equal(uniform, 2 * session.feed_points(points, 64, 48, 1, 63)))
+
+        with self.assertWarns(UserWarning):
+            session.feed_points(points, 64, 48, 1, 63, weights=np.array([1., 3.]))
+
+    def test_outdated_library(self):
+        """
+        Test a qr.so missing functions warns and falls back to numpy.
+        """
+        class OldLibrary(object):
+            """
+            Has every function but set_points, like a qr.so built before it.
+            """
+            def __getattr__(self, name):
+                if name == 'set_points':
+                    raise AttributeError(name)
+
+                function = mock.Mock()
+                setattr(self, name, function)
+                return function
+
+        with mock.patch.object(py_to_cpp.cdll, 'LoadLibrary', return_value=OldLibrary()):
+            with self.assertWarns(UserWarning):
+                self.assertIsNone(load_library('old/qr.so'))
+
+
+class TestIncremental(unittest.TestCase):
+    """
+    Incremental accumulator tester.
+    """
+    WIDTH = 64
+    HEIGHT = 48
+    LAYOUT = (32, 24, 1, 31)
+
+    def full(self, edges):
+        verticies = get_ts_verticies(edges, *self.LAYOUT, window_width=self.WIDTH, window_height=self.HEIGHT)
+        return CpuTS(self.WIDTH, self.HEIGHT, verticies).accumulate()
+
+    def test_update(self):
+        """
+        Test diffed frames match accumulating from scratch.
+        """
+        accumulator = IncrementalAccumulator(self.WIDTH, self.HEIGHT, *self.LAYOUT,
+                                             rebuild_every=3, backend='cpu')
+
+        rng = np.random.RandomState(0)
+        edges = (rng.rand(20, 16) > .8).astype(np.uint8)
+
+        for frame in range(6):
+            accumulated = accumulator.update(edges)
+
+            self.assertTrue(np.array_equal(accumulated, self.full(edges)))
+            self.assertEqual(accumulator.rebuilt, frame in (0, 4))
+
+            # Move a few edge pixels
+            flip = rng.rand(*edges.shape) > .97
+            edges = np.where(flip, 1 - edges, edges).astype(np.uint8)
+
+    def test_change(self):
+        """
+        Test only changed pixels are accumulated and big changes rebuild.
+        """
+        accumulator = IncrementalAccumulator(self.WIDTH, self.HEIGHT, *self.LAYOUT, backend='cpu')
+
+        edges = np.zeros((20, 16), np.uint8)
+        edges[5, :] = 1
+
+        accumulator.update(edges)
+
+        accumulator.update(edges)
+        self.assertEqual(accumulator.changed, 0)
+        self.assertFalse(accumulator.rebuilt)
+
+        edges[5, 3] = 0
+        edges[6, 3] = 1
+        accumulator.update(edges)
+        self.assertEqual(accumulator.changed, 2)
+        self.assertTrue(np.array_equal(accumulator.accumulated, self.full(edges)))
+
+        accumulator.update(np.eye(20, 16, dtype=np.uint8))
+        self.assertTrue(accumulator.rebuilt)
+
+        accumulator.update(np.zeros((20, 16), np.uint8))
+        self.assertFalse(accumulator.accumulated.any())
+
+
+class TestMaxima(unittest.TestCase):
+    """
+    TS space maxima finder tester.
+    """
+
+    def test_find_maxima(self):
+        """
+        Test maxima are suppressed by neighbours, thresholded and sorted.
+        """
+        accumulated = np.zeros((20, 30), np.uint32)
+        accumulated[5, 5] = 9
+        accumulated[5, 6] = 8
+        accumulated[15, 20] = 4
+        accumulated[10, 10] = 6
+        accumulated[2, 25] = 1
+
+        u, v, votes = find_maxima(accumulated, n_maxima=10, neighbourhood=3, threshold=2)
+
+        self.assertEqual(list(u), [5, 10, 20])
+        self.assertEqual(list(v), [5, 10, 15])
+        self.assertEqual(list(votes), [9, 6, 4])
+
+        u, v, votes = find_maxima(accumulated, n_maxima=2, neighbourhood=3, threshold=2)
+
+        self.assertEqual(list(votes), [9, 6])
+
+    def test_maxima_to_lines(self):
+        """
+        Test TS space locations are converted to slope intercept form.
+        """
+        D = 100
+
+        lines = maxima_to_lines([150, 25, 50], [60, 40, 10], [3, 2, 1], D, u_offset=50, v_offset=10)
+
+        self.assertEqual(list(lines['space']), ['S', 'T', 'S'])
+        self.assertTrue(np.allclose(lines['m'], [0, 3, 0]))
+        self.assertTrue(np.allclose(lines['b'], [50, -120, 0]))
+        self.assertEqual(list(lines['votes']), [3, 2, 1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,180 @@
+"""
+Unit test for the batch mode of qr-pipeline.py.
+"""
+import json
+import tempfile
+import unittest
+import importlib.util
+from unittest import mock
+
+import cv2
+import numpy as np
+
+import sys, os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from accumulator.maxima import LINE_DTYPE
+
+# qr-pipeline.py is not an importable name, registered so pool workers find it
+_spec = importlib.util.spec_from_file_location(
+    'qr_pipeline', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'qr-pipeline.py'))
+pipeline = importlib.util.module_from_spec(_spec)
+sys.modules['qr_pipeline'] = pipeline
+_spec.loader.exec_module(pipeline)
+
+
+def squares():
+    """
+    Edge map and lines of 4 squares in a 2x2 grid, like the fragments.
+    """
+    steep = 1e6
+    edges = np.zeros((240, 320), np.uint8)
+
+    lines = []
+    for top in (20, 120):
+        for left in (30, 170):
+            edges[top:top + 81, [left, left + 80]] = 1
+            edges[[top, top + 80], left:left + 81] = 1
+
+    for row in (20, 100, 120, 200):
+        lines.append((steep, -steep * row, 50, 'T'))
+    for column in (30, 110, 170, 250):
+        lines.append((0, column, 40, 'S'))
+
+    return edges, np.array(lines, LINE_DTYPE)
+
+
+def tilted_squares(angle=10.):
+    """
+    Frame, edge map and lines of 4 squares in a 2x2 grid rotated by angle
+    degrees, each with its top left quarter black.
+    """
+    angle = np.radians(angle)
+    center = np.array([120., 160.])
+    rotation = np.array([[np.cos(angle), -np.sin(angle)], [np.sin(angle), np.cos(angle)]])
+
+    edges = np.zeros((240, 320), np.uint8)
+    frame = np.full((240, 320), 255, np.uint8)
+
+    lines = []
+    for top in (20, 120):
+        for left in (30, 170):
+            for size in (80, 40):
+                corners = np.array([[top, left], [top, left + size], [top + size, left + size], [top + size, left]])
+                corners = (corners - center) @ rotation.T + center
+                polygon = np.int32(np.round(corners[:, ::-1]))
+
+                if size == 40:
+                    cv2.fillConvexPoly(frame, polygon, 0)
+                    continue
+
+                cv2.polylines(edges, [polygon], True, 1)
+
+                for a, b in zip(corners, np.roll(corners, -1, axis=0)):
+                    m = (b[1] - a[1]) / (b[0] - a[0])
+                    lines.append((m, a[1] - m * a[0], 50, 'S'))
+
+    return frame, edges, np.array(lines, LINE_DTYPE)
+
+
+class TestBatch(unittest.TestCase):
+    """
+    Batch mode tester.
+    """
+
+    def test_read_fragments(self):
+        """
+        Test the 4 fragments are straightened and decoded stitched.
+        """
+        edges, lines = squares()
+        frame = np.where(edges == 1, 0, 255).astype(np.uint8)
+
+        with mock.patch.object(pipeline, 'permute_ordering', return_value=(4545, 2)) as permute:
+            self.assertEqual(pipeline.read_fragments(frame, edges, lines), (4545, 4, 2))
+
+        sections = permute.call_args[0]
+        self.assertEqual(len(sections), 4)
+        self.assertTrue(all(section.shape == (80, 80) for section in sections))
+
+    def test_tilted_fragments(self):
+        """
+        Test tilted fragments are straightened before being ordered.
+        """
+        frame, edges, lines = tilted_squares()
+
+        with mock.patch.object(pipeline, 'permute_ordering', return_value=(4545, 1)) as permute:
+            self.assertEqual(pipeline.read_fragments(frame, edges, lines), (4545, 4, 1))
+
+        for section in permute.call_args[0]:
+            height, width = section.shape
+
+            self.assertLess(section[:height // 2, :width // 2].mean(), 16)
+            self.assertGreater(section[height // 2:].mean(), 240)
+            self.assertGreater(section[:, width // 2:].mean(), 240)
+
+    def test_no_fragments(self):
+        """
+        Test frames without 4 fragments are not decoded.
+        """
+        result = pipeline.process_frame(np.full((120, 160), 255, np.uint8))
+
+        self.assertEqual((result['code'], result['fragments'], result['decodes']), (None, 0, 0))
+
+    def test_preprocess_buffers(self):
+        """
+        Test edge maps are written to reused buffers, held stream results
+        are not overwritten.
+        """
+        frames = [np.random.RandomState(seed).randint(0, 256, (60, 80)).astype(np.uint8) for seed in range(2)]
+
+        first, = pipeline.preprocess([frames[0].copy()])
+        second, = pipeline.preprocess([frames[1].copy()])
+        self.assertIs(pipeline.preprocess([frames[0].copy()])[0], first)
+        self.assertIsNot(first, second)
+
+        # The ring covers every edge map the later stages can hold
+        for maxsize in (1, 2):
+            preprocess_stage = pipeline.stream_stages(maxsize=maxsize)[0].func
+
+            count = 2 * (maxsize + 1)
+            held = [preprocess_stage(frames[i % 2].copy())[1] for i in range(count)]
+
+            for i, edges in enumerate(held):
+                self.assertTrue(np.array_equal(edges, pipeline.PREPROCESSOR(frames[i % 2]).copy()))
+
+            self.assertEqual(len({id(edges) for edges in held}), count)
+
+    def test_stream_executor(self):
+        """
+        Test building the stream stages makes no pool, the executor is the
+        caller's to shut down.
+        """
+        with mock.patch.object(pipeline, 'make_executor') as make_executor:
+            pipeline.stream_stages()
+
+        make_executor.assert_not_called()
+
+    def test_bad_frames(self):
+        """
+        Test unreadable frames are recorded as errors and the batch goes on.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            cv2.imwrite(os.path.join(directory, 'blank.png'), np.full((120, 160), 255, np.uint8))
+
+            with open(os.path.join(directory, 'broken.png'), 'wb') as file:
+                file.write(b'not an image')
+
+            results_path = os.path.join(directory, 'results.jsonl')
+            report = pipeline.run_batch(directory, results_path, workers=1)
+
+            with open(results_path) as file:
+                results = [json.loads(line) for line in file]
+
+        self.assertEqual((report['frames'], report['errors'], report['success_rate']), (2, 1, 0.))
+
+        errors = [result for result in results if 'error' in result]
+        self.assertEqual(len(errors), 1)
+        self.assertTrue(errors[0]['path'].endswith('broken.png'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+"""
+Unit test for the stage benchmark suite.
+"""
+import unittest
+
+import sys, os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.stages import run, compare
+
+
+class TestBenchmarks(unittest.TestCase):
+    """
+    Benchmark suite tester.
+    """
+
+    def test_run(self):
+        """
+        Test every stage is timed at every resolution.
+        """
+        results = run([(160, 120)], count=1, repeat=2)
+
+        stages = results['160x120']
+
+        for stage in ('get_edges', 'binarize_mat', 'get_ts_verticies', 'pix_to_opengl',
+                      'accumulate', 'maxima', 'stitch'):
+            self.assertIn(stage, stages)
+            self.assertEqual(stages[stage]['samples'], 2)
+            self.assertLessEqual(stages[stage]['p50_ms'], stages[stage]['p99_ms'])
+
+    def test_compare(self):
+        """
+        Test only stages worse than the baseline beyond tolerance are reported.
+        """
+        baseline = {'640x480': {
+            'get_edges': {'p50_ms': 10., 'peak_bytes': 1 << 20},
+            'maxima': {'p50_ms': 10., 'peak_bytes': 1 << 20},
+        }}
+        results = {'640x480': {
+            'get_edges': {'p50_ms': 14., 'peak_bytes': 1 << 20},
+            'maxima': {'p50_ms': 20., 'peak_bytes': 1 << 22},
+            'stitch': {'p50_ms': 100., 'peak_bytes': 1 << 30},
+        }}
+
+        regressions = compare(results, baseline, tolerance=1.5, memory_tolerance=1.5)
+
+        self.assertEqual(len(regressions), 2)
+        self.assertTrue(all(regression.startswith('640x480 maxima') for regression in regressions))
+
+
+if __name__ == '__main__':
+    unittest.main()
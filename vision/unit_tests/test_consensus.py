@@ -0,0 +1,202 @@
+"""
+Unit test for the decode cache and multi frame consensus.
+"""
+import unittest
+
+import numpy as np
+
+import sys, os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from processing.consensus import image_hash, hash_distance, DecodeCache, ConsensusReader, MISS
+
+
+class Clock(object):
+    """
+    Time that only moves when told to.
+    """
+    def __init__(self):
+        self.now = 0.
+
+    def __call__(self):
+        return self.now
+
+
+def gradient(size=64, flip=False):
+    image = np.tile(np.linspace(0, 255, size), (size, 1)).astype(np.uint8)
+    return image[:, ::-1].copy() if flip else image
+
+
+class TestHash(unittest.TestCase):
+    """
+    Perceptual hash tester.
+    """
+
+    def test_similar(self):
+        """
+        Test scaled and brightened images hash the same, different ones do not.
+        """
+        image = gradient()
+
+        self.assertEqual(image_hash(image), image_hash(gradient(128)))
+        self.assertEqual(image_hash(image), image_hash(image // 2 + 100))
+        self.assertEqual(hash_distance(image_hash(image), image_hash(gradient(flip=True))), 64)
+
+
+class TestDecodeCache(unittest.TestCase):
+    """
+    Decode cache tester.
+    """
+
+    def test_lru(self):
+        """
+        Test least recently used keys are dropped first.
+        """
+        cache = DecodeCache(maxsize=2)
+
+        cache.put(1, 'a')
+        cache.put(2, 'b')
+        cache.get(1)
+        cache.put(3, 'c')
+
+        self.assertEqual(cache.get(1), 'a')
+        self.assertIs(cache.get(2), MISS)
+        self.assertEqual(len(cache), 2)
+
+    def test_ttl(self):
+        """
+        Test decodes expire.
+        """
+        clock = Clock()
+        cache = DecodeCache(ttl=10., clock=clock)
+        calls = []
+
+        def decoder(image):
+            calls.append(image)
+            return 4545
+
+        self.assertEqual(cache.lookup(gradient(), decoder), (4545, True))
+        self.assertEqual(cache.lookup(gradient(), decoder), (4545, False))
+        self.assertEqual(len(calls), 1)
+
+        clock.now = 11.
+        cache.read(gradient(), decoder)
+        self.assertEqual(len(calls), 2)
+
+    def test_failures(self):
+        """
+        Test failed decodes are not cached, or only for failure_ttl.
+        """
+        clock = Clock()
+        calls = []
+
+        def decoder(image):
+            calls.append(image)
+            return None
+
+        cache = DecodeCache(clock=clock)
+        cache.read(gradient(), decoder)
+        cache.read(gradient(), decoder)
+        self.assertEqual((len(calls), len(cache)), (2, 0))
+
+        cache = DecodeCache(failure_ttl=1., clock=clock)
+        cache.read(gradient(), decoder)
+        cache.read(gradient(), decoder)
+        self.assertEqual(len(calls), 3)
+
+        clock.now = 2.
+        cache.read(gradient(), decoder)
+        self.assertEqual(len(calls), 4)
+
+
+class TestConsensus(unittest.TestCase):
+    """
+    Consensus reader tester.
+    """
+
+    def test_confirm(self):
+        """
+        Test a value is accepted after enough frames and then not decoded.
+        """
+        clock = Clock()
+        reader = ConsensusReader(confirmations=3, decoder=lambda image: 4545, clock=clock,
+                                 cache=DecodeCache(maxsize=0, clock=clock))
+
+        self.assertIsNone(reader(gradient()))
+        self.assertIsNone(reader(gradient()))
+        self.assertEqual(reader(gradient()), 4545)
+
+        self.assertEqual(reader(gradient(128)), 4545)
+        self.assertEqual((reader.decodes, reader.skipped), (3, 1))
+
+        # Confirmed frames are forgotten after the window
+        clock.now = 31.
+        self.assertIsNone(reader(gradient()))
+        self.assertEqual(reader.decodes, 4)
+
+    def test_misread(self):
+        """
+        Test one off reads are never accepted.
+        """
+        clock = Clock()
+        reads = iter([4545, 1234, 4545, 7, 4545])
+
+        reader = ConsensusReader(confirmations=3, decoder=lambda image: next(reads), clock=clock,
+                                 cache=DecodeCache(maxsize=0, clock=clock))
+
+        results = [reader(gradient()) for _ in range(5)]
+
+        self.assertEqual(results, [None, None, None, None, 4545])
+        self.assertFalse(reader.confirmed(1234))
+
+    def test_failed_first_decode(self):
+        """
+        Test a failed decode does not stop the next frames being decoded,
+        with the default cache.
+        """
+        clock = Clock()
+        reads = iter([None, 4545, 4545, 4545])
+
+        reader = ConsensusReader(confirmations=3, decoder=lambda image: next(reads), clock=clock)
+
+        # Frames that hash differently, like a drone drifting over the code
+        images = [np.random.RandomState(seed).randint(0, 256, (64, 64)).astype(np.uint8) for seed in range(4)]
+        results = [reader(image) for image in images]
+
+        self.assertEqual(results, [None, None, None, 4545])
+        self.assertEqual(reader.decodes, 4)
+
+    def test_static(self):
+        """
+        Test identical frames confirm a value with the default cache, like
+        hovering over the code.
+        """
+        clock = Clock()
+        reader = ConsensusReader(confirmations=3, decoder=lambda image: 4545, clock=clock)
+
+        results = []
+        for _ in range(120):
+            results.append(reader(gradient()))
+            clock.now += .5
+
+        self.assertEqual(results, [None, None] + [4545] * 118)
+        self.assertEqual(reader.decodes, 3)
+
+    def test_cached_misread(self):
+        """
+        Test a cached misread is decoded again rather than confirmed.
+        """
+        clock = Clock()
+        cache = DecodeCache(clock=clock)
+        cache.put(image_hash(gradient()), 7)
+
+        reader = ConsensusReader(confirmations=3, decoder=lambda image: 4545, cache=cache, clock=clock)
+
+        results = [reader(gradient()) for _ in range(3)]
+
+        self.assertEqual(results, [None, None, 4545])
+        self.assertEqual(reader.decodes, 3)
+        self.assertFalse(reader.confirmed(7))
+
+
+if __name__ == '__main__':
+    unittest.main()
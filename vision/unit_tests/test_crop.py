@@ -0,0 +1,141 @@
+"""
+Unit test for cropping fragments by their boundary lines and stitching
+them back together.
+"""
+import unittest
+
+import numpy as np
+
+import sys, os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from processing.crop_n_stitch import quadrilateral, crop, stitch, stitch_canvas, uncovered, CanvasPool
+from accumulator.maxima import LINE_DTYPE
+
+# Near infinite slope, a line along a row
+STEEP = 1e9
+
+
+def row_line(row):
+    return STEEP, -STEEP * row
+
+
+class TestCrop(unittest.TestCase):
+    """
+    Crop tester.
+    """
+    # Rows 10 to 30, columns 20 to 50, lines in shuffled order
+    RECTANGLE = [(0, 20), row_line(30), (0, 50), row_line(10)]
+
+    # Diamond with corners (10, 40), (30, 60), (50, 40), (30, 20)
+    DIAMOND = [(1, -10), (-1, 50), (1, 30), (-1, 90)]
+
+    def setUp(self):
+        self.image = np.arange(100 * 100).reshape(100, 100) + 1
+
+    def test_corners(self):
+        """
+        Test corners are clockwise from the top left.
+        """
+        np.testing.assert_allclose(quadrilateral(self.RECTANGLE), [[10, 20], [10, 50], [30, 50], [30, 20]])
+        np.testing.assert_allclose(quadrilateral(self.DIAMOND), [[10, 40], [30, 60], [50, 40], [30, 20]])
+
+    def test_view(self):
+        """
+        Test unmasked regions are views of the image.
+        """
+        cropped = crop(self.image, self.RECTANGLE)
+
+        self.assertTrue(np.shares_memory(cropped, self.image))
+        np.testing.assert_array_equal(cropped, self.image[10:31, 20:51])
+
+        lines = np.array([(m, b, 1, 'S') for m, b in self.DIAMOND], LINE_DTYPE)
+        cropped = crop(self.image, lines, mask=False)
+
+        self.assertTrue(np.shares_memory(cropped, self.image))
+        self.assertEqual(cropped.shape, (41, 41))
+
+    def test_mask(self):
+        """
+        Test pixels outside the region are filled.
+        """
+        cropped = crop(self.image, self.DIAMOND)
+
+        self.assertFalse(np.shares_memory(cropped, self.image))
+        self.assertEqual(cropped.shape, (41, 41))
+
+        self.assertEqual(cropped[0, 0], 0)
+        self.assertEqual(cropped[20, 20], self.image[30, 40])
+        self.assertEqual(cropped[0, 20], self.image[10, 40])
+
+    def test_outside(self):
+        """
+        Test regions are clipped to the image.
+        """
+        cropped = crop(self.image, [(0, -20), (0, 5), row_line(-10), row_line(3)])
+
+        np.testing.assert_array_equal(cropped, self.image[:4, :6])
+
+
+class TestStitch(unittest.TestCase):
+    """
+    Stitch tester.
+    """
+
+    def setUp(self):
+        self.images = [np.full(shape, i + 1, np.uint8) for i, shape in enumerate([(4, 4), (3, 3), (2, 2), (1, 1)])]
+
+    def test_stitch(self):
+        """
+        Test images are placed around the center.
+        """
+        out = stitch(*self.images)
+
+        expected = np.zeros((6, 7), np.uint8)
+        expected[:4, 3:] = 1
+        expected[1:4, :3] = 2
+        expected[4:, 1:3] = 3
+        expected[4, 3] = 4
+
+        np.testing.assert_array_equal(out, expected)
+        self.assertEqual(out.dtype, np.uint8)
+
+    def test_wide(self):
+        """
+        Test a wide right image next to a wide left one fits.
+        """
+        images = [np.ones((2, 5)), np.ones((1, 1)), np.ones((2, 10)), np.ones((1, 1))]
+
+        self.assertEqual(stitch(*images).shape, (4, 15))
+
+    def test_uncovered(self):
+        """
+        Test the uncovered regions and images tile the canvas.
+        """
+        shape, slices = (6, 7), stitch_canvas(*self.images, pool=CanvasPool())[1]
+
+        counts = np.zeros(shape, int)
+        for region in uncovered(shape, slices) + slices:
+            counts[region] += 1
+
+        np.testing.assert_array_equal(counts, 1)
+
+    def test_pool(self):
+        """
+        Test canvases are reused and cleared where no longer covered.
+        """
+        pool = CanvasPool()
+
+        canvas, slices = stitch_canvas(*self.images, pool=pool)
+
+        swapped = [self.images[0], self.images[1], self.images[3], self.images[2]]
+        again, _ = stitch_canvas(*swapped, pool=pool)
+
+        self.assertIs(again, canvas)
+        self.assertEqual(len(pool), 1)
+
+        fresh, _ = stitch_canvas(*swapped, pool=CanvasPool())
+        np.testing.assert_array_equal(again, fresh)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+"""
+Unit test for the synthetic frame generator.
+"""
+import unittest
+
+import numpy as np
+
+import sys, os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from generator.dataset import Augmentation, render_frame, side_equations, FRAGMENTS
+from processing.crop_n_stitch import quadrilateral
+
+
+class TestDataset(unittest.TestCase):
+    """
+    Dataset generator tester.
+    """
+
+    def test_side_equations(self):
+        """
+        Test sides are top, right, bottom then left.
+        """
+        corners = np.array([[10., 20.], [10., 50.], [30., 60.], [30., 20.]])
+
+        lines = side_equations(corners)
+
+        self.assertGreaterEqual(abs(lines[0, 0]), 1e9)
+        np.testing.assert_allclose(lines[1], [.5, 45])
+        np.testing.assert_allclose(lines[3], [0, 20])
+
+    def test_truth(self):
+        """
+        Test the ground truth lines bound the ground truth corners.
+        """
+        frame, truth = render_frame('1234', 320, 240, Augmentation(perspective=.1), np.random.RandomState(3))
+
+        self.assertEqual(frame.shape, (240, 320))
+        self.assertEqual(frame.dtype, np.uint8)
+        self.assertEqual(truth['value'], '1234')
+        self.assertEqual([fragment['fragment'] for fragment in truth['fragments']], list(FRAGMENTS))
+
+        for fragment in truth['fragments']:
+            np.testing.assert_allclose(quadrilateral(fragment['lines']), fragment['corners'], atol=1e-3)
+
+    def test_seeded(self):
+        """
+        Test the same seed makes the same frame.
+        """
+        augmentation = Augmentation(noise=1., occlusion=1.)
+
+        first, _ = render_frame('99', 160, 120, augmentation, np.random.RandomState(0))
+        second, _ = render_frame('99', 160, 120, augmentation, np.random.RandomState(0))
+
+        np.testing.assert_array_equal(first, second)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,227 @@
+"""
+Unit test for coarse to fine PC Lines.
+"""
+import json
+import tempfile
+import unittest
+
+import numpy as np
+
+import sys, os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lines.pclines import PCLines, multiscale_PCLines, line_to_ts, downscale_edges, ts_parameters
+from lines.cluster import line_normals, normals_to_lines, cluster_lines, fragment_quadrilaterals
+from lines.detectors import DETECTORS, available_detectors, make_detector, select_detector, segments_to_lines
+from lines.calibrate import recall
+from accumulator.maxima import maxima_to_lines, LINE_DTYPE
+
+
+def draw_lines(shape, lines):
+    """
+    Edge map with a line y = mx + b for each (m, b), x the row.
+    """
+    edges = np.zeros(shape, np.uint8)
+
+    x = np.arange(shape[0])
+    for m, b in lines:
+        y = np.rint(m * x + b).astype(int)
+        inside = (y >= 0) & (y < shape[1])
+        edges[x[inside], y[inside]] = 1
+
+    return edges
+
+
+class TestPCLines(unittest.TestCase):
+    """
+    PC Lines tester.
+    """
+    SHAPE = (240, 320)
+    LINES = [(.5, 20), (-.5, 250), (0, 150)]
+
+    def assertFound(self, lines, m, b):
+        close = (np.abs(lines['m'] - m) < .05) & (np.abs(lines['b'] - b) < 3)
+        self.assertTrue(close.any(), f"y = {m}x + {b} not found")
+
+    def test_line_to_ts(self):
+        """
+        Inverse of maxima_to_lines.
+        """
+        d = ts_parameters()[4]
+        m, b = np.array([.5, -.5, 2., 0.]), np.array([20., 250., -40., 150.])
+
+        u, v = line_to_ts(m, b, d)
+        lines = maxima_to_lines(u, v, np.ones(4), d, 0, 0)
+
+        np.testing.assert_allclose(lines['m'], m)
+        np.testing.assert_allclose(lines['b'], b)
+
+    def test_downscale(self):
+        """
+        Blocks with any edge are edges.
+        """
+        edges = np.zeros((5, 6), np.uint8)
+        edges[1, 1] = edges[4, 5] = 1
+
+        small = downscale_edges(edges, 2)
+
+        self.assertEqual(small.dtype, np.uint8)
+        np.testing.assert_array_equal(small, [[1, 0, 0], [0, 0, 0]])
+
+    def test_signed_intercept(self):
+        """
+        Full resolution lines keep the sign of their intercept.
+        """
+        lines = PCLines(draw_lines(self.SHAPE, [(2, -100)]))
+
+        self.assertFound(lines[:1], 2, -100)
+
+    def test_multiscale(self):
+        """
+        Coarse to fine finds the same lines as full resolution.
+        """
+        edges = draw_lines(self.SHAPE, self.LINES)
+
+        for factor in (2, 4):
+            lines = multiscale_PCLines(edges, factor, n_lines=6)
+
+            for m, b in self.LINES:
+                self.assertFound(lines, m, b)
+
+            self.assertTrue(np.all(np.diff(lines['votes'].astype(int)) <= 0))
+
+
+def make_lines(lines):
+    """
+    np array[LINE_DTYPE] of (m, b, votes).
+    """
+    return np.array([(m, b, votes, 'S') for m, b, votes in lines], LINE_DTYPE)
+
+
+class TestCluster(unittest.TestCase):
+    """
+    Line clustering tester.
+    """
+    SHAPE = (240, 320)
+    CENTER = (120, 160)
+
+    def test_normals(self):
+        """
+        Test converting to angle and offset and back.
+        """
+        m, b = np.array([.5, -2., 0., 1e6]), np.array([20., 300., 150., -3e7])
+
+        theta, rho = line_normals(m, b, self.CENTER)
+        m2, b2 = normals_to_lines(theta, rho, self.CENTER)
+
+        np.testing.assert_allclose(m2, m)
+        np.testing.assert_allclose(b2, b)
+
+    def test_merge(self):
+        """
+        Test near duplicates merge into their vote weighted mean.
+        """
+        lines = make_lines([(.5, 20, 10), (.5, 22, 30), (.52, 21, 5), (-.5, 250, 8), (.5, 60, 20)])
+
+        merged = cluster_lines(lines, offset_tolerance=3., center=self.CENTER)
+
+        self.assertEqual(len(merged), 3)
+        np.testing.assert_array_equal(merged['votes'], [45, 20, 8])
+        self.assertTrue(20 < merged['b'][0] < 22)
+        self.assertAlmostEqual(merged['m'][2], -.5)
+
+    def test_steep(self):
+        """
+        Test lines along a row merge whichever way their slope points.
+        """
+        lines = make_lines([(1e6, -1e6 * 40, 10), (-1e6, 1e6 * 40.5, 10)])
+
+        merged = cluster_lines(lines, center=self.CENTER)
+
+        self.assertEqual(len(merged), 1)
+        self.assertEqual(merged['votes'][0], 20)
+        self.assertAlmostEqual(-merged['b'][0] / merged['m'][0], 40.25, places=3)
+
+    def test_fragments(self):
+        """
+        Test each square's sides are found as a quadrilateral.
+        """
+        steep = 1e6
+        rows, columns = (20, 60), (30, 70, 110, 150)
+
+        lines = [(steep, -steep * row, 50) for row in rows] + [(0, column, 40) for column in columns]
+        lines = make_lines(lines)
+
+        edges = np.zeros(self.SHAPE, np.uint8)
+        edges[20:61, 30] = edges[20:61, 70] = edges[20:61, 110] = edges[20:61, 150] = 1
+        edges[20, 30:71] = edges[60, 30:71] = edges[20, 110:151] = edges[60, 110:151] = 1
+
+        fragments = fragment_quadrilaterals(lines, edges, n_fragments=4, min_score=.5)
+
+        self.assertEqual(len(fragments), 2)
+
+        corners = sorted(np.round(corners[0]).tolist() for _, corners, _ in fragments)
+        self.assertEqual(corners, [[20, 30], [20, 110]])
+
+
+class TestDetectors(unittest.TestCase):
+    """
+    Line detector backends tester.
+    """
+    SHAPE = (240, 320)
+
+    def test_segments(self):
+        """
+        Test segments become lines through them, strongest first.
+        """
+        lines = segments_to_lines(np.array([0., 10.]), np.array([5., 0.]), np.array([10., 10.]),
+                                  np.array([25., 30.]), np.array([3., 7.]))
+
+        self.assertEqual(lines.dtype, LINE_DTYPE)
+        self.assertEqual(lines['votes'].tolist(), [7, 3])
+
+        # Along a row
+        self.assertGreater(lines['m'][0], 1e6)
+        self.assertEqual(lines['space'][0], 'T')
+
+        self.assertEqual((lines['m'][1], lines['b'][1]), (2., 5.))
+        self.assertEqual(lines['space'][1], 'T')
+
+    def test_detectors(self):
+        """
+        Test every available detector finds a drawn line.
+        """
+        edges = draw_lines(self.SHAPE, [(.5, 40)])
+        center = (self.SHAPE[0] / 2, self.SHAPE[1] / 2)
+
+        for name in available_detectors():
+            with self.subTest(detector=name):
+                lines = make_detector(name)(edges)
+
+                self.assertEqual(lines.dtype, LINE_DTYPE)
+                self.assertTrue(np.all(np.diff(lines['votes'].astype(int)) <= 0))
+
+                self.assertEqual(recall(lines, np.array([[.5, 40.]]), center), 1.)
+
+    def test_unavailable(self):
+        """
+        Test unavailable detectors raise and are not selected.
+        """
+        unavailable = [name for name in DETECTORS if name not in available_detectors()]
+
+        for name in unavailable:
+            with self.assertRaises(OSError):
+                make_detector(name)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'calibration.json')
+
+            with open(path, 'w') as file:
+                json.dump({'320x240': {'detector': 'hough'}, '640x480': {'detector': 'missing'}}, file)
+
+            self.assertEqual(select_detector(320, 240, path).name, 'hough')
+            self.assertEqual(select_detector(640, 480, path).name, make_detector().name)
+            self.assertEqual(select_detector(1280, 960, path).name, make_detector().name)
+
+
+if __name__ == '__main__':
+    unittest.main()
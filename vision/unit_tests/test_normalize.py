@@ -9,7 +9,10 @@ import matplotlib.pyplot as plt
 
 import sys, os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from normalize.ts_converter import binarize_mat
+from normalize.ts_converter import binarize_mat, get_ts_verticies, pix_to_opengl
+from normalize.edges import get_edges, EdgeDetector
+from normalize.preprocess import Preprocessor, BufferRing
+from normalize.reduce import thin, subsample, EdgeReducer
 
 
 class TestNormalizer(unittest.TestCase):
@@ -33,6 +36,173 @@ class TestNormalizer(unittest.TestCase):
 
         self.assertEqual(len(np.unique(img)), 2)
 
+    def test_ts_verticies(self):
+        """
+        Test edge pixels are converted to two TS space lines each.
+        """
+        edges = np.zeros((4, 5))
+        edges[1, 2] = 1
+        edges[3, 0] = 1
+
+        verticies = get_ts_verticies(edges, u_offset=10, v_offset=20, v_scale=2, d=5)
+
+        self.assertEqual(verticies.dtype, np.float32)
+        self.assertTrue(np.array_equal(verticies.reshape(-1, 3), [
+            [10, 22, 0], [5, 16, 0], [10, 22, 0], [15, 24, 0],
+            [10, 26, 0], [5, 20, 0], [10, 26, 0], [15, 20, 0]]))
+
+    def test_fused_ts_verticies(self):
+        """
+        Test verticies written in opengl coordinates match pix_to_opengl.
+        """
+        edges = binarize_mat(np.random.RandomState(0).rand(30, 40), threshold=.8)
+        args = edges, 512, 384, 1, 511
+
+        expected = pix_to_opengl(get_ts_verticies(*args), 1024, 768)
+        fused = get_ts_verticies(*args, window_width=1024, window_height=768)
+
+        self.assertTrue(np.allclose(fused, expected, atol=1e-6))
+
+    def test_pix_to_opengl(self):
+        """
+        Test pixel to opengl conversion into new, given and input buffers.
+        """
+        values = np.array([0, 0, 0, 511.5, 383.5, 2], np.float32)
+        expected = np.array([-1 + 1 / 1024, -1 + 1 / 768, 0, 0, 0, 2], np.float32)
+
+        self.assertTrue(np.allclose(pix_to_opengl(values, 1024, 768), expected))
+
+        out = np.empty_like(values)
+        self.assertIs(pix_to_opengl(values, 1024, 768, out=out), out)
+        self.assertTrue(np.allclose(out, expected))
+
+        self.assertIs(pix_to_opengl(values, 1024, 768, inplace=True), values)
+        self.assertTrue(np.allclose(values, expected))
+
+    def test_preprocessor(self):
+        """
+        Test preprocessor matches blurring and binarizing float64 edges.
+        """
+        img = np.full((120, 160), 255, np.uint8)
+        cv2.rectangle(img, (30, 20), (120, 90), 0, -1)
+        cv2.circle(img, (80, 60), 15, 128, -1)
+
+        edges = cv2.GaussianBlur(get_edges(255 - img), (3, 3), cv2.BORDER_DEFAULT)
+        expected = binarize_mat(edges, threshold=.96)
+
+        preprocessor = Preprocessor(160, 120)
+        output = preprocessor(img)
+
+        self.assertEqual(output.dtype, np.uint8)
+        self.assertTrue(np.array_equal(output, expected))
+        self.assertIs(preprocessor(img), output)
+
+        colour = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+        self.assertTrue(np.array_equal(preprocessor(colour, out=np.empty_like(img)), expected))
+
+    def test_edge_detector(self):
+        """
+        Test edge detector output types, regions of interest and canny.
+        """
+        img = np.random.RandomState(0).randint(0, 256, (60, 80)).astype(np.uint8)
+
+        expected = get_edges(img)
+
+        for dtype in [np.float32, np.int16]:
+            edges = EdgeDetector(dtype)(img)
+
+            self.assertEqual(edges.dtype, dtype)
+            self.assertTrue(np.array_equal(edges, expected))
+
+        roi = EdgeDetector()(img, roi=(10, 5, 30, 20))
+        self.assertTrue(np.array_equal(roi, expected[5:25, 10:40]))
+
+        corner = EdgeDetector()(img, roi=(0, 0, 4, 4))
+        self.assertTrue(np.array_equal(corner, expected[:4, :4]))
+
+        # Roi edges are worked out in a buffer kept between calls
+        detector = EdgeDetector()
+        out = np.empty((20, 30))
+        detector(img, roi=(10, 5, 30, 20), out=out)
+        working = detector._edges
+
+        self.assertIs(detector(img, roi=(10, 5, 30, 20), out=out), out)
+        self.assertIs(detector._edges, working)
+        self.assertTrue(np.array_equal(out, expected[5:25, 10:40]))
+
+        canny = EdgeDetector(canny=True)(img)
+        self.assertEqual(canny.dtype, np.uint8)
+        self.assertTrue(set(np.unique(canny)) <= {0, 1})
+
+    def test_buffer_ring(self):
+        """
+        Test buffers are handed out in turn and remade for new shapes.
+        """
+        ring = BufferRing(3)
+
+        first, second, third = ring((4, 5)), ring((4, 5)), ring((4, 5))
+
+        self.assertEqual(len({id(first), id(second), id(third)}), 3)
+        self.assertIs(ring((4, 5)), first)
+        self.assertEqual(first.dtype, np.uint8)
+
+        resized = ring((6, 7))
+        self.assertEqual(resized.shape, (6, 7))
+        self.assertIsNot(resized, second)
+
+    def test_thin(self):
+        """
+        Test thick edges are thinned to lines one pixel wide.
+        """
+        edges = np.zeros((60, 80), np.uint8)
+        edges[10:15, 5:75] = 1
+        edges[20:55, 40:44] = 1
+
+        thinned = thin(edges)
+
+        self.assertTrue(np.all(thinned <= edges))
+        self.assertEqual(np.count_nonzero(thinned[:, 30]), 1)
+        self.assertEqual(np.count_nonzero(thinned[35]), 1)
+
+    def test_subsample(self):
+        """
+        Test subsampling keeps max_points points spread over the image,
+        weighted to the number of points.
+        """
+        edges = np.zeros((64, 64), np.uint8)
+        edges[:32, :32] = 1
+        edges[40, :] = 1
+
+        x, y = np.nonzero(edges)
+        keep, weights = subsample(x, y, edges.shape, 100, cells=2)
+
+        self.assertEqual(len(keep), 100)
+        self.assertEqual(len(np.unique(keep)), 100)
+        self.assertAlmostEqual(weights.sum(), len(x))
+
+        # The sparse bottom half still gets its share
+        bottom = x[keep] >= 32
+        self.assertAlmostEqual(weights[bottom].sum(), 64)
+
+    def test_edge_reducer(self):
+        """
+        Test the reducer bounds the number of points.
+        """
+        edges = (np.random.RandomState(0).rand(60, 80) > .5).astype(np.uint8)
+
+        x, y, weights = EdgeReducer(thinning=False, max_points=500)(edges)
+        self.assertEqual(len(x), 500)
+        self.assertTrue(np.all(edges[x, y] == 1))
+        self.assertAlmostEqual(weights.sum(), edges.sum())
+
+        # One cell, the same weight everywhere for the opengl accumulator
+        x, y, weights = EdgeReducer(thinning=False, max_points=500, cells=1)(edges)
+        self.assertTrue(np.allclose(weights, edges.sum() / 500))
+
+        x, y, weights = EdgeReducer(thinning=False, max_points=None)(edges)
+        self.assertEqual(len(x), edges.sum())
+        self.assertIsNone(weights)
+
     def visualize_ts(self, img):
         """
         Visualize the ts space representation of an image, points with a 
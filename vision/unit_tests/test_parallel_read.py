@@ -0,0 +1,108 @@
+"""
+Unit test for decoding stitch orderings concurrently.
+"""
+import threading
+import unittest
+from unittest import mock
+from concurrent.futures import ThreadPoolExecutor
+
+import sys, os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from processing import parallel_read as module
+from processing.parallel_read import parallel_read, make_executor
+
+ORDERINGS = [(0, 1, 2, 3), (1, 0, 2, 3), (0, 2, 1, 3), (2, 0, 1, 3), (3, 1, 2, 0), (0, 3, 2, 1)]
+
+
+class FakeDecoder(object):
+    """
+    Stands in for stitch_and_read, orderings are read as given in results.
+
+    Orderings without a result block until released, so the test decides
+    which decodes can finish.
+    """
+    def __init__(self, results):
+        self.results = results
+        self.release = threading.Event()
+
+        self.started = []
+        self._lock = threading.Lock()
+
+    def __call__(self, sections, ordering):
+        with self._lock:
+            self.started.append(ordering)
+
+        if ordering not in self.results:
+            self.release.wait(5)
+            return None
+
+        result = self.results[ordering]
+
+        if isinstance(result, Exception):
+            raise result
+
+        return result
+
+
+class TestParallelRead(unittest.TestCase):
+    """
+    Parallel read tester.
+    """
+
+    def run_orderings(self, decoder, workers=2):
+        """
+        parallel_read with decoder, the pool is shut down before returning.
+        """
+        executor = ThreadPoolExecutor(max_workers=workers)
+
+        try:
+            with mock.patch.object(module, 'stitch_and_read', decoder):
+                return parallel_read([None] * 4, ORDERINGS, executor)
+        finally:
+            decoder.release.set()
+            executor.shutdown(wait=True)
+
+    def test_first_success(self):
+        """
+        Test the first ordering that reads is returned while others still run.
+        """
+        decoder = FakeDecoder({ORDERINGS[1]: 4545})
+
+        code, decodes = self.run_orderings(decoder)
+
+        self.assertEqual(code, 4545)
+        self.assertEqual(decodes, len(decoder.started))
+        self.assertLess(decodes, len(ORDERINGS))
+
+    def test_none_read(self):
+        """
+        Test every ordering is tried when none reads.
+        """
+        decoder = FakeDecoder({ordering: None for ordering in ORDERINGS})
+
+        self.assertEqual(self.run_orderings(decoder), (None, len(ORDERINGS)))
+        self.assertEqual(sorted(decoder.started), sorted(ORDERINGS))
+
+    def test_cancel_on_error(self):
+        """
+        Test a decode that raises cancels the orderings not started.
+        """
+        decoder = FakeDecoder({ORDERINGS[0]: ValueError("bad section")})
+
+        with self.assertRaises(ValueError):
+            self.run_orderings(decoder, workers=1)
+
+        # The one worker can start at most one more before the rest are cancelled
+        self.assertLessEqual(len(decoder.started), 2)
+
+    def test_make_executor(self):
+        """
+        Test executors of each kind are made.
+        """
+        for kind in ['thread', 'process']:
+            with make_executor(kind, workers=1) as executor:
+                self.assertEqual(executor.submit(abs, -2).result(), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
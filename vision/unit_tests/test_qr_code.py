@@ -0,0 +1,48 @@
+"""
+Unit test for QrCode's derived images.
+"""
+import unittest
+
+import numpy as np
+
+import sys, os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from generator.QrCode import QrCode
+
+
+class TestQrCode(unittest.TestCase):
+    """
+    QrCode tester.
+    """
+
+    def test_img(self):
+        """
+        Test the code is a black and white uint8 image.
+        """
+        img = QrCode('1234').img
+
+        self.assertEqual(img.dtype, np.uint8)
+        self.assertEqual(set(np.unique(img)), {0, 255})
+        self.assertEqual(img.shape[0], img.shape[1])
+
+    def test_memoized(self):
+        """
+        Test derived images are made once per value.
+        """
+        qr = QrCode('1234')
+
+        self.assertIs(qr.combined_image, qr.combined_image)
+        self.assertIs(qr.top_left_corner, qr.top_left_corner)
+        self.assertTrue(np.shares_memory(qr.top_left_corner, qr.img))
+
+        img, combined = qr.img, qr.combined_image
+        qr.encoded_value = '4321'
+
+        self.assertIsNot(qr.img, img)
+        self.assertIsNot(qr.combined_image, combined)
+        self.assertFalse(np.array_equal(qr.img, img))
+        np.testing.assert_array_equal(qr.img, QrCode('4321').img)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+"""
+Unit test for classifying qr code fragments by quadrant.
+"""
+import unittest
+
+import numpy as np
+
+import sys, os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from generator.QrCode import QrCode
+from processing.quadrants import quadrant_scores, rank_orderings
+
+
+class TestQuadrants(unittest.TestCase):
+    """
+    Quadrant classifier tester.
+    """
+
+    def test_classify(self):
+        """
+        Test each generated corner scores highest for its own quadrant.
+        """
+        for code in ['1003', '1234', '4545']:
+            generator = QrCode(code)
+            sections = [generator.top_right_corner, generator.top_left_corner,
+                        generator.bottom_left_corner, generator.bottom_right_corner]
+
+            for quadrant, section in enumerate(sections):
+                self.assertEqual(np.argmax(quadrant_scores(section)), quadrant)
+
+    def test_rank_orderings(self):
+        """
+        Test shuffled fragments are put back in order without ambiguity.
+        """
+        generator = QrCode('1003')
+        sections = [generator.bottom_left_corner, generator.top_right_corner,
+                    generator.bottom_right_corner, generator.top_left_corner]
+
+        orderings, ambiguous = rank_orderings(sections)
+
+        self.assertEqual(orderings[0], (1, 3, 0, 2))
+        self.assertEqual(len(orderings), 24)
+        self.assertFalse(ambiguous)
+
+    def test_ambiguous(self):
+        """
+        Test fragments without any patterns are ambiguous.
+        """
+        blank = np.full((50, 50), 255, np.uint8)
+
+        _, ambiguous = rank_orderings([blank] * 4)
+
+        self.assertTrue(ambiguous)
+
+
+if __name__ == '__main__':
+    unittest.main()
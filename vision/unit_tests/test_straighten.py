@@ -0,0 +1,69 @@
+"""
+Unit test for straightening fragments.
+"""
+import unittest
+
+import numpy as np
+import cv2
+
+import sys, os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from processing.straighten import Straightener, straighten, straighten_all, output_size
+
+
+class TestStraighten(unittest.TestCase):
+    """
+    Straighten tester.
+    """
+    # Skewed quadrilateral, (row, column) clockwise from the top left
+    CORNERS = np.array([[10, 20], [14, 80], [70, 76], [66, 16]])
+
+    def setUp(self):
+        self.image = np.zeros((100, 100), np.uint8)
+        cv2.fillConvexPoly(self.image, np.int32(self.CORNERS[:, ::-1]), 255)
+
+    def test_straighten(self):
+        """
+        Test the section fills an upright output.
+        """
+        out = straighten(self.image, self.CORNERS)
+
+        self.assertEqual(out.shape[::-1], output_size(self.CORNERS))
+        self.assertGreater(out[1:-1, 1:-1].min(), 200)
+
+        sized = straighten(self.image, self.CORNERS, size=(30, 20))
+        self.assertEqual(sized.shape, (20, 30))
+
+    def test_cache(self):
+        """
+        Test corners that barely move share a homography and buffer.
+        """
+        straightener = Straightener(quantum=2.)
+
+        first = straightener(self.image, self.CORNERS)
+        second = straightener(self.image, self.CORNERS + .4)
+
+        self.assertIs(first, second)
+        self.assertEqual((straightener.hits, straightener.misses), (1, 1))
+
+        straightener(self.image, self.CORNERS + 5)
+        self.assertEqual(straightener.misses, 2)
+
+    def test_batch(self):
+        """
+        Test every fragment gets its own output.
+        """
+        corners = [self.CORNERS, self.CORNERS + 10, self.CORNERS - 5, self.CORNERS + [0, 10]]
+
+        outs = straighten_all(self.image, corners, size=(40, 40))
+
+        self.assertEqual(len({id(out) for out in outs}), 4)
+
+        for out, pts in zip(outs, corners):
+            np.testing.assert_array_equal(out, straighten(self.image, pts, size=(40, 40)))
+
+        self.assertIs(straighten_all(self.image, corners, size=(40, 40))[0], outs[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
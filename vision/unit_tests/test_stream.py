@@ -0,0 +1,90 @@
+"""
+Unit test for the staged frame pipeline.
+"""
+import time
+import unittest
+
+import sys, os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from stream.pipeline import Stage, StreamPipeline
+
+
+class TestStreamPipeline(unittest.TestCase):
+    """
+    Stream pipeline tester.
+    """
+
+    def test_stages(self):
+        """
+        Test every frame goes through every stage when nothing falls behind.
+        """
+        pipeline = StreamPipeline([Stage('add', lambda x: x + 1), Stage('double', lambda x: x * 2)])
+
+        def frames():
+            for i in range(5):
+                yield i
+                time.sleep(.01)
+
+        results = [value for _, _, value in pipeline.run(frames())]
+
+        self.assertEqual(results, [2, 4, 6, 8, 10])
+        self.assertEqual(pipeline.metrics['double']['processed'], 5)
+
+    def test_drop_stale(self):
+        """
+        Test a slow stage drops old frames but keeps the newest.
+        """
+        def slow(x):
+            time.sleep(.01)
+            return x
+
+        pipeline = StreamPipeline([Stage('slow', slow)])
+
+        indices = [index for index, _, _ in pipeline.run(range(100))]
+
+        metrics = pipeline.metrics['slow']
+
+        self.assertEqual(indices[-1], 99)
+        self.assertEqual(indices, sorted(indices))
+        self.assertEqual(metrics['processed'] + metrics['dropped'], 100)
+        self.assertGreater(metrics['dropped'], 0)
+
+    def test_filter(self):
+        """
+        Test stages returning None drop the frame.
+        """
+        pipeline = StreamPipeline([Stage('odd', lambda x: x if x % 2 else None)])
+
+        def frames():
+            for i in range(6):
+                yield i
+                time.sleep(.01)
+
+        self.assertEqual([value for _, _, value in pipeline.run(frames())], [1, 3, 5])
+
+    def test_errors(self):
+        """
+        Test a stage that raises drops the frame, counts it and keeps going.
+        """
+        def fragile(x):
+            if x == 2:
+                raise ValueError("bad frame")
+            return x
+
+        pipeline = StreamPipeline([Stage('fragile', fragile), Stage('double', lambda x: x * 2)])
+
+        def frames():
+            for i in range(5):
+                yield i
+                time.sleep(.01)
+
+        self.assertEqual([value for _, _, value in pipeline.run(frames())], [0, 2, 6, 8])
+
+        metrics = pipeline.metrics['fragile']
+
+        self.assertEqual(metrics['errors'], 1)
+        self.assertIn('bad frame', metrics['last_error'])
+
+
+if __name__ == '__main__':
+    unittest.main()